@@ -5,15 +5,20 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
+import logging
+
 import crypten.communicator as comm
 import crypten.mpc  # noqa: F401
 import crypten.nn  # noqa: F401
+import crypten.optim  # noqa: F401
 import torch
 
 # other imports:
-from . import debug
+from . import data, debug, serving, session, tracing
+from .common.rng import PhiloxGenerator
 from .cryptensor import CrypTensor
 from .mpc import ptype
+from .mpc.primitives import ArithmeticSharedTensor, converters
 
 
 def init():
@@ -37,10 +42,16 @@ binary = ptype.binary
 
 def print_communication_stats():
     comm.get().print_communication_stats()
+    stats = converters.get_conversion_cache_stats()
+    logging.info("====Conversion Cache Stats====")
+    logging.info("Hits     : %d" % stats["hits"])
+    logging.info("Misses   : %d" % stats["misses"])
+    logging.info("Evictions: %d" % stats["evictions"])
 
 
 def reset_communication_stats():
     comm.get().reset_communication_stats()
+    converters.reset_conversion_cache_stats()
 
 
 # Set backend
@@ -95,8 +106,8 @@ def _setup_przs():
         sharing using bitwise-xor rather than addition / subtraction)
     """
     # Initialize RNG Generators
-    comm.get().g0 = torch.Generator()
-    comm.get().g1 = torch.Generator()
+    comm.get().g0 = PhiloxGenerator()
+    comm.get().g1 = PhiloxGenerator()
 
     # Generate random seeds for Generators
     # NOTE: Chosen seed can be any number, but we choose as a random 64-bit
@@ -172,19 +183,24 @@ def load(f, encrypted=False, dummy_model=None, src=0, **kwargs):
         f: a file-like object (has to implement `read()`, `readline()`,
               `tell()`, and `seek()`), or a string containing a file name
         encrypted: Determines whether crypten should load an encrypted tesnor
-                      or a plaintext torch tensor.
+                      or a plaintext torch tensor. Encrypted tensors and modules
+                      are loaded from the shares that every party saved in the
+                      directory `f` (see :func:`crypten.serialization.load_shares`).
         dummy_model: Takes a model architecture to fill with the loaded model
                     (on the `src` party only). Non-source parties will return the
                     `dummy_model` input (with data unchanged). Loading a model will
                     assert the correctness of the model architecture provided against
                     the model loaded. This argument is ignored if the file loaded is
-                    a tensor.
+                    a tensor. When loading an encrypted module, `dummy_model` must
+                    be a `crypten.nn.Module` that is filled on all parties.
         src: Determines the source of the tensor. If `src` is None, each
             party will attempt to read in the specified file. If `src` is
             specified, the source party will read the tensor from
     """
     if encrypted:
-        raise NotImplementedError("Loading encrypted tensors is not yet supported")
+        from .serialization import load_shares
+
+        return load_shares(f, dummy_model=dummy_model)
     else:
         assert isinstance(src, int), "Load failed: src argument must be an integer"
         assert (
@@ -207,7 +223,7 @@ def load(f, encrypted=False, dummy_model=None, src=0, **kwargs):
 
                 comm.get().broadcast(dim, src=src)
                 comm.get().broadcast(size, src=src)
-                result = cryptensor(result, src=src)
+                result = cryptensor_chunked(result, size=result.size(), src=src)
 
             # file contains torch module
             elif isinstance(result, torch.nn.Module):
@@ -247,7 +263,7 @@ def load(f, encrypted=False, dummy_model=None, src=0, **kwargs):
                 comm.get().broadcast(dim, src=src)
                 size = torch.empty(size=(dim.item(),), dtype=torch.long)
                 comm.get().broadcast(size, src=src)
-                result = cryptensor(torch.empty(size=tuple(size.tolist())), src=src)
+                result = cryptensor_chunked(size=size.tolist(), src=src)
             # Load module using dummy_model
             elif load_type.item() == 1:
                 # Assert dummy_model is given
@@ -271,14 +287,27 @@ def save(obj, f, src=0, **kwargs):
     """
     Saves a CrypTensor or PyTorch tensor to a file.
 
+    Encrypted tensors, `AutogradCrypTensor`s, and encrypted `crypten.nn.Module`s
+    are saved without decrypting them: every party writes its own shares into
+    the directory `f` on its local disk (see
+    :func:`crypten.serialization.save_shares`). Load them with
+    `crypten.load(f, encrypted=True)`.
+
     Args:
         obj: The CrypTensor or PyTorch tensor to be saved
         f: a file-like object (has to implement `read()`, `readline()`,
               `tell()`, and `seek()`), or a string containing a file name
         src: The source party that writes data to the specified file.
     """
-    if is_encrypted_tensor(obj):
-        raise NotImplementedError("Saving encrypted tensors is not yet supported")
+    from .autograd_cryptensor import AutogradCrypTensor
+
+    encrypted = is_encrypted_tensor(obj) or isinstance(obj, AutogradCrypTensor)
+    if isinstance(obj, crypten.nn.Module):
+        encrypted = obj.encrypted
+    if encrypted:
+        from .serialization import save_shares
+
+        save_shares(obj, f)
     else:
         assert isinstance(src, int), "Save failed: src must be an integer"
         assert (
@@ -334,6 +363,133 @@ def stack(tensors, dim=0):
         return get_default_backend().stack(tensors, dim=dim)
 
 
+def __split_flat(flat_tensor, sizes):
+    """Splits a flat tensor into tensors of the given sizes"""
+    results, offset = [], 0
+    for size in sizes:
+        numel = int(torch.Size(size).numel())
+        results.append(flat_tensor.narrow(0, offset, numel).view(size))
+        offset += numel
+    return results
+
+
+def cryptensor_many(tensors, src=0):
+    """
+    Encrypts every tensor in `tensors` (with source `src`). The tensors are
+    encrypted as a single flat tensor, and the returned encrypted tensors are
+    views into its shares. All parties must provide tensors of the same sizes.
+    """
+    assert isinstance(tensors, list), "input to cryptensor_many must be a list"
+    if len(tensors) == 0:
+        return []
+    sizes = [tensor.size() for tensor in tensors]
+    flat_tensor = torch.cat([tensor.detach().reshape(-1).float() for tensor in tensors])
+    return __split_flat(cryptensor(flat_tensor, src=src), sizes)
+
+
+def cryptensor_chunked(source=None, size=None, src=0, chunk_size=2 ** 20, out=None):
+    """
+    Encrypts a (very large) tensor or numpy array (e.g., an `np.memmap`) of
+    party `src` chunk by chunk, optionally writing the shares into a
+    preallocated or memory-mapped buffer `out`. The memory needed in addition
+    to the shares is bounded by `chunk_size` (see
+    :meth:`ArithmeticSharedTensor.from_chunks`).
+    """
+    result = crypten.mpc.MPCTensor(None)
+    result._tensor = ArithmeticSharedTensor.from_chunks(
+        source=source, size=size, src=src, chunk_size=chunk_size, out=out
+    )
+    result.ptype = ptype.arithmetic
+    return result
+
+
+def get_plain_text_many(tensors):
+    """
+    Decrypts every encrypted tensor in `tensors` with a single round of
+    communication. Returns the plaintext tensors as views into a flat tensor.
+    """
+    assert isinstance(tensors, list), "input to get_plain_text_many must be a list"
+    if len(tensors) == 0:
+        return []
+
+    from .autograd_cryptensor import AutogradCrypTensor
+
+    tensors = [
+        tensor._tensor if isinstance(tensor, AutogradCrypTensor) else tensor
+        for tensor in tensors
+    ]
+    sizes = [tensor.size() for tensor in tensors]
+    flat_tensor = cat([tensor.flatten() for tensor in tensors])
+    return __split_flat(flat_tensor.get_plain_text(), sizes)
+
+
+def compare_many(pairs, op="lt"):
+    """
+    Compares every pair `(x, y)` in `pairs` using the comparator `op`, which
+    is one of `'lt'`, `'le'`, `'gt'`, or `'ge'`. The (differently sized)
+    comparisons are evaluated in a single batched comparison so that they
+    share their communication rounds.
+    """
+    assert op in ["lt", "le", "gt", "ge"], "Unsupported comparator %s" % op
+    assert isinstance(pairs, list), "input to compare_many must be a list"
+    assert len(pairs) > 0, "expected a non-empty list of pairs"
+
+    from .autograd_cryptensor import AutogradCrypTensor
+
+    # compute `a` for every pair such that the result is a < 0 (or 1 - (a < 0)):
+    differences = []
+    for x, y in pairs:
+        if isinstance(x, AutogradCrypTensor):
+            x = x._tensor
+        if isinstance(y, AutogradCrypTensor):
+            y = y._tensor
+        assert is_encrypted_tensor(x), "first element of each pair must be encrypted"
+        if op in ["lt", "ge"]:
+            is_zero = isinstance(y, (int, float)) and y == 0
+            differences.append(x if is_zero else x - y)
+        else:
+            differences.append(-x + y)
+
+    sizes = [difference.size() for difference in differences]
+    result = cat([difference.flatten() for difference in differences])._ltz()
+    if op in ["le", "ge"]:
+        result = 1 - result
+    return __split_flat(result, sizes)
+
+
+def relu_many(tensors):
+    """
+    Computes the ReLU of every (differently sized) tensor in `tensors` using a
+    single batched comparison and a single batched multiplication.
+    """
+    assert isinstance(tensors, list), "input to relu_many must be a list"
+    assert len(tensors) > 0, "expected a non-empty list of tensors"
+    if len(tensors) == 1:
+        return [tensors[0].relu()]
+
+    sizes = [tensor.size() for tensor in tensors]
+    result = cat([tensor.flatten() for tensor in tensors]).relu()
+    return __split_flat(result, sizes)
+
+
+def trace(func, *args):
+    """
+    Traces the operations that `func` performs on the encrypted tensors in
+    `args` and returns an optimized trace that can be replayed on new inputs
+    of the same sizes (see :func:`crypten.tracing.trace`).
+    """
+    return tracing.trace(func, *args)
+
+
+def compile(func):
+    """
+    Returns a version of `func` that is traced once for every combination of
+    input sizes, after which the optimized trace is replayed (see
+    :func:`crypten.tracing.compile`).
+    """
+    return tracing.compile(func)
+
+
 # Top level tensor functions
 __PASSTHROUGH_FUNCTIONS = ["bernoulli", "rand", "randperm"]
 
@@ -351,4 +507,16 @@ for func in __PASSTHROUGH_FUNCTIONS:
     __add_top_level_function(func)
 
 # expose classes and functions in package:
-__all__ = ["CrypTensor", "debug", "init", "init_thread", "mpc", "nn", "uninit"]
+__all__ = [
+    "CrypTensor",
+    "data",
+    "debug",
+    "init",
+    "init_thread",
+    "mpc",
+    "nn",
+    "optim",
+    "serving",
+    "session",
+    "uninit",
+]
@@ -5,9 +5,12 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
+import functools
+
+import crypten.communicator as comm
 import torch
 
-from .gradients import get_grad_fn
+from .gradients import FUNCTION_REGISTRY, get_grad_fn
 
 
 class AutogradContext(object):
@@ -15,6 +18,8 @@ class AutogradContext(object):
     Object that can be used by AutogradFunction for saving context information.
     """
 
+    __slots__ = ["context", "non_differentiable"]
+
     def __init__(self):
         self.reset()
 
@@ -46,11 +51,15 @@ class AutogradCrypTensor(object):
     """
     CrypTensor with support for autograd, akin to the `Variable` originally in
     PyTorch.
+
+    Functions that have a gradient in `crypten.gradients` are methods of the
+    class (generated once from the function registry), so they are recorded in
+    the autograd graph. All other attributes are dispatched to the underlying
+    tensor.
     """
 
-    # attributes that should not be dispatched to underlying tensor:
-    PROTECTED_ATTRIBUTES = [
-        "__dict__",
+    # attributes stored in the node of the autograd graph:
+    __slots__ = [
         "_tensor",
         "requires_grad",
         "grad",
@@ -59,11 +68,7 @@ class AutogradCrypTensor(object):
         "parents",
         "children",
         "ctx",
-        "backward",
-        "detach",
-        "detach_",
-        "_reset_gradients",
-        "tensor",
+        "__weakref__",
     ]
 
     def __init__(self, tensor, requires_grad=True):
@@ -87,60 +92,91 @@ class AutogradCrypTensor(object):
         """Returns underlying (non-autograd) tensor."""
         return self._tensor
 
-    def backward(self, grad_input=None, top_node=True):
+    @property
+    def __class__(self):
+        """
+        Returns the type of the underlying tensor, so that `isinstance` checks
+        against CrypTensor types succeed for AutogradCrypTensors.
+        """
+        return self._tensor.__class__
+
+    def backward(self, grad_input=None):
         """
         Backpropagates gradient through the computation graph. The function
         only maintains the gradients in leaf nodes of the graph.
+
+        Nodes are processed in topological order: the gradient function of a
+        node is applied once the gradients of all nodes that use it have been
+        accumulated. Gradient functions of nodes that become ready at the same
+        time are independent, so their communication rounds are shared.
         """
-        if self.requires_grad:
-
-            # if we are in a leaf or if not all parents have backpropagated:
-            parents_done = all(parent.grad_computed for parent in self.parents)
-            if len(self.children) == 0 or (not top_node and not parents_done):
-                # Set grad_input to correct dimension and size if not already
-                grad_input = grad_input.view(self.size())
-                if self.grad is None:
-                    self.grad = grad_input  # store gradient...
+        if not self.requires_grad:
+            return
+        if self.grad_fn is None and len(self.children) > 0:
+            raise ValueError("Cannot call backward() before forward().")
+
+        # if undefined, set gradient input to all ones:
+        if grad_input is None:
+            grad_input = self._tensor.new(torch.ones(self._tensor.size()))
+
+        # count the number of gradients that each node in the graph receives:
+        num_pending, stack = {id(self): 0}, [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            for child in _differentiable_children(node):
+                if not child.requires_grad:
+                    continue
+                if id(child) not in num_pending:
+                    num_pending[id(child)] = 0
+                    stack.append(child)
+                num_pending[id(child)] += 1
+
+        # backpropagate through all nodes whose gradient is complete:
+        grads, ready = {id(self): grad_input}, [self]
+        while len(ready) > 0:
+            nodes = []
+            for node in ready:
+                if len(node.children) == 0:  # store gradient in leaf
+                    grad = grads.pop(id(node)).view(node.size())
+                    node.grad = grad if node.grad is None else node.grad.add(grad)
                 else:
-                    self.grad.add_(grad_input)  # ... or accumulate gradient...
-                return  # ... and do not proceed.
-
-            # if undefined, set gradient input to all ones:
-            if grad_input is None:
-                grad_input = self._tensor.new(torch.ones(self._tensor.size()))
-
-            # check that we can actually backpropagate:
-            if self.grad_fn is None:
-                raise ValueError("Cannot call backward() before forward().")
-            if self.grad_fn is None:
-                raise NotImplementedError(
-                    "Gradient for {} not implemented.".format(self.grad_fn)
-                )
+                    nodes.append(node)
 
             # perform backpropagation:
-            grad = self.grad_fn.backward(self.ctx, grad_input)
-            self.grad_computed = True  # mark gradient as computed
-            differentiable_children = [
-                x for x in self.children if self.ctx.is_differentiable(x._tensor)
-            ]
-
-            self.ctx.reset()  # free up memory used for context
-            if not isinstance(grad, (list, tuple)):
-                grad = (grad,)
-
-            assert len(differentiable_children) <= len(
-                grad
-            ), "number of gradients to backpropagate does not match number of children"
-            for idx, child in enumerate(differentiable_children):
-                child.backward(grad_input=grad[idx], top_node=False)
-
-            # clean up gradients except in leaf nodes:
-            if len(differentiable_children) > 0:
-                self.grad = None
-
-            # remove node from graph:
-            self.parents = []
-            self.children = []
+            results = comm.run_fused(
+                [
+                    functools.partial(
+                        node.grad_fn.backward, node.ctx, grads.pop(id(node))
+                    )
+                    for node in nodes
+                ]
+            )
+
+            # accumulate gradients in children:
+            ready = []
+            for node, grad in zip(nodes, results):
+                children = _differentiable_children(node)
+                if not isinstance(grad, (list, tuple)):
+                    grad = (grad,)
+                assert len(children) <= len(
+                    grad
+                ), "number of gradients to backpropagate does not match number of children"
+                for child, child_grad in zip(children, grad):
+                    if not child.requires_grad:
+                        continue
+                    key = id(child)
+                    grads[key] = (
+                        child_grad if key not in grads else grads[key].add(child_grad)
+                    )
+                    num_pending[key] -= 1
+                    if num_pending[key] == 0:
+                        ready.append(child)
+
+                # remove node from graph and free up memory used for context:
+                node.grad_computed = True
+                node.ctx.reset()
+                node.parents = []
+                node.children = []
 
     def detach_(self):
         """Detaches tensor from the autograd graph (in-place), making it a leaf."""
@@ -151,90 +187,114 @@ class AutogradCrypTensor(object):
         """Detaches tensor from the autograd graph, making it a leaf."""
         return AutogradCrypTensor(self._tensor.clone(), requires_grad=False)
 
-    def __getattribute__(self, name):
+    def __getattr__(self, name):
         """
-        Makes sure that any function call on the tensor gets recorded in order
-        to facilitate gradient computation using autograd.
+        Dispatches attributes that are not defined on the AutogradCrypTensor
+        (e.g., `size()`) to the underlying tensor. Only called when the regular
+        attribute lookup fails, so methods in the method table add no overhead.
         """
-        if name in AutogradCrypTensor.PROTECTED_ATTRIBUTES:
-            return object.__getattribute__(self, name)
+        if name == "_tensor":  # not yet set, e.g., during unpickling
+            raise AttributeError(name)
+
+        # functions registered after the method table was generated:
+        grad_fn = get_grad_fn(name)
+        if grad_fn is not None:
+            setattr(AutogradCrypTensor, name, _autograd_method(name, grad_fn))
+            return getattr(self, name)
+        return getattr(self._tensor, name)
+
+
+def _differentiable_children(node):
+    """Returns the children of a node that gradients are backpropagated to."""
+    return [x for x in node.children if node.ctx.is_differentiable(x._tensor)]
+
+
+def _autograd_forward(self, grad_fn, args, kwargs):
+    """Forward function that stores data for autograd in result."""
+
+    # mark gradient as not computed:
+    self.grad_computed = False
+
+    # only AutogradCrypTensors can be children:
+    tensor_args, non_autograd_found = [], False
+    for arg in args:
+        if isinstance(arg, AutogradCrypTensor):
+            if non_autograd_found:
+                raise ValueError(
+                    "In the inputs, an object that is not an "
+                    "AutogradCrypTensor cannot be followed by an "
+                    "AutogradCrypTensor."
+                )  # backward() assumes this when iterating over children
+            tensor_args.append(arg)
         else:
-            # replace pytorch buildins with corresponding functions
-            name = PYTORCH_BUILTIN.get(name, name)
-
-            # determine if we are applying an autograd function:
-            grad_fn = get_grad_fn(name)
-
-            # dispatch calls to size(), etc. to underlying CrypTensor:
-            if grad_fn is None:
-                return getattr(self.__dict__["_tensor"], name)
-
-            def autograd_forward(*args, **kwargs):
-                """Forward function that stores data for autograd in result."""
-
-                # mark gradient as not computed:
-                self.grad_computed = False
-
-                # only AutogradCrypTensors can be children:
-                tensor_args, non_autograd_found = [], False
-                for arg in args:
-                    if isinstance(arg, AutogradCrypTensor):
-                        if non_autograd_found:
-                            raise ValueError(
-                                "In the inputs, an object that is not an "
-                                "AutogradCrypTensor cannot be followed by an "
-                                "AutogradCrypTensor."
-                            )  # backward() assumes this when iterating over children
-                        tensor_args.append(arg)
-                    else:
-                        non_autograd_found = True
-
-                # identify children and whether result requires gradient:
-                children = [self, *tensor_args]
-                requires_grad = any(child.requires_grad for child in children)
-
-                # prepare inputs and context for forward call:
-                ctx = AutogradContext()
-                inputs = [self] + list(args)
-                inputs = [
-                    input._tensor if isinstance(input, AutogradCrypTensor) else input
-                    for input in inputs
-                ]
-                if len(inputs) == 1:
-                    inputs = inputs[0]  # unpack input list if possible
-
-                # apply correct autograd function:
-                result = grad_fn.forward(ctx, inputs, **kwargs)
-                if not isinstance(result, tuple):  # output may be tensor or tuple
-                    result = (result,)
-                    remove_tuple = True
-                else:
-                    remove_tuple = False
-
-                # wrap results and maintain references to children and context:
-                result = tuple(
-                    AutogradCrypTensor(res, requires_grad=False) for res in result
-                )
-                for res in result:
-                    res.requires_grad = requires_grad and ctx.is_differentiable(
-                        res.tensor
-                    )
-                    if res.requires_grad:
-                        res.children = children
-                        res.grad_fn = grad_fn
-                        res.ctx = ctx
-                    self.parents.append(res)
-
-                # return result:
-                if remove_tuple:
-                    result = result[0]
-                return result
-
-            return autograd_forward
+            non_autograd_found = True
+
+    # identify children and whether result requires gradient:
+    children = [self, *tensor_args]
+    requires_grad = any(child.requires_grad for child in children)
+
+    # prepare inputs and context for forward call:
+    ctx = AutogradContext()
+    inputs = [self] + list(args)
+    inputs = [
+        input._tensor if isinstance(input, AutogradCrypTensor) else input
+        for input in inputs
+    ]
+    if len(inputs) == 1:
+        inputs = inputs[0]  # unpack input list if possible
+
+    # apply correct autograd function (the communicator may intercept it, see
+    # `crypten.nn.checkpoint`):
+    apply_fn = getattr(comm.get(), "apply_autograd_function", None)
+    if apply_fn is None:
+        result = grad_fn.forward(ctx, inputs, **kwargs)
+    else:
+        result = apply_fn(grad_fn, ctx, inputs, kwargs)
+    if not isinstance(result, tuple):  # output may be tensor or tuple
+        result = (result,)
+        remove_tuple = True
+    else:
+        remove_tuple = False
+
+    # wrap results and maintain references to children and context:
+    result = tuple(AutogradCrypTensor(res, requires_grad=False) for res in result)
+    for res in result:
+        res.requires_grad = requires_grad and ctx.is_differentiable(res._tensor)
+        if res.requires_grad:
+            res.children = children
+            res.grad_fn = grad_fn
+            res.ctx = ctx
+            self.parents.append(res)
+
+    # return result:
+    if remove_tuple:
+        result = result[0]
+    return result
+
+
+def _autograd_method(name, grad_fn):
+    """Returns a method that applies `grad_fn` and records it for autograd."""
+
+    def autograd_method(self, *args, **kwargs):
+        return _autograd_forward(self, grad_fn, args, kwargs)
+
+    autograd_method.__name__ = name
+    autograd_method.__qualname__ = "AutogradCrypTensor." + name
+    autograd_method.__doc__ = grad_fn.__doc__
+    return autograd_method
+
+
+# generate method table from all functions that have a gradient:
+for name, grad_fn in FUNCTION_REGISTRY.items():
+    setattr(AutogradCrypTensor, name, _autograd_method(name, grad_fn))
 
 
 # register all Python built-in functions in AutogradCrypTensor:
 def register_python_builtin(name, value):
+    if value in FUNCTION_REGISTRY:
+        setattr(AutogradCrypTensor, name, getattr(AutogradCrypTensor, value))
+        return
+
     def fn(self, *args, **kwargs):
         return getattr(self, value)(*args, **kwargs)
 
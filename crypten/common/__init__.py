@@ -5,4 +5,4 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
-__all__ = ["rng", "tensor_types", "util"]
+__all__ = ["conversion_cache", "rng", "tensor_types", "util"]
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import weakref
+from collections import OrderedDict
+
+
+# 128 MB by default, enough for the activations of most networks
+DEFAULT_MAX_BYTES = 2 ** 27
+
+
+class ConversionCache:
+    """
+    LRU cache of the binary representations of ArithmeticSharedTensors.
+
+    Entries are stored on the ArithmeticSharedTensor itself together with the
+    identity and version counter of its share, so any in-place modification
+    or re-assignment of the share invalidates the entry. The total size of all
+    entries is bounded by `max_bytes`. Entries are only released in LRU order
+    (and not when their owner is garbage collected) so that all parties make
+    identical caching decisions.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.num_bytes = 0
+        self.next_key = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def clear(self):
+        for key in list(self.entries.keys()):
+            self._evict(key)
+
+    def _evict(self, key):
+        owner_ref, num_bytes = self.entries.pop(key)
+        self.num_bytes -= num_bytes
+        owner = owner_ref()
+        if owner is not None and getattr(owner, "_binary_cache", (None,))[0] == key:
+            del owner._binary_cache
+
+    def get(self, arithmetic_tensor):
+        entry = getattr(arithmetic_tensor, "_binary_cache", None)
+        if entry is not None:
+            key, share_ref, version, binary_tensor = entry
+            share = arithmetic_tensor.share
+            if key not in self.entries:
+                # entry was evicted from (or copied along with) another tensor
+                del arithmetic_tensor._binary_cache
+            elif share_ref() is share and share._version == version:
+                self.stats["hits"] += 1
+                self.entries.move_to_end(key)
+                result = binary_tensor.clone()
+                result.encoder = arithmetic_tensor.encoder
+                return result
+            else:
+                self._evict(key)
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, arithmetic_tensor, binary_tensor):
+        share = arithmetic_tensor.share
+        num_bytes = binary_tensor.share.nelement() * binary_tensor.share.element_size()
+        if num_bytes > self.max_bytes:
+            return
+        while self.num_bytes + num_bytes > self.max_bytes:
+            self._evict(next(iter(self.entries)))
+            self.stats["evictions"] += 1
+
+        key = self.next_key
+        self.next_key += 1
+        self.entries[key] = (weakref.ref(arithmetic_tensor), num_bytes)
+        self.num_bytes += num_bytes
+        arithmetic_tensor._binary_cache = (
+            key,
+            weakref.ref(share),
+            share._version,
+            binary_tensor.clone(),
+        )
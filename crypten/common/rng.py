@@ -4,12 +4,100 @@
 #
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import torch
 
 
+# number of 64-bit words generated per thread:
+_CHUNK_SIZE = 2 ** 20
+
+# thread pool used to generate large tensors (created lazily in every process):
+_executor = None
+_executor_pid = None
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=torch.get_num_threads())
+        _executor_pid = os.getpid()
+    return _executor
+
+
+class PhiloxGenerator:
+    """
+    Counter-based pseudo-random generator (Philox4x64-10) that generates
+    uniformly random 64-bit words. Word `i` of the stream only depends on the
+    seed and on `i`, so any part of the stream can be generated independently.
+    Large tensors are therefore generated in chunks on multiple threads, and
+    `random_words` supports random access via its `offset` argument.
+
+    Every call to `random_words` without `offset` continues the stream where
+    the previous one stopped (rounded up to a multiple of `BLOCK_SIZE`).
+    """
+
+    # number of words generated per counter value:
+    BLOCK_SIZE = 4
+
+    def __init__(self, seed=0):
+        self.manual_seed(seed)
+
+    def manual_seed(self, seed):
+        """Sets the seed (a 64-bit integer) and resets the stream."""
+        self.seed = int(seed) % 2 ** 64
+        self.offset = 0
+        return self
+
+    def initial_seed(self):
+        """Returns the seed of the generator."""
+        return self.seed
+
+    def random_words(self, numel, offset=None):
+        """
+        Returns a `torch.LongTensor` with `numel` words of the stream, starting
+        at word `offset`. If `offset` is `None`, the words are taken from the
+        current position of the stream, which is advanced.
+        """
+        if offset is None:
+            offset = self.offset
+            num_blocks = -(-numel // self.BLOCK_SIZE)
+            self.offset += num_blocks * self.BLOCK_SIZE
+
+        # generate from the start of the block that contains `offset`:
+        skip = offset % self.BLOCK_SIZE
+        start = offset - skip
+        total = numel + skip
+        words = np.empty(total, dtype=np.uint64)
+
+        def generate(chunk_start):
+            chunk_end = min(chunk_start + _CHUNK_SIZE, total)
+            counter = (start + chunk_start) // self.BLOCK_SIZE
+            bit_generator = np.random.Philox(key=self.seed, counter=counter)
+            words[chunk_start:chunk_end] = bit_generator.random_raw(
+                chunk_end - chunk_start
+            )
+
+        chunk_starts = range(0, total, _CHUNK_SIZE)
+        if len(chunk_starts) > 1 and torch.get_num_threads() > 1:
+            list(_get_executor().map(generate, chunk_starts))
+        else:
+            for chunk_start in chunk_starts:
+                generate(chunk_start)
+        return torch.from_numpy(words[skip:].view(np.int64))
+
+
 def generate_random_ring_element(size, ring_size=(2 ** 64), **kwargs):
     """Helper function to generate a random number from a signed ring"""
-    # TODO (brianknott): Check whether this RNG contains the full range we want.
+    generator = kwargs.get("generator", None)
+    if isinstance(generator, PhiloxGenerator):
+        assert ring_size == 2 ** 64, "PhiloxGenerator only supports the 64-bit ring"
+        size = torch.Size(size)
+        return generator.random_words(size.numel()).view(size)
+
+    # NOTE: torch.randint does not cover the full 64-bit ring:
     return torch.randint(
         -(ring_size // 2), (ring_size - 1) // 2, size, dtype=torch.long, **kwargs
     )
@@ -21,4 +109,7 @@ def generate_kbit_random_tensor(size, bitlength=None, **kwargs):
         bitlength = torch.iinfo(torch.long).bits
     if bitlength == 64:
         return generate_random_ring_element(size, **kwargs)
+    if isinstance(kwargs.get("generator", None), PhiloxGenerator):
+        words = generate_random_ring_element(size, **kwargs)
+        return words.bitwise_and_((1 << bitlength) - 1)
     return torch.randint(0, 2 ** bitlength, size, dtype=torch.long, **kwargs)
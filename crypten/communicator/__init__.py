@@ -7,6 +7,7 @@
 
 from .communicator import Communicator
 from .distributed_communicator import DistributedCommunicator
+from .fused_communicator import get_thread_communicator, run_fused
 from .in_process_communicator import InProcessCommunicator
 
 
@@ -14,6 +15,11 @@ __use_threads = False
 
 
 def get():
+    # functions executed by `run_fused` use their own communicator:
+    thread_communicator = get_thread_communicator()
+    if thread_communicator is not None:
+        return thread_communicator
+
     cls = InProcessCommunicator if __use_threads else DistributedCommunicator
     if not cls.is_initialized():
         raise RuntimeError("Crypten not initialized. Please call crypten.init() first.")
@@ -40,4 +46,4 @@ def uninit():
 
 
 # expose classes and functions in package:
-__all__ = ["Communicator", "DistributedCommunicator", "uninit", "get"]
+__all__ = ["Communicator", "DistributedCommunicator", "uninit", "get", "run_fused"]
@@ -10,6 +10,7 @@ import os
 
 import torch
 import torch.distributed as dist
+from crypten.common.conversion_cache import ConversionCache
 from torch.distributed import ReduceOp
 
 from .communicator import Communicator, _logging
@@ -20,14 +21,25 @@ class DistributedCommunicator(Communicator):
     Implementation of the Communicator class via torch.distributed. Use this
     communicator to communicate between different processes, potentially,
     running on different nodes.
+
+    Args:
+        group: `torch.distributed` process group used for all communication
+            (`None` for the default process group, which is initialized if
+            needed). Communicators of different process groups communicate
+            independently of each other (see `crypten.session`).
     """
 
     BYTES_PER_ELEMENT = 8
     __instance = None
 
-    def __init__(self):
+    def __init__(self, group=None):
+        # communicators of process groups require an initialized default group:
+        if group is not None:
+            assert dist.is_initialized(), "initialize the communicator first"
+            self.reset_communication_stats()
+
         # no need to do anything if we already initialized the communicator:
-        if not dist.is_initialized():
+        elif not dist.is_initialized():
             # get configuration variables from environmens:
             state = {}
             for key in ["distributed_backend", "rendezvous", "world_size", "rank"]:
@@ -55,6 +67,12 @@ class DistributedCommunicator(Communicator):
             )
             logging.info("World size = %d" % dist.get_world_size())
 
+        # older versions of torch.distributed do not accept `group=None`:
+        self.group = dist.group.WORLD if group is None else group
+
+        # every communicator caches the conversions of its own computations:
+        self.conversion_cache = ConversionCache()
+
     @classmethod
     def is_initialized(cls):
         return dist.is_initialized()
@@ -89,32 +107,35 @@ class DistributedCommunicator(Communicator):
     @classmethod
     def shutdown(cls):
         dist.destroy_process_group()
+        # drop the handle on the destroyed group so forked processes do not
+        # tear it down (its worker threads do not survive the fork):
+        cls.instance = None
 
     @_logging
     def send(self, tensor, dst):
         """Sends the specified tensor to the destination dst."""
         assert dist.is_initialized(), "initialize the communicator first"
-        dist.send(tensor, dst)
+        dist.send(tensor, dst, group=self.group)
 
     @_logging
     def recv(self, tensor, src=None):
         """Receives a tensor from an (optional) source src."""
         assert dist.is_initialized(), "initialize the communicator first"
         result = tensor.clone()
-        dist.recv(result, src=src)
+        dist.recv(result, src=src, group=self.group)
         return result
 
     @_logging
     def isend(self, tensor, dst):
         """Sends the specified tensor to the destination dst."""
         assert dist.is_initialized(), "initialize the communicator first"
-        return dist.isend(tensor, dst)
+        return dist.isend(tensor, dst, group=self.group)
 
     @_logging
     def irecv(self, tensor, src=None):
         """Receives a tensor from an (optional) source src."""
         assert dist.is_initialized(), "initialize the communicator first"
-        return dist.irecv(tensor, src=src)
+        return dist.irecv(tensor, src=src, group=self.group)
 
     @_logging
     def scatter(self, scatter_list, src, size=None, async_op=False):
@@ -124,10 +145,16 @@ class DistributedCommunicator(Communicator):
             if size is None:
                 size = scatter_list[self.get_rank()].size()
             tensor = torch.empty(size=size, dtype=torch.long)
-            dist.scatter(tensor, [], src, async_op=async_op)
+            dist.scatter(tensor, [], src, group=self.group, async_op=async_op)
         else:
             tensor = scatter_list[self.get_rank()]
-            dist.scatter(tensor, [t for t in scatter_list], src, async_op=async_op)
+            dist.scatter(
+                tensor,
+                [t for t in scatter_list],
+                src,
+                group=self.group,
+                async_op=async_op,
+            )
         return tensor
 
     @_logging
@@ -135,7 +162,7 @@ class DistributedCommunicator(Communicator):
         """Reduces the tensor data across all parties."""
         assert dist.is_initialized(), "initialize the communicator first"
         result = tensor.clone()
-        dist.reduce(result, dst, op=op, async_op=async_op)
+        dist.reduce(result, dst, op=op, group=self.group, async_op=async_op)
         return result
 
     @_logging
@@ -143,7 +170,7 @@ class DistributedCommunicator(Communicator):
         """Reduces the tensor data across all parties; all get the final result."""
         assert dist.is_initialized(), "initialize the communicator first"
         result = tensor.clone()
-        dist.all_reduce(result, op=op, async_op=async_op)
+        dist.all_reduce(result, op=op, group=self.group, async_op=async_op)
         return result
 
     @_logging
@@ -154,9 +181,9 @@ class DistributedCommunicator(Communicator):
             result = []
             for _ in range(self.get_world_size()):
                 result.append(torch.empty(size=tensor.size(), dtype=torch.long))
-            dist.gather(tensor, result, dst, async_op=async_op)
+            dist.gather(tensor, result, dst, group=self.group, async_op=async_op)
             return result
-        dist.gather(tensor, [], dst, async_op=async_op)
+        dist.gather(tensor, [], dst, group=self.group, async_op=async_op)
 
     @_logging
     def all_gather(self, tensor, async_op=False):
@@ -165,14 +192,14 @@ class DistributedCommunicator(Communicator):
         result = []
         for _ in range(self.get_world_size()):
             result.append(torch.empty(size=tensor.size(), dtype=torch.long))
-        dist.all_gather(result, tensor, async_op=async_op)
+        dist.all_gather(result, tensor, group=self.group, async_op=async_op)
         return result
 
     @_logging
     def broadcast(self, tensor, src, async_op=False):
         """Broadcasts the tensor to all parties."""
         assert dist.is_initialized(), "initialize the communicator first"
-        dist.broadcast(tensor, src, async_op=async_op)
+        dist.broadcast(tensor, src, group=self.group, async_op=async_op)
         return tensor
 
     @_logging
@@ -183,19 +210,19 @@ class DistributedCommunicator(Communicator):
         function.
         """
         assert dist.is_initialized(), "initialize the communicator first"
-        dist.barrier()
+        dist.barrier(group=self.group)
 
     def get_world_size(self):
         """Returns the size of the world."""
         assert dist.is_initialized(), "initialize the communicator first"
-        return dist.get_world_size()
+        return dist.get_world_size(group=self.group)
 
     def get_rank(self):
         """Returns the rank of the current process."""
         assert dist.is_initialized(), "initialize the communicator first"
-        return dist.get_rank()
+        return dist.get_rank(group=self.group)
 
     def get_distributed_backend(self):
         """Returns name of torch.distributed backend used."""
         assert dist.is_initialized(), "initialize the communicator first"
-        return dist.get_backend()
+        return dist.get_backend(group=self.group)
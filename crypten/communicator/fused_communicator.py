@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import threading
+
+import torch
+from torch.distributed import ReduceOp
+
+
+# communicator used by the current thread (if it differs from the default):
+_thread_state = threading.local()
+
+
+def get_thread_communicator():
+    """Returns the communicator set for the current thread, if any."""
+    return getattr(_thread_state, "communicator", None)
+
+
+def set_thread_communicator(communicator):
+    """Sets the communicator used by the current thread (`None` to unset)."""
+    _thread_state.communicator = communicator
+
+
+class FusedCommunicator:
+    """
+    Communicator used by the functions executed by `run_fused`.
+
+    Calls to `all_reduce` (with a sum) and `all_gather` are handed to the
+    scheduler, which combines them with the corresponding calls of the other
+    functions into a single call. All other calls are forwarded to the
+    underlying communicator.
+    """
+
+    def __init__(self, scheduler, index):
+        self.scheduler = scheduler
+        self.index = index
+
+    def __getattr__(self, name):
+        return getattr(self.scheduler.communicator, name)
+
+    def all_reduce(self, tensor, op=ReduceOp.SUM, async_op=False):
+        """Reduces the tensor data across all parties; all get the final result."""
+        if op != ReduceOp.SUM or async_op:
+            return self.scheduler.communicator.all_reduce(
+                tensor, op=op, async_op=async_op
+            )
+        return self.scheduler.request(self.index, "all_reduce", tensor)
+
+    def all_gather(self, tensor, async_op=False):
+        """Gathers tensors from all parties in a list."""
+        if async_op:
+            return self.scheduler.communicator.all_gather(tensor, async_op=async_op)
+        return self.scheduler.request(self.index, "all_gather", tensor)
+
+
+class _LockstepScheduler:
+    """
+    Runs functions in separate threads, one thread at a time. A thread runs
+    until it issues a fusable collective or finishes, after which the next
+    thread runs. Once all threads are waiting, their collectives are executed
+    as a single call. Because threads are switched in a fixed order,
+    all parties perform the same sequence of (fused) communications and use
+    their random number generators in the same order.
+    """
+
+    def __init__(self, communicator, functions):
+        self.communicator = communicator
+        self.functions = functions
+        num_functions = len(functions)
+        self.resume = [threading.Event() for _ in range(num_functions)]
+        self.paused = [threading.Event() for _ in range(num_functions)]
+        self.done = [False] * num_functions
+        self.requests = [None] * num_functions
+        self.responses = [None] * num_functions
+        self.results = [None] * num_functions
+        self.errors = [None] * num_functions
+
+    def request(self, index, kind, tensor):
+        """Hands a collective to the scheduler and waits for its result."""
+        self.requests[index] = (kind, tensor)
+        self._pause(index)
+        response, self.responses[index] = self.responses[index], None
+        return response
+
+    def _pause(self, index):
+        self.paused[index].set()
+        self.resume[index].wait()
+        self.resume[index].clear()
+
+    def _run_function(self, index, grad_enabled):
+        self.resume[index].wait()
+        self.resume[index].clear()
+        set_thread_communicator(FusedCommunicator(self, index))
+        torch.set_grad_enabled(grad_enabled)
+        try:
+            self.results[index] = self.functions[index]()
+        except BaseException as error:
+            self.errors[index] = error
+        finally:
+            self.done[index] = True
+            self.paused[index].set()
+
+    def _communicate(self, indices):
+        """Executes the pending collectives of the given threads."""
+        kinds = {self.requests[i][0] for i in indices}
+        if len(kinds) > 1:
+            # an all_reduce is an all_gather followed by a local sum, so all
+            # requests can be served with a single all_gather:
+            kinds = {"all_gather"}
+
+        # flatten all tensors of the same type into a single tensor:
+        dtypes = []
+        for i in indices:
+            if self.requests[i][1].dtype not in dtypes:
+                dtypes.append(self.requests[i][1].dtype)
+        for dtype in dtypes:
+            group = [i for i in indices if self.requests[i][1].dtype == dtype]
+            tensors = [self.requests[i][1] for i in group]
+            flat_tensor = torch.cat([tensor.reshape(-1) for tensor in tensors])
+            if "all_reduce" in kinds:
+                flat_results = [self.communicator.all_reduce(flat_tensor)]
+            else:
+                flat_results = self.communicator.all_gather(flat_tensor)
+
+            # split result into the individual responses:
+            offset = 0
+            for i, tensor in zip(group, tensors):
+                numel = tensor.nelement()
+                response = [
+                    flat_result[offset : offset + numel].view(tensor.size())
+                    for flat_result in flat_results
+                ]
+                if self.requests[i][0] == "all_reduce":
+                    response = torch.stack(response).sum(dim=0)
+                self.responses[i] = response
+                offset += numel
+        for i in indices:
+            self.requests[i] = None
+
+    def run(self):
+        threads = [
+            threading.Thread(
+                target=self._run_function,
+                args=(i, torch.is_grad_enabled()),
+                daemon=True,
+            )
+            for i in range(len(self.functions))
+        ]
+        for thread in threads:
+            thread.start()
+
+        # run all threads until they are done or waiting for a collective:
+        active = list(range(len(self.functions)))
+        while len(active) > 0:
+            for i in active:
+                self.resume[i].set()
+                self.paused[i].wait()
+                self.paused[i].clear()
+            active = [i for i in active if not self.done[i]]
+            self._communicate(active)
+
+        for thread in threads:
+            thread.join()
+        for error in self.errors:
+            if error is not None:
+                raise error
+        return self.results
+
+
+def run_fused(functions):
+    """
+    Runs the given functions (that take no arguments) and returns a list with
+    their results. The functions are interleaved such that every round of
+    communication (e.g., the openings in Beaver multiplications and the rounds
+    of comparisons) is executed once for all functions instead of once for
+    each function.
+
+    Note: the functions should only interact with each other through their
+    results, and must only communicate through `crypten.communicator.get()`.
+    """
+    from . import get
+
+    if len(functions) < 2:
+        return [function() for function in functions]
+    return _LockstepScheduler(get(), functions).run()
@@ -11,6 +11,7 @@ from operator import itemgetter
 from queue import Queue
 
 import torch
+from crypten.common.conversion_cache import ConversionCache
 from torch.distributed import ReduceOp
 
 from .communicator import Communicator
@@ -33,6 +34,9 @@ class InProcessCommunicator(Communicator):
         self.rank = rank
         self.reset_communication_stats()
 
+        # every party caches the conversions of its own computations:
+        self.conversion_cache = ConversionCache()
+
         with InProcessCommunicator.lock:
             if InProcessCommunicator.mailbox is None:
                 InProcessCommunicator.mailbox = [
@@ -36,8 +36,11 @@ class CrypTensor(object):
     def __init__(self):
         raise NotImplementedError("Cannot instantiate an CrypTensor")
 
-    def get_plain_text(self):
-        """Decrypts the encrypted tensor."""
+    def get_plain_text(self, dst=None):
+        """
+        Decrypts the encrypted tensor. If `dst` is specified, only party `dst`
+        obtains the plaintext and the other parties obtain `None`.
+        """
         raise NotImplementedError("get_plain_text is not implemented")
 
     def shallow_copy(self):
@@ -434,6 +437,16 @@ class CrypTensor(object):
         """Computes the sine of the input."""
         raise NotImplementedError("sin is not implemented")
 
+    def powers(self, n):
+        """Computes the powers :math:`x, x^2, ..., x^n` of the tensor, stacked
+        along a new leading dimension."""
+        raise NotImplementedError("powers is not implemented")
+
+    def polynomial(self, coeffs):
+        """Evaluates a polynomial with coefficients `coeffs` (ordered from the
+        linear term to the highest order term) on the tensor."""
+        raise NotImplementedError("polynomial is not implemented")
+
     # Approximations:
     def exp(self):
         """Computes exponential function on the tensor."""
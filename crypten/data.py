@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import collections
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import crypten
+import crypten.communicator as comm
+import torch
+from crypten.common.rng import PhiloxGenerator
+from crypten.communicator.fused_communicator import set_thread_communicator
+
+
+# maximum length of the description of the structure of a batch:
+_MAX_HEADER_LENGTH = 64
+
+
+class _PrivateGeneratorCommunicator:
+    """
+    Communicator that forwards all calls to an underlying communicator, but
+    that has its own generators for pseudo-random sharings of zero (PRZS). This
+    allows a background thread to encrypt data without advancing the shared
+    generators of the main thread in a non-deterministic order.
+    """
+
+    def __init__(self, communicator, g0, g1):
+        self.communicator = communicator
+        self.g0 = g0
+        self.g1 = g1
+
+    def __getattr__(self, name):
+        return getattr(self.communicator, name)
+
+
+class EncryptedDataLoader:
+    """
+    Iterable that encrypts the batches produced by a data loader (e.g., a
+    `torch.utils.data.DataLoader`). The data-owning party reads and encrypts
+    the next batches on background threads while the current batch is being
+    processed, so data loading and encryption overlap with computation.
+
+    Every party constructs the `EncryptedDataLoader` and iterates over it in
+    lockstep. Parties that do not own data pass `None` as `dataloader`; the
+    sizes of the batches are communicated by the data owners (in a single
+    small message per batch). The length of the `EncryptedDataLoader` is the
+    smallest length of the dataloaders of the data owners, and is known to all
+    parties.
+
+    Args:
+        dataloader: iterable over tensors or tuples / lists of tensors that
+            contains the data of this party, or `None` if the party owns no data.
+        src (int or list of int): party (or parties) that own data. If multiple
+            parties own data, each one provides different feature columns of the
+            same examples: the tensors of all parties are encrypted and
+            concatenated along dimension `dim` (in the order of `src`).
+        num_prefetch (int): number of batches that are read and encrypted ahead
+            of the current batch. This bounds the memory used for prefetching.
+        dim (int): dimension along which columns of multiple parties are
+            concatenated.
+    """
+
+    def __init__(self, dataloader, src=0, num_prefetch=1, dim=1):
+        if isinstance(src, int):
+            src = [src]
+        world_size = comm.get().get_world_size()
+        assert len(src) > 0, "at least one party must own data"
+        assert all(0 <= rank < world_size for rank in src), "invalid source"
+        assert len(set(src)) == len(src), "every party can own data only once"
+        assert num_prefetch >= 0, "num_prefetch must be non-negative"
+        if comm.get().get_rank() in src:
+            assert dataloader is not None, "data owners must provide a dataloader"
+        self.dataloader = dataloader
+        self.src = src
+        self.num_prefetch = num_prefetch
+        self.dim = dim
+
+        # agree on the number of batches (-1 if a dataloader has no length):
+        length = -1
+        if comm.get().get_rank() in src:
+            try:
+                length = len(dataloader)
+            except TypeError:
+                pass
+        lengths = comm.get().all_gather(torch.tensor([length], dtype=torch.long))
+        lengths = [lengths[rank].item() for rank in src]
+        self.length = None if min(lengths) < 0 else min(lengths)
+
+    def __iter__(self):
+        return _EncryptedDataLoaderIter(self)
+
+    def __len__(self):
+        if self.length is None:
+            raise TypeError("dataloader of a data owner has no length")
+        return self.length
+
+
+class _EncryptedDataLoaderIter:
+    """Iterator over the batches of an `EncryptedDataLoader`."""
+
+    def __init__(self, loader):
+        self.src = loader.src
+        self.dim = loader.dim
+        self.num_prefetch = loader.num_prefetch
+        self.rank = comm.get().get_rank()
+
+        # derive generators for the encryption thread from the shared generators:
+        generators = []
+        for generator in [comm.get().g0, comm.get().g1]:
+            seed = generator.random_words(1).item()
+            generators.append(PhiloxGenerator(seed))
+        communicator = _PrivateGeneratorCommunicator(comm.get(), *generators)
+        self.executor = ThreadPoolExecutor(
+            max_workers=1,
+            initializer=set_thread_communicator,
+            initargs=(communicator,),
+        )
+        self.pending = collections.deque()
+        self.exhausted = False
+
+        # start reading batches in the background:
+        self.stopped = threading.Event()
+        self.batches = None
+        if self.rank in self.src:
+            self.batches = queue.Queue(maxsize=max(self.num_prefetch, 1))
+            threading.Thread(
+                target=self._read, args=(loader.dataloader,), daemon=True
+            ).start()
+
+    def _read(self, dataloader):
+        """Reads batches from the dataloader into the (bounded) queue."""
+        try:
+            for batch in dataloader:
+                if not self._put(batch):
+                    return
+            self._put(None)
+        except BaseException as error:
+            self._put(error)
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _exchange_structure(self, batch):
+        """
+        Communicates the sizes of the tensors in the next batch of every data
+        owner. Returns `None` if any of the data owners has no more batches.
+        """
+        header = [1, 0, 0]  # parties that do not own data send no structure
+        if self.rank in self.src:
+            if batch is None:
+                header = [0, 0, 0]
+            else:
+                is_tuple = isinstance(batch, (list, tuple))
+                tensors = batch if is_tuple else [batch]
+                header = [1, int(is_tuple), len(tensors)]
+                for tensor in tensors:
+                    header.extend([tensor.dim()] + list(tensor.size()))
+        assert len(header) <= _MAX_HEADER_LENGTH, "batch structure too large"
+        header = header + [0] * (_MAX_HEADER_LENGTH - len(header))
+        headers = comm.get().all_gather(torch.tensor(header, dtype=torch.long))
+
+        # parse structure of the batches of all data owners:
+        structure = []
+        for src in self.src:
+            header = headers[src].tolist()
+            if header[0] == 0:
+                return None
+            sizes, offset = [], 3
+            for _ in range(header[2]):
+                ndim = header[offset]
+                sizes.append(torch.Size(header[offset + 1 : offset + 1 + ndim]))
+                offset += 1 + ndim
+            structure.append((bool(header[1]), sizes))
+        return structure
+
+    def _encrypt(self, batch, structure):
+        """Encrypts a batch (executed on the encryption thread)."""
+        is_tuple, sizes = structure[0]
+        assert all(
+            len(other_sizes) == len(sizes) for _, other_sizes in structure
+        ), "data owners must provide the same number of tensors per batch"
+        if batch is not None and not isinstance(batch, (list, tuple)):
+            batch = [batch]
+        result = []
+        for idx in range(len(sizes)):
+            columns = []
+            for src, (_, src_sizes) in zip(self.src, structure):
+                if self.rank == src:
+                    tensor = batch[idx]
+                else:
+                    tensor = torch.empty(src_sizes[idx])
+                columns.append(crypten.cryptensor(tensor, src=src))
+            if len(columns) > 1:
+                result.append(crypten.cat(columns, dim=self.dim))
+            else:
+                result.append(columns[0])
+        return result if is_tuple else result[0]
+
+    def _schedule(self):
+        """Starts encrypting the next batch, if there is one."""
+        batch = None
+        if self.batches is not None:
+            batch = self.batches.get()
+            if isinstance(batch, BaseException):
+                self.close()
+                raise batch
+        structure = self._exchange_structure(batch)
+        if structure is None:
+            self.exhausted = True
+        else:
+            self.pending.append(self.executor.submit(self._encrypt, batch, structure))
+
+    def _fill(self, num_pending):
+        while not self.exhausted and len(self.pending) < num_pending:
+            self._schedule()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self._fill(self.num_prefetch + 1)
+        if len(self.pending) == 0:
+            self.close()
+            raise StopIteration
+        result = self.pending.popleft().result()
+
+        # start encrypting the next batches before the current one is processed:
+        self._fill(self.num_prefetch)
+        return result
+
+    def close(self):
+        """Stops the background threads."""
+        if hasattr(self, "executor"):
+            self.stopped.set()
+            self.executor.shutdown(wait=False)
+
+    def __del__(self):
+        self.close()
@@ -5,6 +5,7 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
+import math
 from functools import reduce
 
 import crypten
@@ -76,6 +77,26 @@ def _inverse_broadcast(grad_output, input_size):
     return grad_output
 
 
+def _grad_input_padding(grad_output, input_size, stride, padding, kernel_size):
+    """
+    Returns the output padding of the transposed convolution that computes the
+    gradient of a (strided) convolution or pooling with respect to its input.
+    The padding recovers the rows and columns of the input that the strides
+    skipped.
+    """
+    if isinstance(stride, int):
+        stride = (stride, stride)
+    if isinstance(padding, int):
+        padding = (padding, padding)
+    return tuple(
+        input_size[2 + dim]
+        - (grad_output.size(2 + dim) - 1) * stride[dim]
+        + 2 * padding[dim]
+        - kernel_size[dim]
+        for dim in range(2)
+    )
+
+
 class AutogradFunction(object):
     """
     Base implementation of a function that supports autograd.
@@ -959,9 +980,9 @@ class AutogradSigmoid(AutogradFunction):
 @register_function("softmax")
 class AutogradSoftmax(AutogradFunction):
     @staticmethod
-    def forward(ctx, input):
+    def forward(ctx, input, logit_range=None):
         input, dim = input
-        probs = input.softmax(dim)
+        probs = input.softmax(dim, logit_range=logit_range)
         ctx.save_multiple_for_backward([probs, dim])
         return probs
 
@@ -1031,7 +1052,7 @@ class AutogradAvgPool2D(AutogradFunction):
         ones = torch.ones(inchannels, inchannels, kernel_size, kernel_size)
 
         # compute gradient with respect to input:
-        output_padding = torch.nn.grad._grad_input_padding(
+        output_padding = _grad_input_padding(
             grad_output, input_size, stride, padding, (kernel_size, kernel_size)
         )
         return grad_output.conv_transpose2d(
@@ -1103,7 +1124,6 @@ class AutogradConv2D(AutogradFunction):
 
         # get input, kernel, and sizes:
         input, kernel, padding, stride = ctx.saved_tensors
-        assert stride == (1, 1), "stride different than 1 not currently supported"
         batch_size = input.size(0)
         out_channels, in_channels, kernel_size_y, kernel_size_x = kernel.size()
         assert input.size(1) == in_channels, "wrong number of input channels"
@@ -1111,40 +1131,22 @@ class AutogradConv2D(AutogradFunction):
         assert grad_output.size(0) == batch_size, "wrong batch size"
 
         # compute gradient with respect to input:
-        output_padding = torch.nn.grad._grad_input_padding(
+        output_padding = _grad_input_padding(
             grad_output, input.size(), stride, padding, (kernel_size_y, kernel_size_x)
         )
         grad_input = grad_output.conv_transpose2d(
             kernel, stride=stride, padding=padding, output_padding=output_padding
         )
 
-        # compute gradient with respect to kernel:
-        grad_output = grad_output.repeat(1, in_channels, 1, 1)
-        grad_output = grad_output.view(
-            grad_output.size(0) * grad_output.size(1),
-            1,
-            grad_output.size(2),
-            grad_output.size(3),
-        )
-        input = input.view(
-            1, input.size(0) * input.size(1), input.size(2), input.size(3)
-        )
-        grad_kernel = input.conv2d(
-            grad_output, padding=padding, stride=stride, groups=in_channels * batch_size
-        )
-        grad_kernel = grad_kernel.view(
-            batch_size,
-            grad_kernel.size(1) // batch_size,
-            grad_kernel.size(2),
-            grad_kernel.size(3),
-        )
-        grad_kernel = (
-            grad_kernel.sum(dim=0)
-            .view(in_channels, out_channels, grad_kernel.size(2), grad_kernel.size(3))
-            .transpose(0, 1)
-        )
-        grad_kernel = grad_kernel.narrow(2, 0, kernel_size_y)
-        grad_kernel = grad_kernel.narrow(3, 0, kernel_size_x)
+        # compute gradient with respect to kernel as a single matrix product
+        # of the output gradient and the unfolded input patches (im2col):
+        input = input.pad((padding[1], padding[1], padding[0], padding[0]))
+        input = input.unfold(2, kernel_size_y, stride[0])
+        input = input.unfold(3, kernel_size_x, stride[1])
+        input = input.transpose(1, 2).transpose(2, 3)  # N x H x W x C x kH x kW
+        input = input.reshape(-1, in_channels * kernel_size_y * kernel_size_x)
+        grad_output = grad_output.transpose(0, 1).reshape(out_channels, -1)
+        grad_kernel = grad_output.matmul(input).view(kernel.size())
         return (grad_input, grad_kernel)
 
 
@@ -1236,13 +1238,38 @@ class AutogradBinaryCrossEntropy(AutogradFunction):
 @register_function("cross_entropy")
 class AutogradCrossEntropy(AutogradFunction):
     @staticmethod
-    def forward(ctx, input):
+    def forward(ctx, input, logit_range=None):
         pred, target = input  # NOTE: target is assumed to be one-hot vector.
-        softmax = pred.softmax(1)
+
+        # center logits by their maximum, or by their mean when they are known
+        # to lie in [-logit_range, logit_range] (which avoids all comparisons).
+        # As in `MPCTensor.softmax`, the mean-centered logits are shifted by
+        # -log(n) so that the denominator lies in [1, exp(2R(n - 1) / n)]:
+        if logit_range is None:
+            logits = pred - pred.max(1, keepdim=True)[0]
+        else:
+            n = pred.size(1)
+            logits = pred - pred.mean(1, keepdim=True) - math.log(n)
+            max_denominator = math.exp(2 * logit_range * (n - 1) / n)
+        numerator = logits.exp()
+        denominator = numerator.sum(1, keepdim=True)
+
+        # for one-hot targets, -sum(target * log(softmax)) equals
+        # log(denominator) - sum(target * logits) for any shift of the logits,
+        # so the logarithm is only computed on the denominator. Without a
+        # range, its reciprocal reuses that logarithm:
+        if logit_range is None:
+            log_denominator = denominator.log()
+            inverse = log_denominator.neg().exp()
+        else:
+            input_range = (1, max_denominator)
+            log_denominator = denominator.log(input_range=input_range)
+            inverse = denominator.reciprocal(all_pos=True, input_range=input_range)
+        softmax = numerator.mul(inverse.expand(numerator.size()))
         ctx.save_multiple_for_backward([softmax, target])
         ctx.mark_non_differentiable(target)
-        loss_values = softmax.log().mul_(target).neg_()
-        return loss_values.sum().div_(target.size(0))
+        loss = log_denominator.sum().sub(logits.mul(target).sum())
+        return loss.div_(target.size(0))
 
     @staticmethod
     def backward(ctx, grad_output):
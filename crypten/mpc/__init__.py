@@ -9,12 +9,19 @@ import torch
 from crypten.mpc import primitives  # noqa: F401
 from crypten.mpc import provider  # noqa: F40
 
-from .context import run_multiprocess
+from .context import PartyPool, run_multiprocess
 from .mpc import MPCTensor
 from .ptype import ptype
 
 
-__all__ = ["MPCTensor", "primitives", "provider", "ptype", "run_multiprocess"]
+__all__ = [
+    "MPCTensor",
+    "PartyPool",
+    "primitives",
+    "provider",
+    "ptype",
+    "run_multiprocess",
+]
 
 
 def __cat_stack_helper(op, tensors, *args, **kwargs):
@@ -107,3 +114,28 @@ def set_default_provider(new_default_provider):
 
 def get_default_provider():
     return __default_provider
+
+
+# Set activation mode
+__SUPPORTED_ACTIVATION_MODES = ["exact", "nr", "poly", "hard"]
+__activation_mode = __SUPPORTED_ACTIVATION_MODES[0]
+
+
+def set_activation_mode(new_activation_mode):
+    """Sets the approximation used by `sigmoid` and `tanh`:
+
+        'exact': reciprocal of `1 + exp(-|x|)` computed through `log` and `exp`
+        'nr'   : reciprocal of `1 + exp(-|x|)` computed with Newton-Raphson
+                 iterations from an initial guess fitted to its range [1, 2]
+        'poly' : odd polynomial fitted to sigmoid on a clamped input range
+        'hard' : piecewise-linear hard sigmoid `clamp(x / 4 + 0.5, 0, 1)`
+    """
+    global __activation_mode
+    assert new_activation_mode in __SUPPORTED_ACTIVATION_MODES, (
+        "Activation mode %s is not supported" % new_activation_mode
+    )
+    __activation_mode = new_activation_mode
+
+
+def get_activation_mode():
+    return __activation_mode
@@ -5,19 +5,32 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
+import atexit
 import functools
 import logging
 import multiprocessing
 import os
+import pickle
 import tempfile
+import time
+import traceback
 from operator import itemgetter
+from queue import Empty
 
 import crypten
+import crypten.communicator as comm
+import torch
 from crypten.communicator import DistributedCommunicator
 
 
-def _launch(func, rank, world_size, rendezvous_file, queue, func_args, func_kwargs):
+# set in the processes of a `PartyPool`:
+_in_pool_worker = False
+
+# persistent pools used by `run_multiprocess`, indexed by world size:
+_pools = {}
+
 
+def _set_environment(rank, world_size, rendezvous_file):
     communicator_args = {
         "WORLD_SIZE": world_size,
         "RANK": rank,
@@ -27,22 +40,221 @@ def _launch(func, rank, world_size, rendezvous_file, queue, func_args, func_kwar
     for key, val in communicator_args.items():
         os.environ[key] = str(val)
 
+
+def _launch(func, rank, world_size, rendezvous_file, queue, func_args, func_kwargs):
+    _set_environment(rank, world_size, rendezvous_file)
     crypten.init()
 
     return_value = func(*func_args, **func_kwargs)
     queue.put((rank, return_value))
 
 
-def run_multiprocess(world_size):
+def _worker(rank, world_size, rendezvous_file, tasks, results):
+    """Main loop of a party process of a `PartyPool`."""
+    global _in_pool_worker
+    _in_pool_worker = True
+    _set_environment(rank, world_size, rendezvous_file)
+    crypten.init()
+
+    while True:
+        item = tasks.get()
+        if item is None:
+            break
+        task_id, work_item = item
+        try:
+            func, args, kwargs = pickle.loads(work_item)
+            return_value = pickle.dumps(func(*args, **kwargs))
+            results.put((task_id, rank, True, return_value))
+        except Exception:
+            results.put((task_id, rank, False, traceback.format_exc()))
+    crypten.uninit()
+
+
+def _ping():
+    """Work item used for health checks: performs a round of communication."""
+    return int(comm.get().all_reduce(torch.tensor([1])).item())
+
+
+class PartyPool:
+    """Pool of `world_size` persistent party processes.
+
+    The parties are initialized once (including the setup of the communicator
+    and of the generators for pseudo-random sharings of zero) and then execute
+    work items that are submitted through `run`. Work items are serialized with
+    `pickle`, so functions must be importable by name (e.g., module-level
+    functions). If a party fails, the pool is restarted: the remaining parties
+    may be blocked waiting for communication with the failed party.
+
+    Args:
+        world_size (int): number of parties / processes to initiate.
+        timeout (float): maximum time (in seconds) a work item may take, or
+            `None` to wait indefinitely.
+    """
+
+    def __init__(self, world_size, timeout=None):
+        assert world_size > 0, "world_size must be positive"
+        self.world_size = world_size
+        self.timeout = timeout
+        self.processes = []
+        self.task_id = 0
+        self._start()
+
+    def _start(self):
+        rendezvous_file = tempfile.NamedTemporaryFile(delete=True).name
+        self.tasks = [multiprocessing.Queue() for _ in range(self.world_size)]
+        self.results = multiprocessing.Queue()
+        self.processes = [
+            multiprocessing.Process(
+                target=_worker,
+                args=(rank, self.world_size, rendezvous_file, tasks, self.results),
+                daemon=True,
+            )
+            for rank, tasks in enumerate(self.tasks)
+        ]
+
+        # the parties must not inherit the communicator of this process (see
+        # `run_multiprocess`):
+        was_initialized = DistributedCommunicator.is_initialized()
+        if was_initialized:
+            crypten.uninit()
+        for process in self.processes:
+            process.start()
+        if was_initialized:
+            crypten.init()
+
+    def _submit(self, func, args, kwargs):
+        """Sends a work item to all parties and returns its identifier."""
+        work_item = pickle.dumps((func, args, kwargs))
+        self.task_id += 1
+        for tasks in self.tasks:
+            tasks.put((self.task_id, work_item))
+        return self.task_id
+
+    def _collect(self, task_id, timeout):
+        """
+        Returns the return values of a work item in the order of the ranks, or
+        `None` if a party failed, died, or did not finish within `timeout`.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        return_values = {}
+        while len(return_values) < self.world_size:
+            try:
+                result_id, rank, successful, value = self.results.get(timeout=0.1)
+            except Empty:
+                if not self.is_alive():
+                    logging.error("A party process died")
+                    return None
+                if deadline is not None and time.monotonic() > deadline:
+                    logging.error("Work item timed out")
+                    return None
+                continue
+            if result_id != task_id:  # result of an earlier, failed work item
+                continue
+            if not successful:
+                logging.error("Party %d failed:\n%s" % (rank, value))
+                return None
+            return_values[rank] = pickle.loads(value)
+        return [return_values[rank] for rank in range(self.world_size)]
+
+    def run(self, func, *args, **kwargs):
+        """
+        Runs `func(*args, **kwargs)` on all parties and returns the list of
+        return values (ordered by rank), or `None` if one of the parties failed.
+        """
+        assert len(self.processes) > 0, "pool has been shut down"
+        if not self.is_alive():
+            logging.warning("Restarting party pool with dead processes")
+            self.restart()
+        task_id = self._submit(func, args, kwargs)
+        return_values = self._collect(task_id, self.timeout)
+        if return_values is None:
+            logging.error("One of the parties failed. Restarting party pool")
+            self.restart()
+        return return_values
+
+    def is_alive(self):
+        """Returns `True` if all party processes are running."""
+        return len(self.processes) > 0 and all(
+            process.is_alive() for process in self.processes
+        )
+
+    def health_check(self, timeout=10.0):
+        """
+        Returns `True` if all party processes are running and can communicate
+        with each other within `timeout` seconds. If the parties cannot
+        communicate, the pool is restarted (as in `run`), since some parties
+        may remain blocked in the communication of the health check.
+        """
+        if not self.is_alive():
+            return False
+        task_id = self._submit(_ping, (), {})
+        healthy = self._collect(task_id, timeout) == [self.world_size] * self.world_size
+        if not healthy:
+            logging.error("Health check failed. Restarting party pool")
+            self.restart()
+        return healthy
+
+    def restart(self):
+        """Terminates all party processes and starts new ones."""
+        self._stop(timeout=0)
+        self._start()
+
+    def _stop(self, timeout):
+        for process, tasks in zip(self.processes, self.tasks):
+            if process.is_alive():
+                tasks.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.processes = []
+
+    def shutdown(self, timeout=5.0):
+        """
+        Stops all party processes, giving them `timeout` seconds to finish
+        their current work item before they are terminated.
+        """
+        self._stop(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.shutdown()
+
+
+@atexit.register
+def _shutdown_pools():
+    for pool in _pools.values():
+        pool.shutdown()
+    _pools.clear()
+
+
+def run_multiprocess(world_size, persistent=False):
     """Defines decorator to run function across multiple processes
 
     Args:
         world_size (int): number of parties / processes to initiate.
+        persistent (bool): if `True`, the function is run on a `PartyPool`
+            that is shared by all decorated functions with the same
+            `world_size`, instead of on newly started processes. This avoids
+            the startup cost of the parties on every call, but requires the
+            function and its arguments to be serializable with `pickle`.
     """
 
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
+            # inside a party process, run the function directly:
+            if _in_pool_worker:
+                return func(*args, **kwargs)
+
+            if persistent:
+                if world_size not in _pools:
+                    _pools[world_size] = PartyPool(world_size)
+                return _pools[world_size].run(wrapper, *args, **kwargs)
+
             rendezvous_file = tempfile.NamedTemporaryFile(delete=True).name
             queue = multiprocessing.Queue()
 
@@ -5,6 +5,8 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
+import math
+
 import crypten
 import torch
 from crypten.common.util import pool_reshape
@@ -31,14 +33,21 @@ def mode(ptype, inplace=False):
 
         def function_wrapper(func):
             def convert_wrapper(self, *args, **kwargs):
-                result = self.to(ptype)
-                return func(result, *args, **kwargs)
+                # functions wrapped in this mode do not modify their input, so
+                # there is no need to copy it if it already has the right ptype
+                if self.ptype != ptype:
+                    self = self.to(ptype)
+                return func(self, *args, **kwargs)
 
             return convert_wrapper
 
     return function_wrapper
 
 
+def _is_public_zero(value):
+    return isinstance(value, (int, float)) and value == 0
+
+
 def _one_hot_to_index(tensor, dim, keepdim):
     """
     Converts a one-hot tensor output from an argmax / argmin function to a
@@ -56,6 +65,41 @@ def _one_hot_to_index(tensor, dim, keepdim):
         return result.sum(dim, keepdim=keepdim)
 
 
+# Least-squares fit of sigmoid(6 * t) - 0.5 for t in [-1, 1] by an odd polynomial
+# of degree 9. The maximum error of the approximation is below 0.006.
+_SIGMOID_POLY_RANGE = 6
+_SIGMOID_POLY_COEFFS = [1.461291, 0, -3.402363, 0, 5.939711, 0, -5.433695, 0, 1.938467]
+
+# Minimum value (in units of the fixed-point encoding) of the initial guess of
+# a reciprocal with a known input range. Smaller guesses lose too much precision.
+_RECIPROCAL_MIN_GUESS_UNITS = 16
+
+
+# Coefficients of the polynomial in the Householder iterations of `log`:
+_LOG_COEFFS = [1, 1 / 2, 1 / 3, 1 / 6, 1 / 5, 1 / 7]
+
+
+def _log_iterations(error, precision):
+    """Returns the number of Householder iterations of `log` that reduce the
+    initial error `error >= 0` of an overestimate of the logarithm below
+    `precision`."""
+    iterations = 0
+    while error > precision:
+        h = 1 - math.exp(-error)
+        error -= sum(c * h ** (k + 1) for k, c in enumerate(_LOG_COEFFS))
+        iterations += 1
+    return iterations
+
+
+def _reciprocal_guess_error(c0, c1, low, high):
+    """Returns the maximum relative error of the reciprocal guess `c0 - c1 * x`
+    on `[low, high]`, which is attained at the end points or at the vertex."""
+    points = [low, high]
+    if c1 > 0 and low < c0 / (2 * c1) < high:
+        points.append(c0 / (2 * c1))
+    return max(abs(1 - x * (c0 - c1 * x)) for x in points)
+
+
 class MPCTensor(CrypTensor):
     def __init__(self, input, ptype=Ptype.arithmetic, *args, **kwargs):
         if input is None:
@@ -85,9 +129,9 @@ class MPCTensor(CrypTensor):
         Args:
             ptype: Ptype.arithmetic or Ptype.binary.
         """
-        retval = self.clone()
-        if retval.ptype == ptype:
-            return retval
+        if self.ptype == ptype:
+            return self.clone()
+        retval = self.shallow_copy()
         retval._tensor = convert(self._tensor, ptype, **kwargs)
         retval.ptype = ptype
         return retval
@@ -100,9 +144,9 @@ class MPCTensor(CrypTensor):
         """Converts self._tensor to binary secret sharing"""
         return self.to(Ptype.binary)
 
-    def get_plain_text(self):
-        """Decrypts the tensor"""
-        return self._tensor.get_plain_text()
+    def get_plain_text(self, dst=None):
+        """Decrypts the tensor (for party `dst` only, if specified)"""
+        return self._tensor.get_plain_text(dst=dst)
 
     def __bool__(self):
         """Override bool operator since encrypted tensors cannot evaluate"""
@@ -161,6 +205,8 @@ class MPCTensor(CrypTensor):
     @mode(Ptype.arithmetic)
     def gt(self, y):
         """Returns self > y"""
+        if _is_public_zero(y):
+            return (-self)._ltz()
         return (-self + y)._ltz()
 
     @mode(Ptype.arithmetic)
@@ -171,6 +217,9 @@ class MPCTensor(CrypTensor):
     @mode(Ptype.arithmetic)
     def lt(self, y):
         """Returns self < y"""
+        if _is_public_zero(y):
+            # comparing `self` directly allows reuse of its cached conversion
+            return self._ltz()
         return (self - y)._ltz()
 
     @mode(Ptype.arithmetic)
@@ -196,7 +245,8 @@ class MPCTensor(CrypTensor):
     @mode(Ptype.arithmetic)
     def relu(self):
         """Compute a Rectified Linear function on the input tensor."""
-        return self * (self > 0)
+        # (self >= 0) shares its binary conversion with `sign` and `abs`
+        return self * (self >= 0)
 
     # max / min-related functions
     def _argmax_helper(self):
@@ -273,6 +323,7 @@ class MPCTensor(CrypTensor):
         input planes.
         """
         max_input = self.shallow_copy()
+        max_input._tensor = self._tensor.shallow_copy()
         max_input.share, output_size = pool_reshape(
             self.share,
             kernel_size,
@@ -372,6 +423,14 @@ class MPCTensor(CrypTensor):
 
         return self * condition + y_masked
 
+    @mode(Ptype.arithmetic)
+    def _clamp(self, min_value, max_value):
+        """Clamps all elements to the public range [`min_value`, `max_value`]
+        using a single (batched) comparison and a single multiplication."""
+        masks = crypten.mpc.stack([self - min_value, max_value - self])._ltz()
+        corrections = crypten.mpc.stack([min_value - self, max_value - self])
+        return self + masks.mul(corrections).sum(0)
+
     # Logistic Functions
     @mode(Ptype.arithmetic)
     def sigmoid(self, reciprocal_method="log"):
@@ -380,10 +439,27 @@ class MPCTensor(CrypTensor):
 
         For numerical stability, we compute this by:
                 sigmoid(x) = (sigmoid(|x|) - 0.5) * sign(x) + 0.5
+
+        The approximation used is determined by the activation mode set with
+        :func:`crypten.mpc.set_activation_mode`. The `reciprocal_method`
+        argument is only used in the 'exact' mode.
         """
+        activation_mode = crypten.mpc.get_activation_mode()
+        if activation_mode == "hard":
+            return self.div(4).add(0.5)._clamp(0, 1)
+        elif activation_mode == "poly":
+            x = self.div(_SIGMOID_POLY_RANGE)._clamp(-1, 1)
+            return x.polynomial(_SIGMOID_POLY_COEFFS).add(0.5)
+
         sign = self.sign()
         x = self * sign
-        result = (1 + (-x).exp()).reciprocal(method=reciprocal_method, log_iters=2)
+        if activation_mode == "nr":
+            # 1 + exp(-|x|) is known to lie in [1, 2]
+            result = (1 + (-x).exp()).reciprocal(all_pos=True, input_range=(1, 2))
+        else:
+            result = (1 + (-x).exp()).reciprocal(
+                method=reciprocal_method, log_iters=2
+            )
         return (result - 0.5) * sign + 0.5
 
     @mode(Ptype.arithmetic)
@@ -394,8 +470,15 @@ class MPCTensor(CrypTensor):
         return (self * 2).sigmoid(reciprocal_method=reciprocal_method) * 2 - 1
 
     @mode(Ptype.arithmetic)
-    def softmax(self, dim, **kwargs):
+    def softmax(self, dim, logit_range=None, **kwargs):
         """Compute the softmax of a tensor's elements along a given dimension
+
+        By default, the maximum value along `dim` is subtracted from the input
+        for numerical stability. If all elements of the input are known to lie
+        in `[-logit_range, logit_range]`, the mean is subtracted instead, which
+        requires no comparisons. Since the fixed-point approximations of `exp`
+        and `reciprocal` lose accuracy on large inputs, `logit_range` should be
+        small (e.g., at most 4).
         """
         # 0-d case
         if self.dim() == 0:
@@ -405,11 +488,24 @@ class MPCTensor(CrypTensor):
         if self.size(dim) == 1:
             return MPCTensor(torch.ones(self.size()))
 
-        maximum_value = self.max(dim, keepdim=True)[0]
-        logits = self - maximum_value
+        # The largest centered logit is 0, so the denominator lies in [1, n]
+        n = self.size(dim)
+        if logit_range is None:
+            logits = self - self.max(dim, keepdim=True)[0]
+            max_denominator = n
+        else:
+            # The mean of exp(x_i - mean - log(n)) is at least exp(-log(n)) by
+            # Jensen's inequality, so the denominator again is at least 1:
+            logits = self - self.mean(dim, keepdim=True) - math.log(n)
+            max_denominator = math.exp(2 * logit_range * (n - 1) / n)
         numerator = logits.exp()
         denominator = numerator.sum(dim, keepdim=True)
-        return numerator / denominator
+
+        # Only compute the reciprocal of the (much smaller) denominator
+        inverse = denominator.reciprocal(
+            all_pos=True, input_range=(1, max_denominator)
+        )
+        return numerator.mul(inverse.expand(numerator.size()))
 
     @mode(Ptype.arithmetic)
     def pad(self, pad, mode="constant", value=0):
@@ -420,6 +516,59 @@ class MPCTensor(CrypTensor):
             result._tensor = self._tensor.pad(pad, mode=mode, value=value)
         return result
 
+    # Polynomials:
+    @mode(Ptype.arithmetic)
+    def powers(self, n):
+        """Computes the powers :math:`x, x^2, ..., x^n` of the input and returns
+        them stacked along a new leading dimension of size `n`.
+
+        Each round multiplies all powers computed so far with the highest one,
+        doubling the number of available powers. All products of a round are
+        computed by a single multiplication of stacked tensors, so only
+        :math:`\\lceil \\log_2 n \\rceil` rounds of communication are needed.
+
+        Args:
+            n (int): highest power to compute
+        """
+        assert isinstance(n, int) and n > 0, "powers requires a positive integer"
+        terms = self.unsqueeze(0)
+        while terms.size(0) < n:
+            num_terms = terms.size(0)
+            num_new = min(num_terms, n - num_terms)
+            highest = terms[num_terms - 1 : num_terms].expand(num_new, *self.size())
+            terms = crypten.mpc.cat([terms, terms[:num_new].mul(highest)])
+        return terms
+
+    def polynomial(self, coeffs):
+        """Evaluates a polynomial with coefficients `coeffs` on the input:
+
+        .. math::
+
+            p(x) = c_1 x + c_2 x^2 + ... + c_n x^n
+
+        Coefficients are ordered from the linear term to the highest order term
+        (the constant term is not included). `coeffs` can be a list, a 1-D
+        tensor, or a 2-D tensor where each row holds the coefficients of one
+        polynomial. In the latter case, all polynomials are evaluated from the
+        same set of powers and the results are stacked along a new leading
+        dimension.
+
+        Args:
+            coeffs (list or torch.Tensor): polynomial coefficients
+        """
+        if isinstance(coeffs, (list, tuple)):
+            coeffs = torch.tensor(coeffs)
+        assert torch.is_tensor(coeffs), "coeffs must be a list or a tensor"
+        assert coeffs.dim() in [1, 2], "coeffs must be 1-D or 2-D"
+        coeffs = coeffs.float()
+
+        n = coeffs.size(-1)
+        terms = self.powers(n).view(n, -1)
+        result = terms.t().matmul(coeffs.t())
+        if coeffs.dim() == 1:
+            return result.view(self.size())
+        return result.t().reshape(coeffs.size(0), *self.size())
+
     # Approximations:
     def exp(self, iterations=8):
         """Approximates the exponential function using a limit approximation:
@@ -439,7 +588,7 @@ class MPCTensor(CrypTensor):
             result = result.square()
         return result
 
-    def log(self, iterations=2, exp_iterations=8):
+    def log(self, iterations=2, exp_iterations=8, input_range=None):
         """Approximates the natural logarithm using 6th order modified
         Householder iterations.
 
@@ -453,7 +602,29 @@ class MPCTensor(CrypTensor):
             iterations (int): number of iterations for 6th order modified
                 Householder approximation.
             exp_iterations (int): number of iterations for limit approximation of exp
+            input_range (tuple): public bounds `(a, b)` with `0 < a < b` on the
+                input. When given, the input is divided by :math:`\\sqrt{ab}`, so
+                that its logarithm lies in a range that is symmetric around 0,
+                and the iterations start from the upper end of that range. The
+                method runs as many iterations as needed to converge on `[a, b]`
+                (at least `iterations`).
         """
+        if input_range is not None:
+            low, high = input_range
+            assert 0 < low < high, "input_range must satisfy 0 < a < b"
+            center = (math.log(low) + math.log(high)) / 2
+            half_width = (math.log(high) - math.log(low)) / 2
+            x = self * math.exp(-center)
+            scale = self._tensor.encoder.scale
+            iterations = max(iterations, _log_iterations(2 * half_width, 1 / scale))
+
+            # the first iteration starts from the public guess half_width:
+            h = 1 - x * math.exp(-half_width)
+            y = h.polynomial(_LOG_COEFFS).neg().add(half_width)
+            for _ in range(iterations - 1):
+                h = 1 - x * (-y).exp(iterations=exp_iterations)
+                y -= h.polynomial(_LOG_COEFFS)
+            return y.add(center)
 
         # Initialization to a decent estimate (found by qualitative inspection):
         #                ln(x) = x/40 - 8exp(-2x - .3) + 1.9
@@ -464,15 +635,13 @@ class MPCTensor(CrypTensor):
         # 6th order Householder iterations
         for _ in range(iterations):
             h = 1 - self * (-y).exp(iterations=exp_iterations)
-            h2 = h.square()
-            h3 = h2 * h
-            h4 = h2.square()
-            h5 = h4 * h
-            y -= h * (1 + h.div(2) + h2.div_(3) + h3.div_(6) + h4.div_(5) + h5.div_(7))
+            y -= h.polynomial(_LOG_COEFFS)
 
         return y
 
-    def reciprocal(self, method="NR", nr_iters=10, log_iters=1, all_pos=False):
+    def reciprocal(
+        self, method="NR", nr_iters=10, log_iters=1, all_pos=False, input_range=None
+    ):
         """
         Methods:
             'NR' : `Newton-Raphson`_ method computes the reciprocal using iterations
@@ -490,6 +659,15 @@ class MPCTensor(CrypTensor):
             all_pos (bool): determines whether all elements
                        of the input are known to be positive, which optimizes
                        the step of computing the sign of the input.
+            input_range (tuple): public bounds `(a, b)` with `0 < a < b` on the
+                       (absolute) values of the input. When given, the `NR` method
+                       uses the linear initial guess :math:`c_0 - c_1 x` that
+                       minimizes the maximum relative error on `[a, b]`. If that
+                       guess is not representable in fixed point (for wide
+                       ranges), the guess :math:`(2 - x / b) / b` is used instead.
+                       The method runs as many iterations as needed to reach
+                       fixed-point precision on `[a, b]` (ignoring `nr_iters`).
+                       The bound `b` must be smaller than the fixed-point scale.
 
         .. _Newton-Raphson:
             https://en.wikipedia.org/wiki/Newton%27s_method
@@ -498,15 +676,54 @@ class MPCTensor(CrypTensor):
             sgn = self.sign()
             abs = sgn * self
             return sgn * abs.reciprocal(
-                method=method, nr_iters=nr_iters, log_iters=log_iters, all_pos=True
+                method=method,
+                nr_iters=nr_iters,
+                log_iters=log_iters,
+                all_pos=True,
+                input_range=input_range,
             )
 
         if method == "NR":
-            # Initialization to a decent estimate (found by qualitative inspection):
-            #                1/x = 3exp(.5 - x) + 0.003
-            result = 3 * (0.5 - self).exp() + 0.003
+            if input_range is not None:
+                low, high = input_range
+                scale = self._tensor.encoder.scale
+                assert 0 < low < high, "input_range must satisfy 0 < a < b"
+                assert high < scale, "input_range must be below the encoder scale"
+
+                # The relative error 1 - x * (c0 - c1 * x) of the minimax guess
+                # equioscillates at the end points and the center of the range.
+                # The errors are computed for the coefficients as encoded:
+                c1 = round(8 / ((low + high) ** 2 + 4 * low * high) * scale) / scale
+                c0 = round(c1 * (low + high) * scale) / scale
+                error = _reciprocal_guess_error(c0, c1, low, high)
+                if (c0 - c1 * high) * scale < _RECIPROCAL_MIN_GUESS_UNITS:
+                    error = 1  # guess underflows at the end of wide ranges
+
+                # Alternatively, take one iteration from the guess 1 / b, which
+                # only requires public multiplications:
+                inverse_high = math.floor(scale / high) / scale
+                alt_error = _reciprocal_guess_error(
+                    2 * inverse_high, inverse_high ** 2, low, high
+                )
+                if error <= alt_error:
+                    result = c0 - self * c1
+                else:
+                    error = alt_error
+                    result = (2 - self * inverse_high) * inverse_high
+                assert error < 1, "input_range is too wide for reciprocal"
+
+                # The error is squared by every Newton-Raphson iteration:
+                iters = math.log2(math.log(scale) / -math.log(error))
+                nr_iters = max(math.ceil(iters), 0)
+            else:
+                # Initialization to a decent estimate (found by qualitative
+                # inspection):
+                #                1/x = 3exp(.5 - x) + 0.003
+                result = 3 * (0.5 - self).exp() + 0.003
             for _ in range(nr_iters):
-                result += result - result.square().mul_(self)
+                # result * self is close to 1, so multiplying it by result
+                # first avoids the underflow of result ** 2 for large inputs:
+                result += result - result.mul(self).mul_(result)
             return result
         elif method == "log":
             return (-self.log(iterations=log_iters)).exp()
@@ -8,6 +8,7 @@
 from functools import reduce
 
 import crypten.communicator as comm
+import numpy as np
 
 # dependencies:
 import torch
@@ -23,6 +24,16 @@ SENTINEL = -1
 
 
 # MPC tensor where shares additive-sharings.
+def _mark_modified(share):
+    """
+    Increments the version counter of `share` without changing its values. This
+    is used when an in-place operation only modifies the share of one party, so
+    that all parties observe the modification (e.g., for invalidating cached
+    conversions).
+    """
+    share.add_(0)
+
+
 class ArithmeticSharedTensor(CrypTensor):
     """
         Encrypted tensor object that uses additive sharing to perform computations.
@@ -75,6 +86,72 @@ class ArithmeticSharedTensor(CrypTensor):
         result.encoder = FixedPointEncoder(precision_bits=precision)
         return result
 
+    @staticmethod
+    def from_chunks(
+        source=None, size=None, precision=None, src=0, chunk_size=2 ** 20, out=None
+    ):
+        """
+        Secret-shares a (very large) tensor chunk by chunk, so that the memory
+        needed in addition to the output shares is bounded by `chunk_size`.
+
+        Args:
+            source: tensor or numpy array (e.g., an `np.memmap`) that contains
+                the data of party `src`; ignored on the other parties.
+            size: size of the tensor. If `None` (on all parties), the size is
+                broadcast by `src`.
+            precision: number of bits of precision of the encoding.
+            src: party that provides the data.
+            chunk_size: number of elements shared at once (must be the same on
+                all parties).
+            out: optional preallocated long tensor or int64 numpy array (e.g.,
+                an `np.memmap`) into which the shares are written.
+        """
+        assert chunk_size > 0, "chunk_size must be positive"
+        rank = comm.get().get_rank()
+        if rank == src:
+            assert source is not None, "Source must provide a data tensor"
+
+        # make sure all parties know the size of the tensor:
+        if size is None:
+            dim = torch.tensor(len(source.shape) if rank == src else 0)
+            dim = comm.get().broadcast(dim, src=src)
+            size = torch.zeros(dim.item(), dtype=torch.long)
+            if rank == src:
+                size = torch.tensor(source.shape, dtype=torch.long)
+            size = comm.get().broadcast(size, src=src).tolist()
+        size = torch.Size([int(dim_size) for dim_size in size])
+        if rank == src:
+            assert tuple(source.shape) == tuple(size), "source has incorrect size"
+
+        # create output buffer for the shares:
+        if out is None:
+            out = torch.empty(size, dtype=torch.long)
+        elif isinstance(out, np.ndarray):
+            assert out.dtype == np.int64, "output buffer must contain int64 values"
+            out = torch.from_numpy(out)
+        assert out.dtype == torch.long, "output buffer must be a long tensor"
+        assert out.nelement() == size.numel(), "output buffer has incorrect size"
+        assert out.is_contiguous(), "output buffer must be contiguous"
+        out = out.view(size)
+
+        # share the tensor one chunk at a time:
+        result = ArithmeticSharedTensor.from_shares(out, precision=precision, src=src)
+        flat_out = out.view(-1)
+        if rank == src:
+            flat_source = source.reshape(-1)
+        for start in range(0, size.numel(), chunk_size):
+            end = min(start + chunk_size, size.numel())
+            share = ArithmeticSharedTensor.PRZS((end - start,)).share
+            if rank == src:
+                chunk = flat_source[start:end]
+                if isinstance(chunk, np.ndarray):
+                    chunk = torch.from_numpy(np.ascontiguousarray(chunk))
+                if is_int_tensor(chunk) and precision != 0:
+                    chunk = chunk.float()
+                share += result.encoder.encode(chunk)
+            flat_out[start:end] = share
+        return result
+
     @staticmethod
     def PRZS(*size):
         """
@@ -171,17 +248,24 @@ class ArithmeticSharedTensor(CrypTensor):
         )
         return result
 
-    def reveal(self):
-        """Get plaintext without any downscaling"""
+    def reveal(self, dst=None):
+        """
+        Get plaintext without any downscaling. If `dst` is specified, only
+        party `dst` obtains the plaintext and the other parties obtain `None`.
+        """
         tensor = self.share.clone()
-        return comm.get().all_reduce(tensor)
+        if dst is None:
+            return comm.get().all_reduce(tensor)
+        result = comm.get().reduce(tensor, dst)
+        return result if comm.get().get_rank() == dst else None
 
-    def get_plain_text(self):
-        """Decrypt the tensor"""
+    def get_plain_text(self, dst=None):
+        """Decrypt the tensor (for party `dst` only, if specified)"""
         # Edge case where share becomes 0 sized (e.g. result of split)
         if self.nelement() < 1:
             return torch.empty(self.share.size())
-        return self.encoder.decode(self.reveal())
+        plain_text = self.reveal(dst=dst)
+        return None if plain_text is None else self.encoder.decode(plain_text)
 
     def _arithmetic_function_(self, y, op, *args, **kwargs):
         return self._arithmetic_function(y, op, inplace=True, *args, **kwargs)
@@ -215,6 +299,8 @@ class ArithmeticSharedTensor(CrypTensor):
                     result.share = getattr(result.share, op)(y)
                 else:
                     result.share = torch.broadcast_tensors(result.share, y)[0]
+                    if inplace:
+                        _mark_modified(result.share)
             elif op == "mul_":  # ['mul_']
                 result.share = result.share.mul_(y)
             else:  # ['mul', 'matmul', 'conv2d', 'conv_transpose2d']
@@ -224,10 +310,10 @@ class ArithmeticSharedTensor(CrypTensor):
                 result.share = getattr(result.share, op)(y.share)
             else:  # ['mul', 'matmul', 'conv2d', 'conv_transpose2d']
                 # NOTE: 'mul_' calls 'mul' here
-                # Must copy _tensor.data here to support 'mul_' being inplace
-                result.share.data = getattr(beaver, op)(
-                    result, y, *args, **kwargs
-                ).share.data
+                # Must set the share storage here to support 'mul_' being inplace
+                # (`set_` also bumps the version counter of the share)
+                product = getattr(beaver, op)(result, y, *args, **kwargs)
+                result.share.set_(product.share)
         else:
             raise TypeError("Cannot %s %s with %s" % (op, type(y), type(self)))
 
@@ -367,6 +453,8 @@ class ArithmeticSharedTensor(CrypTensor):
             enc_tensor = self.encoder.encode(tensor)
             if self.rank == 0:
                 self._tensor.index_add_(dim, index, enc_tensor)
+            else:
+                _mark_modified(self.share)
         elif private:
             self._tensor.index_add_(dim, index, tensor._tensor)
         else:
@@ -394,6 +482,8 @@ class ArithmeticSharedTensor(CrypTensor):
         if public:
             if self.rank == 0:
                 self.share.scatter_add_(dim, index, self.encoder.encode(other))
+            else:
+                _mark_modified(self.share)
         elif private:
             self.share.scatter_add_(dim, index, other.share)
         else:
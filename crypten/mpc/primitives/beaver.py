@@ -24,16 +24,12 @@ def __beaver_protocol(op, x, y, *args, **kwargs):
     provider = crypten.mpc.get_default_provider()
     a, b, c = provider.generate_additive_triple(x.size(), y.size(), op, *args, **kwargs)
 
-    # Stack to vectorize reveal if possible
-    if x.size() == y.size():
-        from .arithmetic import ArithmeticSharedTensor
-
-        eps_del = ArithmeticSharedTensor.stack([x - a, y - b]).reveal()
-        epsilon = eps_del[0]
-        delta = eps_del[1]
-    else:
-        epsilon = (x - a).reveal()
-        delta = (y - b).reveal()
+    # Concatenate to open epsilon and delta in a single round
+    eps_del = comm.get().all_reduce(
+        torch.cat([(x - a).share.reshape(-1), (y - b).share.reshape(-1)])
+    )
+    epsilon = eps_del[: x.nelement()].view(x.size())
+    delta = eps_del[x.nelement() :].view(y.size())
 
     # z = c + (a * delta) + (epsilon * b) + epsilon * delta
     # TODO: Implement crypten.mul / crypten.matmul / crypten.conv{_transpose}2d
@@ -135,7 +135,7 @@ class BinarySharedTensor(CrypTensor):
         if torch.is_tensor(y) or isinstance(y, int):
             self.share &= y
         elif isinstance(y, BinarySharedTensor):
-            self.share.data = beaver.AND(self, y).share.data
+            self.share.set_(beaver.AND(self, y).share)
         else:
             raise TypeError("Cannot AND %s with %s." % (type(y), type(self)))
         return self
@@ -245,20 +245,29 @@ class BinarySharedTensor(CrypTensor):
     def trace(self, *args, **kwargs):
         raise NotImplementedError("BinarySharedTensor trace not implemented")
 
-    def reveal(self):
-        """Get plaintext without any downscaling"""
-        shares = comm.get().all_gather(self.share)
+    def reveal(self, dst=None):
+        """
+        Get plaintext without any downscaling. If `dst` is specified, only
+        party `dst` obtains the plaintext and the other parties obtain `None`.
+        """
+        if dst is None:
+            shares = comm.get().all_gather(self.share)
+        else:
+            shares = comm.get().gather(self.share, dst)
+            if comm.get().get_rank() != dst:
+                return None
         result = shares[0]
         for x in shares[1:]:
             result = result ^ x
         return result
 
-    def get_plain_text(self):
-        """Decrypt the tensor"""
+    def get_plain_text(self, dst=None):
+        """Decrypt the tensor (for party `dst` only, if specified)"""
         # Edge case where share becomes 0 sized (e.g. result of split)
         if self.nelement() < 1:
             return torch.empty(self.share.size())
-        return self.encoder.decode(self.reveal())
+        plain_text = self.reveal(dst=dst)
+        return None if plain_text is None else self.encoder.decode(plain_text)
 
     def where(self, condition, y):
         """Selects elements from self or y based on condition
@@ -15,7 +15,41 @@ from .arithmetic import ArithmeticSharedTensor
 from .binary import BinarySharedTensor
 
 
+def _get_conversion_cache():
+    """
+    Returns the conversion cache of the current communicator. Every party (and
+    every session, see `crypten.session`) has its own cache, so that caching
+    decisions only depend on the computations of that party.
+    """
+    return comm.get().conversion_cache
+
+
+def set_conversion_cache_size(max_bytes):
+    """
+    Sets the maximum number of bytes used to cache the results of
+    arithmetic-to-binary conversions. Setting this to 0 disables the cache.
+    """
+    assert max_bytes >= 0, "Cache size must be non-negative"
+    cache = _get_conversion_cache()
+    cache.clear()
+    cache.max_bytes = max_bytes
+
+
+def get_conversion_cache_stats():
+    """Returns the number of hits, misses, and evictions of the conversion cache"""
+    return dict(_get_conversion_cache().stats)
+
+
+def reset_conversion_cache_stats():
+    _get_conversion_cache().reset_stats()
+
+
 def _A2B(arithmetic_tensor):
+    conversion_cache = _get_conversion_cache()
+    binary_tensor = conversion_cache.get(arithmetic_tensor)
+    if binary_tensor is not None:
+        return binary_tensor
+
     binary_tensor = BinarySharedTensor.stack(
         [
             BinarySharedTensor(arithmetic_tensor.share, src=i)
@@ -24,6 +58,7 @@ def _A2B(arithmetic_tensor):
     )
     binary_tensor = binary_tensor.sum(dim=0)
     binary_tensor.encoder = arithmetic_tensor.encoder
+    conversion_cache.put(arithmetic_tensor, binary_tensor)
     return binary_tensor
 
 
@@ -31,6 +66,8 @@ def _B2A(binary_tensor, precision=None, bits=None):
     if bits is None:
         bits = torch.iinfo(torch.long).bits
 
+    # the bits of `binary_tensor` are consumed in place below
+    binary_tensor = binary_tensor.clone()
     arithmetic_tensor = 0
     for i in range(bits):
         binary_bit = binary_tensor & 1
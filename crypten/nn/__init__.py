@@ -6,11 +6,13 @@
 # LICENSE file in the root directory of this source tree.
 
 import io
+import logging
 
 import onnx
 import torch
 from onnx import numpy_helper
 
+from .checkpointing import Checkpoint, checkpoint
 from .loss import BCELoss, CrossEntropyLoss, L1Loss, MSELoss
 from .module import (
     Add,
@@ -35,14 +37,22 @@ from .module import (
     Reshape,
     Sequential,
     Shape,
+    Sigmoid,
     Squeeze,
     Sub,
+    Tanh,
     Unsqueeze,
     _BatchNorm,
     _ConstantPad,
     _Pool2d,
 )
-from .onnx_helper import get_attribute_value, get_parameter_name
+from .onnx_helper import (
+    fold_batchnorm_nodes,
+    fold_shape_nodes,
+    get_attribute_value,
+    get_parameter_name,
+    reorder_activation_nodes,
+)
 
 
 # expose contents of package:
@@ -56,6 +66,8 @@ __all__ = [
     "BatchNorm1d",
     "BatchNorm2d",
     "BatchNorm3d",
+    "Checkpoint",
+    "checkpoint",
     "Concat",
     "Constant",
     "ConstantPad1d",
@@ -75,8 +87,10 @@ __all__ = [
     "Reshape",
     "Sequential",
     "Shape",
+    "Sigmoid",
     "Sub",
     "Squeeze",
+    "Tanh",
     "Unsqueeze",
 ]
 
@@ -97,8 +111,10 @@ ONNX_TO_CRYPTEN = {
     "Relu": ReLU,
     "Reshape": Reshape,
     "Shape": Shape,
+    "Sigmoid": Sigmoid,
     "Sub": Sub,
     "Squeeze": Squeeze,
+    "Tanh": Tanh,
     "Unsqueeze": Unsqueeze,
 }
 
@@ -106,6 +122,12 @@ ONNX_TO_CRYPTEN = {
 def from_pytorch(pytorch_model, dummy_input):
     """
     Static function that converts a PyTorch model into a CrypTen model.
+
+    If the PyTorch model is in evaluation mode, batch normalizations that
+    follow a convolution or linear layer are folded into that layer.
+
+    The batch dimension of `dummy_input` is exported as a dynamic axis, so the
+    CrypTen model can be evaluated on batches of any size.
     """
 
     # export model to ONX graph:
@@ -117,20 +139,26 @@ def from_pytorch(pytorch_model, dummy_input):
         export_params=True,
         input_names=["input"],
         output_names=["output"],
+        dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
     )
     f.seek(0)
 
     # construct CrypTen model:
-    crypten_model = from_onnx(f)
+    crypten_model = from_onnx(f, fold_batchnorm=not pytorch_model.training)
 
     # make sure training / eval setting is copied:
     crypten_model.train(mode=pytorch_model.training)
     return crypten_model
 
 
-def from_onnx(onnx_string_or_file):
+def from_onnx(onnx_string_or_file, fold_batchnorm=False):
     """
     Constructs a CrypTen model or module from an ONNX Protobuf string or file.
+
+    If `fold_batchnorm` is set, batch normalizations that follow a `Conv` or
+    `Gemm` node are folded into the weights and bias of that node while they
+    are still unencrypted. This is only valid for models that are evaluated,
+    as the folded model uses the running statistics of the batch norm.
     """
 
     # if input is file, read string:
@@ -153,9 +181,28 @@ def from_onnx(onnx_string_or_file):
     assert len(input_names) == 1, "number of inputs should be 1"
     assert len(output_names) == 1, "number of outputs should be 1"
 
+    # fold batch normalizations into preceding layers:
+    nodes = list(onnx_model.graph.node)
+    if fold_batchnorm:
+        nodes = fold_batchnorm_nodes(nodes, all_parameters, output_names)
+
+    # evaluate computations on (public) shapes at import time:
+    nodes, constants, reshapes = fold_shape_nodes(onnx_model, nodes, all_parameters)
+
+    # perform activations and convolutions on pooled tensors where possible:
+    nodes, num_comparisons_saved = reorder_activation_nodes(
+        onnx_model, nodes, output_names
+    )
+    if num_comparisons_saved > 0:
+        logging.info(
+            "Reordering saved %d comparisons per example." % num_comparisons_saved
+        )
+
     # create graph by looping over nodes:
     crypten_model = Graph(input_names[0], output_names[0])
-    for node in onnx_model.graph.node:
+    for name, value in constants.items():
+        crypten_model.add_module(name, Constant(value), [])
+    for node in nodes:
         # get operator type:
         if node.op_type not in ONNX_TO_CRYPTEN:
             raise ValueError("CrypTen does not support op %s." % node.op_type)
@@ -177,7 +224,12 @@ def from_onnx(onnx_string_or_file):
         attributes = {attr.name: get_attribute_value(attr) for attr in node.attribute}
 
         # add CrypTen module to graph:
-        crypten_module = cls.from_onnx(parameters=parameters, attributes=attributes)
+        if node_output_name in reshapes:
+            shape = reshapes[node_output_name]
+            crypten_module = Flatten(axis=1) if shape == [0, -1] else Reshape(shape)
+            node_input_names = node_input_names[:1]
+        else:
+            crypten_module = cls.from_onnx(parameters=parameters, attributes=attributes)
         crypten_model.add_module(node_output_name, crypten_module, node_input_names)
 
     # return model (or module when there is only one module):
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import crypten.communicator as comm
+from crypten.autograd_cryptensor import AutogradCrypTensor, _autograd_forward
+from crypten.communicator.fused_communicator import (
+    FusedCommunicator,
+    get_thread_communicator,
+    set_thread_communicator,
+)
+from crypten.gradients import AutogradFunction
+
+from .module import Module
+
+
+# communicator functions that perform a round of communication:
+_COMMUNICATION_FUNCTIONS = [
+    "send",
+    "recv",
+    "isend",
+    "irecv",
+    "scatter",
+    "reduce",
+    "all_reduce",
+    "gather",
+    "all_gather",
+    "broadcast",
+    "barrier",
+]
+
+
+class _RoundCounter:
+    """Communicator that counts the rounds of communication it forwards."""
+
+    def __init__(self, communicator):
+        self.communicator = communicator
+        self.rounds = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.communicator, name)
+        if name not in _COMMUNICATION_FUNCTIONS:
+            return attr
+
+        def counted(*args, **kwargs):
+            self.rounds += 1
+            return attr(*args, **kwargs)
+
+        return counted
+
+
+class _CheckpointCommunicator:
+    """
+    Communicator used while a checkpointed module is executed. It forwards all
+    calls to the underlying communicator, and intercepts the autograd functions
+    applied in the module: in the forward pass, the results (and contexts) of
+    functions that communicate in more than `max_rounds` rounds are stored;
+    when the module is recomputed in the backward pass, these stored results
+    are used instead of recomputing the functions.
+    """
+
+    def __init__(self, communicator, saved, max_rounds=None, recompute=False):
+        self.communicator = communicator
+        self.saved = saved
+        self.max_rounds = max_rounds
+        self.recompute = recompute
+        self.counters = {}
+
+    def __getattr__(self, name):
+        return getattr(self.communicator, name)
+
+    def _next_key(self):
+        """
+        Returns a key that identifies the next autograd function. Functions
+        are counted separately in every function executed by `run_fused`, so
+        keys do not depend on the order in which these functions are executed.
+        """
+        path, communicator = [], comm.get()
+        while communicator is not self:
+            if isinstance(communicator, FusedCommunicator):
+                path.append(communicator.index)
+                communicator = communicator.scheduler.communicator
+            else:
+                communicator = communicator.communicator
+        path = tuple(path)
+        index = self.counters.get(path, 0)
+        self.counters[path] = index + 1
+        return path, index
+
+    def apply_autograd_function(self, grad_fn, ctx, inputs, kwargs):
+        """Applies an autograd function in the checkpointed module."""
+        key = self._next_key()
+
+        # use stored result when recomputing the module:
+        if self.recompute:
+            if key in self.saved:
+                result, ctx.context, ctx.non_differentiable = self.saved.pop(key)
+                return result
+            return grad_fn.forward(ctx, inputs, **kwargs)
+
+        # store result if the function is too expensive to recompute:
+        counter = _RoundCounter(comm.get())
+        communicator = get_thread_communicator()
+        set_thread_communicator(counter)
+        try:
+            result = grad_fn.forward(ctx, inputs, **kwargs)
+        finally:
+            set_thread_communicator(communicator)
+        if self.max_rounds is not None and counter.rounds > self.max_rounds:
+            self.saved[key] = (result, ctx.context, ctx.non_differentiable)
+        return result
+
+
+def _run_module(module, input, communicator):
+    """Runs the module with the specified communicator."""
+    previous = get_thread_communicator()
+    set_thread_communicator(communicator)
+    try:
+        output = module(input)
+    finally:
+        set_thread_communicator(previous)
+    assert isinstance(
+        output, AutogradCrypTensor
+    ), "checkpointed modules must return a single tensor"
+    return output
+
+
+class AutogradCheckpoint(AutogradFunction):
+    """
+    Autograd function that computes the output of a checkpointed module
+    without recording the functions in the module in the autograd graph.
+    """
+
+    @staticmethod
+    def forward(ctx, inputs, checkpoint=None, input_requires_grad=True):
+        if not isinstance(inputs, list):
+            inputs = [inputs]
+        input = inputs[0]
+
+        # run module without storing intermediate results:
+        saved = {}
+        communicator = _CheckpointCommunicator(
+            comm.get(), saved, max_rounds=checkpoint.max_rounds
+        )
+        parameters = checkpoint._encrypted_parameters()
+        requires_grad = [param.requires_grad for param in parameters]
+        try:
+            for param in parameters:
+                param.requires_grad = False
+            output = _run_module(
+                checkpoint._modules["module"],
+                AutogradCrypTensor(input, requires_grad=False),
+                communicator,
+            )
+        finally:
+            for param, param_requires_grad in zip(parameters, requires_grad):
+                param.requires_grad = param_requires_grad
+
+        # gradients of parameters are accumulated when module is recomputed:
+        ctx.mark_non_differentiable(inputs[1:])
+        ctx.save_multiple_for_backward([input, checkpoint, saved, input_requires_grad])
+        return output.tensor
+
+    @staticmethod
+    def backward(ctx, grad_output):
+        input, checkpoint, saved, input_requires_grad = ctx.saved_tensors
+        communicator = _CheckpointCommunicator(comm.get(), saved, recompute=True)
+        input = AutogradCrypTensor(input, requires_grad=input_requires_grad)
+        output = _run_module(checkpoint._modules["module"], input, communicator)
+        output.backward(grad_output)
+        return input.grad
+
+
+class Checkpoint(Module):
+    """
+    Module that runs a module without storing the intermediate results of its
+    forward pass for the backward pass. Instead, the module is recomputed when
+    gradients are backpropagated through it. This reduces the memory used
+    in training at the cost of recomputation.
+
+    Functions in the module that communicate in at most `max_rounds` rounds
+    are recomputed; the results of all other functions are stored in the
+    forward pass. If `max_rounds` is `None`, all functions are recomputed. With
+    `max_rounds=0`, only communication-free functions (e.g., additions, and
+    multiplications with public values) are recomputed; with `max_rounds=1`,
+    multiplications of encrypted values are recomputed as well, whereas
+    comparisons (e.g., in ReLUs) are not.
+    """
+
+    def __init__(self, module, max_rounds=None):
+        super().__init__()
+        assert max_rounds is None or max_rounds >= 0, "max_rounds must be >= 0"
+        self.register_module("module", module)
+        self.max_rounds = max_rounds
+
+    def _encrypted_parameters(self):
+        """Returns the parameters of the module that are encrypted."""
+        return [
+            param
+            for param in self.parameters()
+            if isinstance(param, AutogradCrypTensor)
+        ]
+
+    def forward(self, x):
+        kwargs = {"checkpoint": self, "input_requires_grad": x.requires_grad}
+        return _autograd_forward(
+            x, AutogradCheckpoint, self._encrypted_parameters(), kwargs
+        )
+
+
+def checkpoint(module, max_rounds=None):
+    """
+    Returns a module that computes the same output as `module`, but that
+    recomputes the module in the backward pass instead of storing its
+    intermediate results. See `Checkpoint` for the meaning of `max_rounds`.
+    """
+    return Checkpoint(module, max_rounds=max_rounds)
@@ -71,11 +71,19 @@ class BCELoss(_Loss):
 class CrossEntropyLoss(_Loss):
     """
     Cross-entropy loss between predictions and ground-truth values.
+
+    If all predictions are known to lie in `[-logit_range, logit_range]`, the
+    `logit_range` argument can be set to avoid the comparisons needed to
+    compute the maximum of the predictions.
     """
 
+    def __init__(self, reduction="sum", logit_range=None):
+        super(CrossEntropyLoss, self).__init__(reduction=reduction)
+        self.logit_range = logit_range
+
     def forward(self, yhat, y):
         assert yhat.size() == y.size(), "input and target must have the same size"
         assert all(
             isinstance(val, AutogradCrypTensor) for val in [y, yhat]
         ), "inputs must be AutogradCrypTensors"
-        return yhat.cross_entropy(y)
+        return yhat.cross_entropy(y, logit_range=self.logit_range)
@@ -6,6 +6,7 @@
 # LICENSE file in the root directory of this source tree.
 
 import crypten
+import crypten.communicator as comm
 import torch.nn
 from crypten.autograd_cryptensor import AutogradCrypTensor
 
@@ -164,40 +165,43 @@ class Module:
         return self
 
     def encrypt(self, mode=True, src=0):
-        """Encrypts the model."""
+        """
+        Encrypts the model. The parameters and buffers of all (sub)modules are
+        encrypted (or decrypted) together as a single flat tensor, and every
+        module receives views into the shares of that tensor.
+        """
         if mode != self.encrypted:
 
-            # encrypt / decrypt parameters:
-            self.encrypted = mode
-            for name, param in self.named_parameters(recurse=False):
-                requires_grad = param.requires_grad
-                if mode:  # encrypt parameter
-                    self.set_parameter(
-                        name,
-                        AutogradCrypTensor(
-                            crypten.cryptensor(param, **{"src": src}),
-                            requires_grad=requires_grad,
-                        ),
-                    )
-                else:  # decrypt parameter
-                    self.set_parameter(name, param.get_plain_text())
-                    self._parameters[name].requires_grad = requires_grad
-
-            # encrypt / decrypt buffers:
-            for name, buffer in self.named_buffers(recurse=False):
-                if mode:  # encrypt buffer
-                    self.set_buffer(
-                        name,
-                        AutogradCrypTensor(
-                            crypten.cryptensor(buffer, **{"src": src}),
-                            requires_grad=False,
-                        ),
-                    )
-                else:  # decrypt buffer
-                    self.set_buffer(name, buffer.get_plain_text())
-
-            # apply encryption recursively:
-            return self._apply(lambda m: m.encrypt(mode=mode, src=src))
+            # collect parameters and buffers of all modules that change mode:
+            modules = []
+            self._apply(lambda m: modules.append(m) if m.encrypted != mode else None)
+            entries, values = [], []
+            for module in modules:
+                module.encrypted = mode
+                for name, param in module.named_parameters(recurse=False):
+                    entries.append((module, name, True, param.requires_grad))
+                    values.append(param)
+                for name, buffer in module.named_buffers(recurse=False):
+                    entries.append((module, name, False, False))
+                    values.append(buffer)
+
+            # encrypt / decrypt all parameters and buffers at once:
+            if mode:
+                values = crypten.cryptensor_many(values, src=src)
+            else:
+                values = crypten.get_plain_text_many(values)
+            for (module, name, is_parameter, requires_grad), value in zip(
+                entries, values
+            ):
+                if mode:
+                    value = AutogradCrypTensor(value, requires_grad=requires_grad)
+                else:
+                    value = value.clone()
+                    value.requires_grad = requires_grad
+                if is_parameter:
+                    module.set_parameter(name, value)
+                else:
+                    module.set_buffer(name, value)
         return self
 
     def decrypt(self):
@@ -227,6 +231,7 @@ class Graph(Container):
         self.input_name = input_name
         self.output_name = output_name
         self._graph = {}
+        self._plan = None
         if modules is not None:
             self._modules = modules
         if graph is not None:
@@ -236,53 +241,100 @@ class Graph(Container):
         assert name not in self._graph, "Module %s already exists." % name
         self.register_module(name, module)
         self._graph[name] = input_names
+        self._plan = None
+
+    def _compile(self):
+        """
+        Compiles the graph into an execution plan: a list of topological levels
+        that contain the nodes needed to compute the output, together with the
+        values that are no longer needed once that level has been computed.
+        """
+
+        # determine the topological level of all nodes the output depends on:
+        levels = {self.input_name: 0}
+        stack, visiting = [self.output_name], set()
+        while len(stack) > 0:
+            name = stack[-1]
+            if name in levels:
+                stack.pop()
+                continue
+            if name not in self._graph:
+                raise ValueError("nn.Graph.forward() failed. Is graph unconnected?")
+            missing = [key for key in self._graph[name] if key not in levels]
+            if len(missing) == 0:
+                input_levels = [levels[key] for key in self._graph[name]]
+                levels[name] = 1 + max(input_levels, default=0)
+                stack.pop()
+            elif name in visiting:
+                raise ValueError("nn.Graph.forward() failed. Is graph cyclic?")
+            else:
+                visiting.add(name)
+                stack.extend(missing)
+
+        # group nodes by level (in the order in which they were added):
+        plan = [[] for _ in range(levels[self.output_name])]
+        for name in self._graph.keys():
+            if name in levels and name != self.input_name:
+                plan[levels[name] - 1].append(name)
+
+        # free every value after the level containing its last consumer:
+        last_use = {}
+        for idx, nodes in enumerate(plan):
+            for name in nodes:
+                for key in self._graph[name]:
+                    last_use[key] = idx
+        free = [[] for _ in plan]
+        for key, idx in last_use.items():
+            if key != self.output_name:
+                free[idx].append(key)
+        return list(zip(plan, free))
 
     def forward(self, input):
 
-        # keep track of all values that have been computed:
+        # compile execution plan if graph has changed:
+        if self._plan is None:
+            self._plan = self._compile()
+
+        # perform forward pass one topological level at a time:
         values = {self.input_name: input}
-        computed = {key: False for key in self._graph.keys()}
-        inputs_available = {
-            key: [False for _ in range(len(value_list))]
-            for key, value_list in self._graph.items()
-        }
-
-        def _mark_as_computed(name):
-            """Marks a value as having been computed."""
-            computed[name] = True
-            for key, value_list in self._graph.items():
-                if name in value_list:
-                    inputs_available[key][value_list.index(name)] = True
-
-        def _find_computable_node():
-            """Find a node for which all inputs are available."""
-            for key, inputs_available_list in inputs_available.items():
-                if all(inputs_available_list) and not computed[key]:
-                    return key
-            return None
-
-        # perform forward pass:
-        _mark_as_computed(self.input_name)
-        node_to_compute = _find_computable_node()
-        while node_to_compute is not None:
-
-            # compute and store output of module:
-            input = [values[name] for name in self._graph[node_to_compute]]
-            if len(input) == 1:
-                input = input[0]  # unpack iterable if possible
-            output = self._modules[node_to_compute](input)
-            values[node_to_compute] = output
-            _mark_as_computed(node_to_compute)
-
-            # return output if it is available:
-            if node_to_compute == self.output_name:
-                return output
-
-            # find next node to compute:
-            node_to_compute = _find_computable_node()
-
-        # this should never happen:
-        raise ValueError("nn.Graph.forward() failed. Is graph unconnected?")
+        for nodes, free in self._plan:
+
+            # independent ReLUs share a single batched comparison:
+            relu_nodes = [
+                name
+                for name in nodes
+                if type(self._modules[name]) is ReLU and len(self._graph[name]) == 1
+            ]
+            if len(relu_nodes) < 2:
+                relu_nodes = []
+            tasks = [(name, self._get_task(name, values)) for name in nodes]
+            tasks = [task for task in tasks if task[0] not in relu_nodes]
+            if len(relu_nodes) > 0:
+                relu_inputs = [values[self._graph[name][0]] for name in relu_nodes]
+                tasks.append(
+                    (relu_nodes, lambda: crypten.relu_many(_to_autograd(relu_inputs)))
+                )
+
+            # nodes in the same level communicate in the same rounds:
+            outputs = comm.run_fused([task for _, task in tasks])
+            for (name, _), output in zip(tasks, outputs):
+                if isinstance(name, list):
+                    values.update(zip(name, output))
+                else:
+                    values[name] = output
+
+            # release values that are no longer needed:
+            for key in free:
+                del values[key]
+        return values[self.output_name]
+
+    def _get_task(self, name, values):
+        """Returns function that computes the output of the named module."""
+        input = [values[key] for key in self._graph[name]]
+        if len(input) == 1:
+            input = input[0]  # unpack iterable if possible
+        module = self._modules[name]
+        return lambda: module(input)
 
 
 class Sequential(Graph):
@@ -523,11 +575,25 @@ class Reshape(Module):
     A single dimension may be -1, in which case it's inferred from the remaining
     dimensions and the number of elements in :attr:`self`.
 
+    If :attr:`shape` is specified, the module reshapes its input to that static
+    shape, in which a `0` means the dimension is copied from the input.
+    Otherwise, the module takes the tensor and the new shape as input.
+
     Args:
-        input (tuple of ints): the new shape
+        shape (tuple of ints, optional): the new shape
     """
 
+    def __init__(self, shape=None):
+        super().__init__()
+        self.shape = None if shape is None else list(shape)
+
     def forward(self, input):
+        if self.shape is not None:
+            shape = [
+                input.size(idx) if size == 0 else size
+                for idx, size in enumerate(self.shape)
+            ]
+            return input.reshape(shape)
         assert isinstance(input, (list, tuple)), "input must be list or tuple"
         tensor, shape = input
 
@@ -846,6 +912,42 @@ class ReLU(Module):
         return ReLU()
 
 
+class Sigmoid(Module):
+    r"""
+    Module that computes sigmoid activations element-wise.
+
+    :math:`\text{Sigmoid}(x)= \frac{1}{1 + \exp(-x)}`
+
+    The approximation that is used can be selected via
+    :func:`crypten.mpc.set_activation_mode`.
+    """
+
+    def forward(self, x):
+        return x.sigmoid()
+
+    @staticmethod
+    def from_onnx(parameters=None, attributes=None):
+        return Sigmoid()
+
+
+class Tanh(Module):
+    r"""
+    Module that computes hyperbolic tangent activations element-wise.
+
+    :math:`\text{Tanh}(x)= 2 \cdot \text{Sigmoid}(2x) - 1`
+
+    The approximation that is used can be selected via
+    :func:`crypten.mpc.set_activation_mode`.
+    """
+
+    def forward(self, x):
+        return x.tanh()
+
+    @staticmethod
+    def from_onnx(parameters=None, attributes=None):
+        return Tanh()
+
+
 class _Pool2d(Module):
     """
     Module that performs 2D pooling.
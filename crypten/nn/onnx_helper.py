@@ -5,6 +5,9 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
+import itertools
+
+import onnx
 import torch
 from onnx import numpy_helper
 
@@ -34,3 +37,339 @@ def get_attribute_value(attr):
         return list(attr.floats)
     else:
         raise ValueError("Unknown attribute type for attribute %s." % attr.name)
+
+
+def _get_attributes(node):
+    """
+    Returns dict with all attributes of an ONNX node.
+    """
+    return {attr.name: get_attribute_value(attr) for attr in node.attribute}
+
+
+def _count_consumers(nodes, output_names):
+    """
+    Returns dict with the number of consumers of each value in an ONNX graph.
+    """
+    consumers = {name: 0 for name in output_names}
+    for node in nodes:
+        for name in node.input:
+            consumers[name] = consumers.get(name, 0) + 1
+    return consumers
+
+
+def fold_batchnorm_nodes(nodes, parameters, output_names=()):
+    """
+    Folds `BatchNormalization` nodes into the preceding `Conv` or `Gemm` node
+    by rescaling the weights and bias of that node. The folded parameters are
+    added to `parameters` and a new list of nodes is returned.
+
+    The folding uses the running statistics of the batch normalization, so it
+    is only valid for models that are evaluated (not trained).
+    """
+
+    consumers = _count_consumers(nodes, output_names)
+    producers = {node.output[0]: node for node in nodes}
+
+    folded_nodes, removed = {}, set()
+    for node in nodes:
+        if node.op_type != "BatchNormalization" or len(node.output) != 1:
+            continue
+        producer = producers.get(node.input[0], None)
+        if producer is None or producer.op_type not in ["Conv", "Gemm"]:
+            continue
+        if consumers[node.input[0]] != 1 or producer.input[1] not in parameters:
+            continue
+        if producer.op_type == "Gemm":
+            attributes = _get_attributes(producer)
+            if attributes.get("transB", 0) != 1 or attributes.get("transA", 0) != 0:
+                continue
+            if attributes.get("alpha", 1.0) != 1.0:
+                continue
+            if attributes.get("beta", 1.0) != 1.0:
+                continue
+
+        # compute the folded weight and bias:
+        gamma, beta, mean, var = [parameters[name] for name in node.input[1:5]]
+        eps = _get_attributes(node).get("epsilon", 1e-05)
+        weight = parameters[producer.input[1]]
+        if weight.size(0) != mean.nelement():
+            continue
+        if len(producer.input) > 2:
+            bias = parameters[producer.input[2]]
+        else:
+            bias = torch.zeros(weight.size(0), dtype=weight.dtype)
+        scale = gamma / (var + eps).sqrt()
+        scale_shape = [-1] + [1] * (weight.dim() - 1)
+        weight_name = "%s.weight" % node.output[0]
+        bias_name = "%s.bias" % node.output[0]
+        parameters[weight_name] = weight * scale.view(scale_shape)
+        parameters[bias_name] = (bias - mean) * scale + beta
+
+        # replace producer by folded node with the output of batch norm:
+        folded_node = onnx.NodeProto()
+        folded_node.CopyFrom(producer)
+        del folded_node.input[:]
+        folded_node.input.extend([producer.input[0], weight_name, bias_name])
+        folded_node.output[0] = node.output[0]
+        folded_nodes[producer.output[0]] = folded_node
+        removed.add(node.output[0])
+
+    return [
+        folded_nodes.get(node.output[0], node)
+        for node in nodes
+        if node.output[0] not in removed
+    ]
+
+
+def _get_shapes(onnx_model):
+    """
+    Returns dict with the (inferred) shapes of all values in an ONNX graph.
+    Dimensions that are not static are represented by a symbol.
+    """
+    graph = onnx.shape_inference.infer_shapes(onnx_model).graph
+    shapes = {}
+    for value_info in itertools.chain(graph.input, graph.value_info, graph.output):
+        tensor_type = value_info.type.tensor_type
+        if not tensor_type.HasField("shape"):
+            continue
+        shapes[value_info.name] = [
+            dim.dim_value
+            if dim.HasField("dim_value")
+            else (dim.dim_param or (value_info.name, idx))
+            for idx, dim in enumerate(tensor_type.shape.dim)
+        ]
+    return shapes
+
+
+def _as_shape_value(tensor):
+    """
+    Converts an integer tensor with at most one dimension into a shape value:
+    a list of entries (or a single entry for scalars).
+    """
+    if tensor.is_floating_point() or tensor.dim() > 1:
+        return None
+    return tensor.long().tolist()
+
+
+def _fold_shape_node(node, values):
+    """
+    Evaluates a node on shape values. Returns `None` if this is not possible.
+    """
+    inputs = [values.get(name, None) for name in node.input]
+    if any(value is None for value in inputs):
+        return None
+    attributes = _get_attributes(node)
+    if node.op_type == "Cast":
+        return inputs[0]
+    elif node.op_type == "Gather":
+        data, indices = inputs
+        if attributes.get("axis", 0) != 0 or not isinstance(data, list):
+            return None
+        if isinstance(indices, list):
+            return [data[idx] for idx in indices]
+        return data[indices]
+    elif node.op_type in ["Unsqueeze", "Squeeze"]:
+        axes = attributes.get("axes", inputs[1] if len(inputs) > 1 else [0])
+        if list(axes) != [0]:
+            return None
+        if node.op_type == "Unsqueeze":
+            return None if isinstance(inputs[0], list) else [inputs[0]]
+        return inputs[0][0] if isinstance(inputs[0], list) else None
+    elif node.op_type == "Concat":
+        if attributes.get("axis", 0) != 0:
+            return None
+        if not all(isinstance(value, list) for value in inputs):
+            return None
+        return [entry for value in inputs for entry in value]
+    elif node.op_type in ["Add", "Sub", "Mul", "Div"]:
+        entries = [value if isinstance(value, list) else [value] for value in inputs]
+        if not all(isinstance(entry, int) for entry in itertools.chain(*entries)):
+            return None
+        op = {
+            "Add": torch.add,
+            "Sub": torch.sub,
+            "Mul": torch.mul,
+            "Div": torch.floor_divide,
+        }[node.op_type]
+        return _as_shape_value(op(torch.tensor(inputs[0]), torch.tensor(inputs[1])))
+    return None
+
+
+def fold_shape_nodes(onnx_model, nodes, parameters):
+    """
+    Folds subgraphs that only compute on tensor shapes (e.g., the `Shape`,
+    `Gather`, `Unsqueeze`, `Concat` chains that produce the target shape of a
+    `Reshape`). Shapes are public, so these subgraphs can be evaluated once at
+    import time using the shapes inferred from the ONNX graph.
+
+    Returns a tuple containing the list of remaining nodes, a dict with the
+    values of folded nodes that are still consumed by remaining nodes, and a
+    dict that maps the outputs of `Reshape` nodes to their static shape. In
+    that static shape, a `0` means the dimension is copied from the input.
+
+    Shapes inferred from a graph without a dynamic batch dimension contain the
+    batch size of the dummy input. Values computed from such shapes are never
+    turned into constants, and a `Reshape` is only folded if its first target
+    dimension does not depend on them. Otherwise, the shape computation is
+    kept in the graph and evaluated at runtime.
+    """
+
+    # evaluate all nodes that can be evaluated on shapes:
+    shapes = _get_shapes(onnx_model)
+    values = {}
+    for name, parameter in parameters.items():
+        value = _as_shape_value(parameter)
+        if value is not None:
+            values[name] = value
+    producers, derived = {}, set()
+    for node in nodes:
+        producers[node.output[0]] = node
+        value = None
+        if len(node.output) != 1:
+            continue
+        if node.op_type == "Constant":
+            value = _get_attributes(node).get("value", None)
+            if torch.is_tensor(value):
+                value = _as_shape_value(value)
+        elif node.op_type == "Shape" and node.input[0] in shapes:
+            value = list(shapes[node.input[0]])
+        else:
+            value = _fold_shape_node(node, values)
+        if value is not None:
+            values[node.output[0]] = value
+            if node.op_type == "Shape" or any(name in derived for name in node.input):
+                derived.add(node.output[0])
+
+    # determine static shapes of reshapes:
+    reshapes = {}
+    for node in nodes:
+        if node.op_type != "Reshape" or node.input[1] not in values:
+            continue
+        data_shape = shapes.get(node.input[0], [])
+        static_shape = []
+        for idx, entry in enumerate(values[node.input[1]]):
+            if isinstance(entry, int):
+                static_shape.append(entry)
+            elif idx < len(data_shape) and data_shape[idx] == entry:
+                static_shape.append(0)  # copy dimension from input
+            else:
+                break
+        if len(static_shape) != len(values[node.input[1]]):
+            continue
+
+        # a static batch size inferred from the dummy input must not be folded:
+        if node.input[1] in derived and static_shape[0] > 0:
+            continue
+        reshapes[node.output[0]] = static_shape
+
+    # keep all nodes that compute on data, and the shape computations they need:
+    def _is_folded(name):
+        return name in values and name in producers
+
+    kept, constants = set(), {}
+    stack = [node for node in reversed(nodes) if not _is_folded(node.output[0])]
+    while len(stack) > 0:
+        node = stack.pop()
+        if node.output[0] in kept:
+            continue
+        kept.add(node.output[0])
+        input_names = list(node.input)
+        if node.output[0] in reshapes:
+            input_names = input_names[:1]
+        for name in input_names:
+            if not _is_folded(name):
+                continue
+            value = values[name]
+            entries = value if isinstance(value, list) else [value]
+            if name not in derived and all(isinstance(e, int) for e in entries):
+                constants[name] = torch.tensor(value)
+            else:
+                stack.append(producers[name])  # value depends on the input shape
+    for name in kept:
+        constants.pop(name, None)
+    nodes = [node for node in nodes if node.output[0] in kept]
+    return nodes, constants, reshapes
+
+
+def _can_swap(first, second):
+    """
+    Returns whether the nodes `first` and `second` (which consumes the output
+    of `first`) can be executed in reverse order with the same result.
+    """
+    if first.op_type == "Relu" and second.op_type == "MaxPool":
+        return True  # ReLU is monotonic, so it commutes with max-pooling
+    if first.op_type == "Conv" and second.op_type == "AveragePool":
+        # 1x1 convolutions are linear per pixel, so they commute with averaging:
+        conv_attributes = _get_attributes(first)
+        pool_attributes = _get_attributes(second)
+        return (
+            all(size == 1 for size in conv_attributes.get("kernel_shape", [0]))
+            and all(stride == 1 for stride in conv_attributes.get("strides", [1]))
+            and all(pad == 0 for pad in conv_attributes.get("pads", [0]))
+            and all(pad == 0 for pad in pool_attributes.get("pads", [0]))
+            and conv_attributes.get("group", 1) == 1
+            and pool_attributes.get("auto_pad", b"NOTSET") == b"NOTSET"
+        )
+    return False
+
+
+def _num_elements(shape):
+    """
+    Returns number of elements in a tensor of the specified shape, ignoring
+    dimensions that are not static (e.g., batch dimensions).
+    """
+    num_elements = 1
+    for size in shape:
+        if isinstance(size, int):
+            num_elements *= size
+    return num_elements
+
+
+def reorder_activation_nodes(onnx_model, nodes, output_names=()):
+    """
+    Reorders nodes to reduce the amount of MPC computation without changing the
+    output of the graph:
+
+        - `Relu` followed by `MaxPool` becomes `MaxPool` followed by `Relu`,
+          so the ReLU comparisons are performed on the (smaller) pooled tensor.
+        - A 1x1 `Conv` followed by `AveragePool` becomes `AveragePool`
+          followed by the `Conv`, so the convolution is performed on the
+          (smaller) pooled tensor.
+
+    Returns a tuple containing the new list of nodes and the number of ReLU
+    comparisons saved per example.
+    """
+    shapes = _get_shapes(onnx_model)
+    consumers = _count_consumers(nodes, output_names)
+    producers = {node.output[0]: node for node in nodes}
+
+    swapped_nodes, num_comparisons_saved = {}, 0
+    for node in nodes:
+        if len(node.input) == 0 or len(node.output) != 1:
+            continue
+        first = producers.get(node.input[0], None)
+        if first is None or len(first.output) != 1 or first.output[0] in swapped_nodes:
+            continue
+        if consumers[first.output[0]] != 1 or not _can_swap(first, node):
+            continue
+
+        # count comparisons saved:
+        if first.op_type == "Relu":
+            if first.output[0] not in shapes or node.output[0] not in shapes:
+                continue  # only swap when we can show savings
+            num_comparisons_saved += _num_elements(shapes[first.output[0]])
+            num_comparisons_saved -= _num_elements(shapes[node.output[0]])
+
+        # swap nodes, reusing the name of the intermediate value:
+        new_first, new_second = onnx.NodeProto(), onnx.NodeProto()
+        new_first.CopyFrom(node)
+        new_first.input[0] = first.input[0]
+        new_first.output[0] = first.output[0]
+        new_second.CopyFrom(first)
+        new_second.input[0] = first.output[0]
+        new_second.output[0] = node.output[0]
+        swapped_nodes[first.output[0]] = new_first
+        swapped_nodes[node.output[0]] = new_second
+
+    nodes = [swapped_nodes.get(node.output[0], node) for node in nodes]
+    return nodes, num_comparisons_saved
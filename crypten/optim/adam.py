@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import math
+
+from .optimizer import Optimizer
+
+
+class Adam(Optimizer):
+    """
+    Adam optimizer, following the update rule of `torch.optim.Adam`. The
+    moment estimates are encrypted; the square root and reciprocal of the
+    second moment are computed once for the flat buffer of all parameters.
+
+    Args:
+        params (iterable): encrypted parameters to optimize.
+        lr (float): learning rate.
+        betas (tuple of float): coefficients of the running averages of the
+            gradient and its square.
+        eps (float): term added to the denominator. Values below the
+            fixed-point precision are not representable, so the default is
+            larger than in PyTorch.
+        weight_decay (float): weight decay (L2 penalty).
+    """
+
+    def __init__(self, params, lr=1e-3, betas=(0.9, 0.999), eps=1e-3, weight_decay=0.0):
+        super().__init__(params)
+        assert lr > 0.0, "learning rate must be positive"
+        assert all(0.0 <= beta < 1.0 for beta in betas), "betas must be in [0, 1)"
+        assert eps > 0.0, "eps must be positive"
+        assert weight_decay >= 0.0, "weight decay must be non-negative"
+        self.lr = lr
+        self.betas = betas
+        self.eps = eps
+        self.weight_decay = weight_decay
+        self.num_steps = 0
+        self.exp_avg = None
+        self.exp_avg_sq = None
+
+    def step(self):
+        grad, grad_scale = self._flat_grad()
+        if grad is None:
+            return
+        self.num_steps += 1
+        beta1, beta2 = self.betas
+
+        # average accumulated gradients and add weight decay:
+        if grad_scale != 1.0 or self.weight_decay != 0.0:
+            terms = [(grad, grad_scale)]
+            if self.weight_decay != 0.0:
+                terms.append((self.flat, self.weight_decay))
+            grad = self._linear_combination(terms)
+
+        # update moment estimates:
+        terms = [(grad, 1.0 - beta1)]
+        if self.exp_avg is not None:
+            terms.append((self.exp_avg, beta1))
+        self.exp_avg = self._linear_combination(terms)
+        terms = [(grad.square(), 1.0 - beta2)]
+        if self.exp_avg_sq is not None:
+            terms.append((self.exp_avg_sq, beta2))
+        self.exp_avg_sq = self._linear_combination(terms)
+
+        # the bias corrections are folded into the step size and the eps:
+        bias_correction1 = 1.0 - beta1**self.num_steps
+        bias_correction2 = math.sqrt(1.0 - beta2**self.num_steps)
+        step_size = self.lr * bias_correction2 / bias_correction1
+        denominator = self.exp_avg_sq.sqrt().add(self.eps * bias_correction2)
+
+        # update parameters:
+        update = self.exp_avg.mul(denominator.reciprocal(all_pos=True))
+        self.flat.sub_(self._linear_combination([(update, step_size)]))
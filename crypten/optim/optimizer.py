@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import math
+
+import crypten
+import torch
+from crypten.autograd_cryptensor import AutogradCrypTensor
+from crypten.mpc import ptype as Ptype
+
+
+class Optimizer:
+    """
+    Base optimizer class that mimics the torch.optim.Optimizer class.
+
+    The shares of all parameters are stored in a single flat buffer, and every
+    parameter becomes a view into this buffer. Optimizers therefore update all
+    parameters with a few operations on flat tensors.
+
+    Gradients of several micro-batches can be accumulated (see
+    `accumulate_grad` and `step_micro_batches`) so that large batches can be
+    trained without keeping the activations of the full batch in memory.
+    """
+
+    def __init__(self, params):
+        self.params = list(params)
+        assert len(self.params) > 0, "optimizer got an empty parameter list"
+        for param in self.params:
+            if not isinstance(param, AutogradCrypTensor):
+                raise TypeError("Cannot optimize parameter of type %s" % type(param))
+            assert (
+                param.tensor.ptype == Ptype.arithmetic
+            ), "parameters must be arithmetic"
+
+        # copy parameters into a flat buffer and replace them by views:
+        self.sizes = [param.size() for param in self.params]
+        self.flat = crypten.cat([param.tensor.flatten() for param in self.params])
+        for param, tensor in zip(self.params, self._split(self.flat)):
+            param._tensor = tensor
+        self.scale = self.flat._tensor.encoder.scale
+
+        # weighted sum of the gradients of micro-batches and the total weight:
+        self.grad_accumulator = None
+        self.accumulated_weight = 0
+
+    def _split(self, flat_tensor):
+        """Splits a flat tensor into tensors of the sizes of the parameters."""
+        results, offset = [], 0
+        for size in self.sizes:
+            numel = int(torch.Size(size).numel())
+            results.append(flat_tensor.narrow(0, offset, numel).view(size))
+            offset += numel
+        return results
+
+    def _current_flat_grad(self):
+        """
+        Returns the gradients of all parameters as a flat tensor (with zeros for
+        parameters without gradient), or `None` if no parameter has a gradient.
+        """
+        if all(param.grad is None for param in self.params):
+            return None
+        grads = []
+        for param, tensor in zip(self.params, self._split(self.flat)):
+            if param.grad is None:
+                grads.append(tensor.flatten().mul(0))
+            else:
+                grads.append(param.grad.flatten())
+        return crypten.cat(grads)
+
+    def _flat_grad(self):
+        """
+        Returns the sum of the accumulated gradients and the current gradients
+        (with weight 1) as a flat tensor, together with the public factor by
+        which it must be scaled to obtain the weighted mean gradient over
+        micro-batches. Returns `None` as gradient if there are no gradients.
+        Resets the accumulator.
+        """
+        grad = self._current_flat_grad()
+        accumulated_weight = self.accumulated_weight
+        if grad is not None or accumulated_weight == 0:
+            accumulated_weight += 1
+        if self.grad_accumulator is not None:
+            if grad is not None:
+                self.grad_accumulator.add_(grad)
+            grad = self.grad_accumulator
+        self.grad_accumulator = None
+        self.accumulated_weight = 0
+        return grad, 1.0 / accumulated_weight
+
+    def accumulate_grad(self, weight=1):
+        """
+        Adds the current gradients, multiplied by the public integer `weight`,
+        to the gradient accumulator and sets the gradients to `None`. The
+        accumulation is performed in place, and the next call to `step` uses
+        the weighted mean of the accumulated gradients. To average per-example
+        gradients over micro-batches of different sizes, `weight` should be
+        the number of examples in the micro-batch.
+
+        The division by the total weight is deferred: it is folded into the
+        (public) coefficients of the update, so accumulating does not require
+        any truncations.
+        """
+        assert isinstance(weight, int) and weight > 0, "weight must be positive int"
+        grad = self._current_flat_grad()
+        if grad is not None:
+            if weight != 1:
+                grad = grad.mul(weight)
+            if self.grad_accumulator is None:
+                self.grad_accumulator = grad
+            else:
+                self.grad_accumulator.add_(grad)
+        self.accumulated_weight += weight
+        self.zero_grad()
+
+    def step_micro_batches(self, closure, inputs, micro_batch_size):
+        """
+        Performs a single optimization step on a batch that is split into
+        micro-batches along dimension 0. For every micro-batch, `closure` is
+        called on the micro-batches of all `inputs` and must return the loss;
+        the loss is backpropagated and the gradients are accumulated before
+        the next micro-batch is processed. Hence, only the activations of a
+        single micro-batch are kept in memory.
+
+        The gradient of every micro-batch is weighted by its size, so if
+        `closure` returns the mean loss over its inputs, the update equals
+        the update on the full batch (also when the last micro-batch is
+        smaller than `micro_batch_size`).
+
+        Returns the list of losses of the micro-batches.
+        """
+        assert micro_batch_size > 0, "micro-batch size must be positive"
+        if not isinstance(inputs, (list, tuple)):
+            inputs = [inputs]
+        batch_size = inputs[0].size(0)
+        assert all(
+            x.size(0) == batch_size for x in inputs
+        ), "inputs must have the same batch size"
+
+        losses = []
+        self.zero_grad()
+        for start in range(0, batch_size, micro_batch_size):
+            length = min(micro_batch_size, batch_size - start)
+            micro_batch = [x.narrow(0, start, length) for x in inputs]
+            loss = closure(*micro_batch)
+            loss.backward()
+            self.accumulate_grad(weight=length)
+            losses.append(loss)
+        self.step()
+        return losses
+
+    def _linear_combination(self, terms):
+        """
+        Computes the sum of `coefficient * tensor` over all `(tensor,
+        coefficient)` pairs in `terms`, where the coefficients are public
+        floats. The coefficients are encoded as integers, so the result is
+        truncated only once.
+
+        Small coefficients (e.g., a learning rate divided by the number of
+        accumulated examples) are encoded with extra fractional bits, so that
+        the largest coefficient has the precision of the fixed-point encoding.
+        The encoded products are then no larger than for a coefficient of 1.
+        """
+        max_coefficient = max(abs(coefficient) for _, coefficient in terms)
+        extra_bits = 0
+        if 0 < max_coefficient < 1:
+            extra_bits = math.floor(-math.log2(max_coefficient))
+        scale = self.scale * 2 ** extra_bits
+        result = None
+        for tensor, coefficient in terms:
+            term = tensor.mul(int(round(coefficient * scale)))
+            result = term if result is None else result.add_(term)
+        return result.div_(scale)
+
+    def zero_grad(self):
+        """Sets gradients of all parameters to `None`."""
+        for param in self.params:
+            param.grad = None
+
+    def step(self):
+        """Performs a single optimization step."""
+        raise NotImplementedError("step not implemented")
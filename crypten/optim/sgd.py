@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from .optimizer import Optimizer
+
+
+class SGD(Optimizer):
+    """
+    Stochastic gradient descent (optionally with momentum and weight decay),
+    following the update rule of `torch.optim.SGD`. Without momentum, a step
+    performs a single truncation; with momentum, it performs two.
+
+    Args:
+        params (iterable): encrypted parameters to optimize.
+        lr (float): learning rate.
+        momentum (float): momentum factor.
+        weight_decay (float): weight decay (L2 penalty).
+    """
+
+    def __init__(self, params, lr, momentum=0.0, weight_decay=0.0):
+        super().__init__(params)
+        assert lr > 0.0, "learning rate must be positive"
+        assert momentum >= 0.0, "momentum must be non-negative"
+        assert weight_decay >= 0.0, "weight decay must be non-negative"
+        self.lr = lr
+        self.momentum = momentum
+        self.weight_decay = weight_decay
+        self.momentum_buffer = None
+
+    def step(self):
+        grad, grad_scale = self._flat_grad()
+        if grad is None:
+            return
+
+        # gradient (with weight decay) as terms of a linear combination:
+        terms = [(grad, grad_scale)]
+        if self.weight_decay != 0.0:
+            terms.append((self.flat, self.weight_decay))
+
+        # update momentum buffer:
+        if self.momentum != 0.0:
+            if self.momentum_buffer is not None:
+                terms.append((self.momentum_buffer, self.momentum))
+            self.momentum_buffer = self._linear_combination(terms)
+            terms = [(self.momentum_buffer, 1.0)]
+
+        # update parameters:
+        update = self._linear_combination(
+            [(tensor, coefficient * self.lr) for tensor, coefficient in terms]
+        )
+        self.flat.sub_(update)
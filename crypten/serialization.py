@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import hashlib
+import json
+import os
+
+import crypten.communicator as comm
+import numpy as np
+import torch
+
+from .autograd_cryptensor import AutogradCrypTensor
+from .encoder import FixedPointEncoder
+from .mpc import MPCTensor, ptype as Ptype
+
+
+# version of the checkpoint format:
+_FORMAT_VERSION = 1
+
+
+def _get_paths(path, rank):
+    """Returns paths of the share file and manifest of the specified party."""
+    return (
+        os.path.join(path, "shares_%d.bin" % rank),
+        os.path.join(path, "manifest_%d.json" % rank),
+    )
+
+
+def _named_modules(module, prefix=""):
+    """Iterates recursively over a module and all its submodules with names."""
+    yield prefix, module
+    for name, submodule in module.named_modules():
+        yield from _named_modules(submodule, prefix=prefix + name + ".")
+
+
+def _named_module_tensors(module):
+    """
+    Iterates recursively over `(name, kind, module, local_name, tensor)` for
+    all parameters and buffers in a module.
+    """
+    for prefix, submodule in _named_modules(module):
+        for name, param in submodule.named_parameters(recurse=False):
+            yield prefix + name, "parameter", submodule, name, param
+        for name, buffer in submodule.named_buffers(recurse=False):
+            yield prefix + name, "buffer", submodule, name, buffer
+
+
+def _structure_hash(entries):
+    """Returns a hash of the names, types, and sizes of checkpoint entries."""
+    keys = ["name", "kind", "ptype", "size", "scale"]
+    structure = json.dumps([[entry[key] for key in keys] for entry in entries])
+    digest = hashlib.sha256(structure.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little") >> 2  # fits in a long tensor
+
+
+def save_shares(obj, path):
+    """
+    Saves the shares that this party holds of an encrypted tensor, an
+    `AutogradCrypTensor`, or an encrypted `crypten.nn.Module` into the
+    directory `path` on the local disk of the party. Each party writes its
+    shares into a binary file `shares_<rank>.bin`, and a manifest that
+    describes the stored tensors into `manifest_<rank>.json`.
+    """
+    from .nn import Module
+
+    # collect the encrypted tensors to save:
+    if isinstance(obj, Module):
+        assert obj.encrypted, "only encrypted modules can be saved as shares"
+        obj_type = "module"
+        tensors = [
+            (name, kind, tensor)
+            for name, kind, _, _, tensor in _named_module_tensors(obj)
+        ]
+    else:
+        obj_type = "tensor"
+        tensors = [("", "tensor", obj)]
+
+    # all parties agree on an identifier for the checkpoint:
+    checkpoint_id = torch.randint(0, 2 ** 62, (1,), dtype=torch.long)
+    checkpoint_id = comm.get().broadcast(checkpoint_id, src=0)
+
+    # write all shares contiguously into the share file:
+    rank = comm.get().get_rank()
+    os.makedirs(path, exist_ok=True)
+    shares_path, manifest_path = _get_paths(path, rank)
+    entries, offset = [], 0
+    with open(shares_path + ".tmp", "wb") as f:
+        for name, kind, tensor in tensors:
+            requires_grad = None
+            if isinstance(tensor, AutogradCrypTensor):
+                requires_grad = tensor.requires_grad
+                tensor = tensor._tensor
+            if not isinstance(tensor, MPCTensor):
+                raise TypeError("Cannot save shares of %s" % type(tensor))
+            share = tensor._tensor.share.contiguous()
+            share.numpy().tofile(f)
+            entries.append(
+                {
+                    "name": name,
+                    "kind": kind,
+                    "ptype": tensor.ptype.name,
+                    "size": list(share.size()),
+                    "scale": tensor._tensor.encoder._scale,
+                    "requires_grad": requires_grad,
+                    "offset": offset,
+                }
+            )
+            offset += share.nelement()
+
+    # write the manifest after the shares, so the checkpoint is complete:
+    manifest = {
+        "version": _FORMAT_VERSION,
+        "checkpoint_id": checkpoint_id.item(),
+        "rank": rank,
+        "world_size": comm.get().get_world_size(),
+        "type": obj_type,
+        "entries": entries,
+    }
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(shares_path + ".tmp", shares_path)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    comm.get().barrier()
+
+
+def _load_entry(data, entry):
+    """Constructs the encrypted tensor described by a manifest entry."""
+    numel = int(torch.Size(entry["size"]).numel())
+    share = torch.from_numpy(data[entry["offset"] : entry["offset"] + numel])
+    share = share.view(entry["size"])
+
+    tensor_ptype = Ptype[entry["ptype"]]
+    tensor = tensor_ptype.to_tensor().from_shares(share)
+    tensor.encoder = FixedPointEncoder(
+        precision_bits=entry["scale"].bit_length() - 1
+    )
+    result = MPCTensor(None)
+    result._tensor = tensor
+    result.ptype = tensor_ptype
+    if entry["requires_grad"] is not None:
+        result = AutogradCrypTensor(result, requires_grad=entry["requires_grad"])
+    return result
+
+
+def load_shares(path, dummy_model=None):
+    """
+    Loads the shares that this party saved with `save_shares` from the
+    directory `path`. The share file is memory-mapped, so shares are only read
+    from disk when they are used. All parties check that they loaded the same
+    checkpoint. To load a module, an unencrypted or encrypted `dummy_model`
+    with the same architecture must be provided; its parameters and buffers
+    are replaced by the loaded ones.
+    """
+    rank = comm.get().get_rank()
+    shares_path, manifest_path = _get_paths(path, rank)
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    if manifest["version"] != _FORMAT_VERSION:
+        raise ValueError("Unsupported checkpoint version %d" % manifest["version"])
+    if manifest["rank"] != rank:
+        raise ValueError("Checkpoint belongs to party %d" % manifest["rank"])
+    if manifest["world_size"] != comm.get().get_world_size():
+        raise ValueError("Checkpoint was saved with a different number of parties")
+
+    # make sure all parties loaded the same checkpoint:
+    entries = manifest["entries"]
+    fingerprint = torch.tensor(
+        [manifest["checkpoint_id"], _structure_hash(entries)], dtype=torch.long
+    )
+    fingerprints = comm.get().all_gather(fingerprint)
+    if not all(torch.equal(other, fingerprint) for other in fingerprints):
+        raise ValueError("Parties loaded different checkpoints")
+
+    # memory-map the shares:
+    numel = sum(int(torch.Size(entry["size"]).numel()) for entry in entries)
+    if numel > 0:
+        data = np.memmap(shares_path, dtype=np.int64, mode="c", shape=(numel,))
+    else:
+        data = np.zeros(0, dtype=np.int64)
+
+    if manifest["type"] == "tensor":
+        return _load_entry(data, entries[0])
+
+    # load parameters and buffers into the dummy model:
+    from .nn import Module
+
+    if not isinstance(dummy_model, Module):
+        raise ValueError("a crypten.nn.Module must be provided to load a module")
+    targets = list(_named_module_tensors(dummy_model))
+    if [(name, kind) for name, kind, _, _, _ in targets] != [
+        (entry["name"], entry["kind"]) for entry in entries
+    ]:
+        raise ValueError("Module architecture does not match loaded module")
+    for (_, kind, module, name, tensor), entry in zip(targets, entries):
+        if list(tensor.size()) != entry["size"]:
+            raise ValueError("Size of %s does not match loaded module" % entry["name"])
+        value = _load_entry(data, entry)
+        if kind == "parameter":
+            module.set_parameter(name, value)
+        else:
+            module.set_buffer(name, value)
+    for _, module in _named_modules(dummy_model):
+        module.encrypted = True
+    return dummy_model
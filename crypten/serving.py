@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+import crypten
+import crypten.communicator as comm
+import torch
+from crypten.autograd_cryptensor import AutogradCrypTensor
+
+
+# maximum length of the description of the pending requests of a party:
+_MAX_HEADER_LENGTH = 64
+
+# flags in the headers of the parties:
+_READY = 1
+_STOPPING = 2
+
+
+class _Request:
+    """Inference request of a client of this party."""
+
+    def __init__(self, input):
+        self.input = input
+        self.future = Future()
+        self.arrival_time = time.monotonic()
+
+
+class InferenceServer:
+    """
+    Long-running server for private inference that dynamically batches the
+    requests of clients. Requests are collected until `max_batch_size`
+    examples are pending or the oldest request has waited `max_latency`
+    seconds. The requests are then encrypted and concatenated along the batch
+    dimension, a single encrypted forward pass is performed, and every slice
+    of the output is decrypted for the party that submitted the request only.
+    All requests in a batch therefore share the communication rounds of the
+    forward pass.
+
+    Every party constructs the server with the same model and arguments and
+    calls `serve` (or `step`) in lockstep. Clients submit plaintext inputs to
+    the server of their party via `submit` (from any thread). The parties
+    agree on the batches by exchanging the sizes of their pending requests in
+    a single small message per step.
+
+    Args:
+        model (crypten.nn.Module): encrypted model used for inference.
+        input_size (torch.Size): size of a single example (without batch
+            dimension).
+        max_batch_size (int): maximum number of examples in a batch. Requests
+            larger than this are processed in a batch of their own.
+        max_latency (float): time (in seconds) after which a pending request
+            is processed, even if the batch is not full.
+        poll_interval (float): time (in seconds) that `serve` waits between
+            steps in which no requests were processed.
+        metrics_callback (callable): optional function that is called with
+            the metrics of every batch, e.g., to export them.
+        max_recent_metrics (int): number of recent batches whose metrics are
+            kept in `metrics`. Aggregates over all batches are maintained
+            incrementally (see `summary`), so the memory used by a long-running
+            server does not grow with the number of batches.
+    """
+
+    def __init__(
+        self,
+        model,
+        input_size,
+        max_batch_size=32,
+        max_latency=0.01,
+        poll_interval=0.001,
+        metrics_callback=None,
+        max_recent_metrics=1000,
+    ):
+        assert max_batch_size > 0, "max_batch_size must be positive"
+        assert max_latency >= 0.0, "max_latency must be non-negative"
+        assert max_recent_metrics >= 0, "max_recent_metrics must be non-negative"
+        self.model = model
+        self.input_size = torch.Size(input_size)
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.poll_interval = poll_interval
+        self.metrics_callback = metrics_callback
+        self.metrics = collections.deque(maxlen=max_recent_metrics)
+        self.totals = {
+            "num_batches": 0,
+            "num_requests": 0,
+            "num_examples": 0,
+            "total_time": 0.0,
+            "max_latency": None,
+        }
+        self.pending = collections.deque()
+        self.lock = threading.Lock()
+        self.stopping = False
+
+    def submit(self, input):
+        """
+        Submits a plaintext input (with batch dimension) for inference and
+        returns a `concurrent.futures.Future` of the plaintext output.
+        """
+        assert not self.stopping, "server is stopping"
+        assert (
+            input.dim() >= 1 and input.size()[1:] == self.input_size
+        ), "input must be a batch of examples of size %s" % (self.input_size,)
+        request = _Request(input)
+        with self.lock:
+            self.pending.append(request)
+        return request.future
+
+    def stop(self):
+        """
+        Stops the server of this party. `serve` returns once all parties have
+        stopped and all pending requests are processed.
+        """
+        self.stopping = True
+
+    def _exchange_headers(self):
+        """
+        Communicates the flags and the sizes of the pending requests of all
+        parties. Returns the pending requests of this party and the headers.
+        """
+        with self.lock:
+            pending = list(self.pending)[: _MAX_HEADER_LENGTH - 2]
+        sizes = [request.input.size(0) for request in pending]
+        flags = _STOPPING if self.stopping else 0
+        if len(pending) > 0:
+            waiting_time = time.monotonic() - pending[0].arrival_time
+            if self.stopping or waiting_time >= self.max_latency:
+                flags |= _READY
+        header = [flags, len(sizes)] + sizes
+        header += [0] * (_MAX_HEADER_LENGTH - len(header))
+        headers = comm.get().all_gather(torch.tensor(header, dtype=torch.long))
+        headers = [header.tolist() for header in headers]
+        return pending, [(header[0], header[2 : 2 + header[1]]) for header in headers]
+
+    def _select(self, headers):
+        """
+        Selects the requests of the next batch as `(party, index, size)`
+        tuples. Parties take turns in adding their oldest pending request.
+        """
+        queues = [
+            collections.deque((src, idx, size) for idx, size in enumerate(sizes))
+            for src, (_, sizes) in enumerate(headers)
+        ]
+        selected, batch_size = [], 0
+        while any(len(queue) > 0 for queue in queues):
+            for queue in queues:
+                if len(queue) == 0:
+                    continue
+                size = queue[0][2]
+                if len(selected) > 0 and batch_size + size > self.max_batch_size:
+                    return selected
+                selected.append(queue.popleft())
+                batch_size += size
+        return selected
+
+    def step(self):
+        """
+        Performs one step of the server (in lockstep with the other parties):
+        processes a batch of requests if one is ready. Returns the number of
+        processed requests, or `None` if all parties have stopped.
+        """
+        pending, headers = self._exchange_headers()
+        num_examples = sum(sum(sizes) for _, sizes in headers)
+        if all(flags & _STOPPING for flags, _ in headers) and num_examples == 0:
+            return None
+        ready = any(flags & _READY for flags, _ in headers)
+        if not ready and num_examples < self.max_batch_size:
+            return 0
+
+        # encrypt the inputs of the batch:
+        start_time = time.monotonic()
+        rank = comm.get().get_rank()
+        selected = self._select(headers)
+        inputs = []
+        for src, idx, size in selected:
+            if src == rank:
+                input = pending[idx].input
+            else:
+                input = torch.empty((size,) + self.input_size)
+            inputs.append(crypten.cryptensor(input, src=src))
+        batch = crypten.cat(inputs) if len(inputs) > 1 else inputs[0]
+
+        # run the forward pass:
+        forward_time = time.monotonic()
+        output = self.model(batch)
+        if isinstance(output, AutogradCrypTensor):
+            output = output.tensor
+        forward_time = time.monotonic() - forward_time
+
+        # decrypt the outputs of every party for that party only:
+        requests, offset = collections.defaultdict(list), 0
+        for src, idx, size in selected:
+            requests[src].append((idx, offset, size))
+            offset += size
+        served = []
+        for src in sorted(requests.keys()):
+            slices = [output[start : start + size] for _, start, size in requests[src]]
+            slices = crypten.cat(slices) if len(slices) > 1 else slices[0]
+            result = slices.get_plain_text(dst=src)
+            if src == rank:
+                offset = 0
+                for idx, _, size in requests[src]:
+                    served.append(pending[idx])
+                    pending[idx].future.set_result(result[offset : offset + size])
+                    offset += size
+        with self.lock:
+            for request in served:
+                self.pending.remove(request)
+
+        # record metrics:
+        end_time = time.monotonic()
+        latencies = [end_time - request.arrival_time for request in served]
+        metrics = {
+            "num_requests": len(selected),
+            "batch_size": batch.size(0),
+            "forward_time": forward_time,
+            "batch_time": end_time - start_time,
+            "max_latency": max(latencies) if len(latencies) > 0 else None,
+        }
+        metrics["throughput"] = metrics["batch_size"] / metrics["batch_time"]
+        self._update_totals(metrics)
+        self.metrics.append(metrics)
+        if self.metrics_callback is not None:
+            self.metrics_callback(metrics)
+        logging.debug("Processed batch: %s" % metrics)
+        return len(selected)
+
+    def _update_totals(self, metrics):
+        """Adds the metrics of a batch to the aggregates over all batches."""
+        totals = self.totals
+        totals["num_batches"] += 1
+        totals["num_requests"] += metrics["num_requests"]
+        totals["num_examples"] += metrics["batch_size"]
+        totals["total_time"] += metrics["batch_time"]
+        if metrics["max_latency"] is not None:
+            if totals["max_latency"] is None:
+                totals["max_latency"] = metrics["max_latency"]
+            else:
+                totals["max_latency"] = max(
+                    totals["max_latency"], metrics["max_latency"]
+                )
+
+    def serve(self):
+        """
+        Processes requests until all parties have stopped (see `stop`).
+        Returns the aggregate metrics over all batches (see `summary`).
+        """
+        while True:
+            num_requests = self.step()
+            if num_requests is None:
+                return self.summary()
+            if num_requests == 0:
+                time.sleep(self.poll_interval)
+
+    def summary(self):
+        """Returns aggregate metrics over all batches processed so far."""
+        totals = self.totals
+        num_batches, num_examples = totals["num_batches"], totals["num_examples"]
+        total_time = totals["total_time"]
+        return {
+            "num_batches": num_batches,
+            "num_requests": totals["num_requests"],
+            "num_examples": num_examples,
+            "mean_batch_size": num_examples / num_batches if num_batches else 0.0,
+            "throughput": num_examples / total_time if total_time > 0 else 0.0,
+            "max_latency": totals["max_latency"],
+        }
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from concurrent.futures import ThreadPoolExecutor
+
+import crypten
+import crypten.communicator as comm
+import torch.distributed as dist
+from crypten.communicator import DistributedCommunicator
+from crypten.communicator.fused_communicator import set_thread_communicator
+
+
+class Session:
+    """
+    MPC session between all parties that runs independently of the default
+    computation and of other sessions. Every session has its own
+    `torch.distributed` process group, its own generators for pseudo-random
+    sharings of zero (PRZS), and its own cache of arithmetic-to-binary
+    conversions. Computations of different sessions can therefore run in
+    parallel, for instance to serve several inference requests at once.
+
+    Work items submitted to a session run (one at a time, in order of
+    submission) on a thread of the session, on which
+    `crypten.communicator.get()` returns the communicator of the session.
+
+    Note: sessions are created collectively, so all parties must create their
+    sessions in the same order. Within a session, all parties must submit the
+    same sequence of work items; sessions do not need to be used in the same
+    order by different parties.
+
+    Args:
+        backend (str): `torch.distributed` backend of the process group of the
+            session. Defaults to the backend of the default process group.
+    """
+
+    def __init__(self, backend=None):
+        assert (
+            DistributedCommunicator.is_initialized()
+        ), "sessions require a multi-process communicator: call crypten.init() first"
+        self.group = dist.new_group(backend=backend)
+        self.communicator = DistributedCommunicator(group=self.group)
+        self.communicator.conversion_cache.max_bytes = (
+            comm.get().conversion_cache.max_bytes
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=1,
+            initializer=set_thread_communicator,
+            initargs=(self.communicator,),
+        )
+        self.run(crypten._setup_przs)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Schedules `func(*args, **kwargs)` to run in this session and returns a
+        `concurrent.futures.Future` of its result.
+        """
+        assert self.executor is not None, "session has been closed"
+        return self.executor.submit(func, *args, **kwargs)
+
+    def run(self, func, *args, **kwargs):
+        """Runs `func(*args, **kwargs)` in this session and returns its result."""
+        return self.submit(func, *args, **kwargs).result()
+
+    def close(self):
+        """Waits for all work items to finish and releases the process group."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+            dist.destroy_process_group(self.group)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import crypten.communicator as comm
+import torch
+
+from .mpc import MPCTensor
+
+
+# operators that are recorded on traced tensors:
+_OPERATORS = [
+    "__abs__",
+    "__add__",
+    "__radd__",
+    "__iadd__",
+    "__sub__",
+    "__rsub__",
+    "__isub__",
+    "__mul__",
+    "__rmul__",
+    "__imul__",
+    "__truediv__",
+    "__itruediv__",
+    "__matmul__",
+    "__imatmul__",
+    "__pow__",
+    "__neg__",
+    "__eq__",
+    "__ne__",
+    "__ge__",
+    "__gt__",
+    "__le__",
+    "__lt__",
+    "__getitem__",
+    "__setitem__",
+    "__invert__",
+    "__and__",
+    "__or__",
+    "__xor__",
+    "__lshift__",
+    "__rshift__",
+]
+
+# operations that do not require communication between parties:
+_LOCAL_OPS = {
+    "__add__",
+    "__radd__",
+    "__iadd__",
+    "__sub__",
+    "__rsub__",
+    "__isub__",
+    "__neg__",
+    "__getitem__",
+    "__setitem__",
+    "add",
+    "add_",
+    "sub",
+    "sub_",
+    "neg",
+    "neg_",
+    "clone",
+    "view",
+    "reshape",
+    "flatten",
+    "t",
+    "transpose",
+    "permute",
+    "squeeze",
+    "unsqueeze",
+    "expand",
+    "narrow",
+    "flip",
+    "roll",
+    "take",
+    "gather",
+    "sum",
+    "mean",
+    "cumsum",
+    "trace",
+    "pad",
+    "sum_pool2d",
+    "avg_pool2d",
+    "index_add",
+    "scatter_add",
+}
+
+# operations that only require communication if both inputs are encrypted:
+_PRODUCT_OPS = {
+    "__mul__",
+    "__rmul__",
+    "__imul__",
+    "__matmul__",
+    "__imatmul__",
+    "mul",
+    "mul_",
+    "matmul",
+    "conv2d",
+    "conv_transpose2d",
+}
+
+# operations whose result is a public (scalar) multiple of their input:
+_SCALAR_MUL_OPS = {"__mul__", "__rmul__", "mul"}
+
+# operations that must never be merged with each other:
+_RANDOMIZED_OPS = {"bernoulli", "dropout", "dropout2d", "dropout3d"}
+
+# operations that cannot be traced since their result is not encrypted:
+_DECRYPTING_OPS = {"get_plain_text", "reveal"}
+
+
+class _Ref(tuple):
+    """Reference to (an element of) the output of a node in a trace."""
+
+    def __new__(cls, node, index=None):
+        return super().__new__(cls, (node, index))
+
+
+class _Node:
+    """Operation in a trace: method `op` called on `args[0]`."""
+
+    def __init__(self, op, args, kwargs, inplace=False):
+        self.op = op
+        self.args = args
+        self.kwargs = kwargs
+        self.inplace = inplace
+
+    def refs(self):
+        return _collect_refs([self.args, self.kwargs])
+
+
+def _map_structure(func, value):
+    """Applies `func` to all leaves of nested lists, tuples, and dicts."""
+    if isinstance(value, _Ref):
+        return func(value)
+    if isinstance(value, (list, tuple)):
+        return type(value)(_map_structure(func, item) for item in value)
+    if isinstance(value, dict):
+        return {key: _map_structure(func, item) for key, item in value.items()}
+    return func(value)
+
+
+def _collect_refs(value):
+    refs = []
+
+    def collect(leaf):
+        if isinstance(leaf, _Ref):
+            refs.append(leaf)
+        return leaf
+
+    _map_structure(collect, value)
+    return refs
+
+
+def _is_scalar(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _hashable(value):
+    """Returns hashable key for (nested) node arguments."""
+    if isinstance(value, _Ref):
+        return value
+    if isinstance(value, (list, tuple)):
+        return (type(value),) + tuple(_hashable(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _hashable(item)) for key, item in value.items()))
+    if isinstance(value, (int, float, str, bool, type(None), slice)):
+        return (type(value), str(value))
+    return (type(value), id(value))
+
+
+class TracedTensor:
+    """
+    Wraps an MPCTensor while a function is traced. Operations on the
+    `TracedTensor` are executed on the MPCTensor and recorded in the trace.
+    """
+
+    def __init__(self, trace, value, ref):
+        self._trace = trace
+        self._value = value
+        self._ref = ref
+
+    def __getattr__(self, name):
+        attribute = getattr(self._value, name)
+        if not callable(attribute):
+            return attribute
+        return lambda *args, **kwargs: self._call(name, args, kwargs)
+
+    def __bool__(self):
+        raise RuntimeError("Cannot evaluate TracedTensors to boolean values")
+
+    def __len__(self):
+        return len(self._value)
+
+    def _call(self, name, args, kwargs):
+        if name in _DECRYPTING_OPS:
+            raise NotImplementedError("Cannot decrypt values in a traced function")
+
+        # execute operation on the underlying values:
+        def unwrap(value):
+            return value._value if isinstance(value, TracedTensor) else value
+
+        def to_ref(value):
+            return value._ref if isinstance(value, TracedTensor) else value
+
+        result = getattr(self._value, name)(
+            *_map_structure(unwrap, args), **_map_structure(unwrap, kwargs)
+        )
+        inplace = result is self._value or name == "__setitem__"
+        if not inplace and not _contains_encrypted(result):
+            return result  # public results (e.g., sizes) are constants in the trace
+
+        # record the operation:
+        node = self._trace._add_node(
+            name,
+            [self._ref] + list(_map_structure(to_ref, args)),
+            _map_structure(to_ref, kwargs),
+            inplace=inplace,
+        )
+        if inplace:
+            self._ref = _Ref(node)
+            return None if result is None else self
+        return self._trace._wrap(result, node)
+
+
+def _add_operator(name):
+    def operator(self, *args):
+        return self._call(name, args, {})
+
+    setattr(TracedTensor, name, operator)
+
+
+for name in _OPERATORS:
+    _add_operator(name)
+
+
+def _signature(args):
+    """
+    Returns the sizes and types of the MPCTensor arguments and the values of
+    all other arguments of a traced function.
+    """
+    signature = []
+    for arg in args:
+        if isinstance(arg, MPCTensor):
+            signature.append((MPCTensor, tuple(arg.size()), arg.ptype))
+        elif torch.is_tensor(arg):
+            raise ValueError("Public tensors must not be arguments of traces")
+        else:
+            signature.append(arg)
+    return tuple(signature)
+
+
+def _contains_encrypted(value):
+    if isinstance(value, (list, tuple)):
+        return any(_contains_encrypted(item) for item in value)
+    return isinstance(value, MPCTensor)
+
+
+class Trace:
+    """
+    Program of MPCTensor operations recorded by :func:`crypten.trace`.
+
+    After recording, the following optimization passes are applied:
+
+    - Folding of consecutive multiplications with public scalars, which
+      defers the truncation of the first multiplication.
+    - Common-subexpression elimination (e.g., of repeated comparisons).
+    - Dead-code elimination of operations that do not affect the output.
+
+    Calling the trace on new inputs (with the same sizes, and the same values
+    of all arguments that are not MPCTensors) replays the optimized program.
+    Operations that are independent of each other and require communication
+    are executed in the same communication rounds.
+    """
+
+    def __init__(self):
+        self.nodes = []
+        self.inputs = []
+        self.signature = None
+        self.output = None
+        self.live = []
+
+    def _add_node(self, op, args, kwargs, inplace=False):
+        self.nodes.append(_Node(op, args, kwargs, inplace=inplace))
+        return len(self.nodes) - 1
+
+    def _wrap(self, value, node):
+        """Wraps (tuples or lists of) MPCTensors in TracedTensors."""
+        if isinstance(value, MPCTensor):
+            return TracedTensor(self, value, _Ref(node))
+        if isinstance(value, (list, tuple)):
+            return type(value)(
+                TracedTensor(self, item, _Ref(node, idx))
+                if isinstance(item, MPCTensor)
+                else item
+                for idx, item in enumerate(value)
+            )
+        return value
+
+    def _record(self, func, args):
+        """Executes `func` on `args` while recording its operations."""
+        self.signature = _signature(args)
+        traced_args = []
+        for arg in args:
+            if isinstance(arg, MPCTensor):
+                node = self._add_node(None, [], {})
+                self.inputs.append(node)
+                arg = TracedTensor(self, arg, _Ref(node))
+            traced_args.append(arg)
+
+        output = func(*traced_args)
+
+        def unwrap(value):
+            if isinstance(value, TracedTensor):
+                assert value._trace is self, "Traced function returns foreign value"
+                return value._value
+            return value
+
+        def to_ref(value):
+            return value._ref if isinstance(value, TracedTensor) else value
+
+        self.output = _map_structure(to_ref, output)
+        self._optimize()
+        return _map_structure(unwrap, output)
+
+    # Optimization passes:
+    def _optimize(self):
+        self._fold_scalar_muls()
+        if not any(node.inplace for node in self.nodes):
+            self._eliminate_common_subexpressions()
+        self._eliminate_dead_code()
+
+    def _num_uses(self):
+        uses = [0] * len(self.nodes)
+        for node in self.nodes:
+            for ref in node.refs():
+                uses[ref[0]] += 1
+        for ref in _collect_refs(self.output):
+            uses[ref[0]] += 1
+        return uses
+
+    def _fold_scalar_muls(self):
+        """Replaces x * a * b by x * (a * b) to save a truncation."""
+        uses = self._num_uses()
+
+        def scalar_mul(node):
+            if node.op in _SCALAR_MUL_OPS and not node.kwargs and len(node.args) == 2:
+                if isinstance(node.args[0], _Ref) and _is_scalar(node.args[1]):
+                    return node.args[0], node.args[1]
+            return None
+
+        for node in self.nodes:
+            outer = scalar_mul(node)
+            if outer is None or outer[0][1] is not None:
+                continue
+            inner_node = self.nodes[outer[0][0]]
+            inner = scalar_mul(inner_node)
+            if inner is not None and uses[outer[0][0]] == 1:
+                node.op = "mul"
+                node.args = [inner[0], inner[1] * outer[1]]
+                uses[outer[0][0]] = 0
+                uses[inner[0][0]] += 1
+
+    def _eliminate_common_subexpressions(self):
+        """Merges operations with identical arguments."""
+        seen, replacements = {}, {}
+
+        def replace(value):
+            if isinstance(value, _Ref) and value[0] in replacements:
+                return _Ref(replacements[value[0]], value[1])
+            return value
+
+        for idx, node in enumerate(self.nodes):
+            node.args = _map_structure(replace, node.args)
+            node.kwargs = _map_structure(replace, node.kwargs)
+            if node.op is None or node.op in _RANDOMIZED_OPS:
+                continue
+            key = (node.op, _hashable(node.args), _hashable(node.kwargs))
+            if key in seen:
+                replacements[idx] = seen[key]
+            else:
+                seen[key] = idx
+        self.output = _map_structure(replace, self.output)
+
+    def _eliminate_dead_code(self):
+        """Removes operations whose results are not used."""
+        self.live = [False] * len(self.nodes)
+        for idx in self.inputs:
+            self.live[idx] = True
+        stack = [ref[0] for ref in _collect_refs(self.output)]
+        stack += [idx for idx, node in enumerate(self.nodes) if node.inplace]
+        while len(stack) > 0:
+            idx = stack.pop()
+            if not self.live[idx]:
+                self.live[idx] = True
+                stack.extend(ref[0] for ref in self.nodes[idx].refs())
+
+    # Execution:
+    def _is_interactive(self, node):
+        """Returns whether executing the node requires communication."""
+        if node.op in _LOCAL_OPS:
+            return False
+        if node.op in _PRODUCT_OPS:
+            return len(node.refs()) > 1
+        return True
+
+    def _schedule(self):
+        """Groups live nodes into levels of independent nodes."""
+        nodes = [idx for idx, live in enumerate(self.live) if live]
+        if any(self.nodes[idx].inplace for idx in nodes):
+            return [[idx] for idx in nodes]  # keep order of in-place updates
+        depth, levels = {}, []
+        for idx in nodes:
+            refs = self.nodes[idx].refs()
+            depth[idx] = 1 + max((depth[ref[0]] for ref in refs), default=-1)
+            if depth[idx] == len(levels):
+                levels.append([])
+            levels[depth[idx]].append(idx)
+        return levels
+
+    def __call__(self, *args):
+        signature = _signature(args)
+        if len(signature) != len(self.signature):
+            raise ValueError("Incorrect number of arguments")
+        for idx, (value, traced_value) in enumerate(zip(signature, self.signature)):
+            if value != traced_value:
+                raise ValueError(
+                    "Argument %d does not match the traced argument: %s != %s"
+                    % (idx, value, traced_value)
+                )
+        inputs = [arg for arg in args if isinstance(arg, MPCTensor)]
+        values = dict(zip(self.inputs, inputs))
+
+        def resolve(value):
+            if isinstance(value, _Ref):
+                node, index = value
+                return values[node] if index is None else values[node][index]
+            return value
+
+        def execute(idx):
+            node = self.nodes[idx]
+            args = _map_structure(resolve, node.args)
+            kwargs = _map_structure(resolve, node.kwargs)
+            result = getattr(args[0], node.op)(*args[1:], **kwargs)
+            return args[0] if node.op == "__setitem__" else result
+
+        for level in self._schedule():
+            level = [idx for idx in level if self.nodes[idx].op is not None]
+            interactive = [
+                idx for idx in level if self._is_interactive(self.nodes[idx])
+            ]
+            if len(interactive) > 1:
+                functions = [lambda idx=idx: execute(idx) for idx in interactive]
+                values.update(zip(interactive, comm.run_fused(functions)))
+            for idx in level:
+                if idx not in values:
+                    values[idx] = execute(idx)
+        return _map_structure(resolve, self.output)
+
+
+def trace(func, *args):
+    """
+    Traces the MPCTensor operations that `func` performs on `args` and returns
+    an optimized :class:`Trace` that can be called on new inputs of the same
+    size. The MPCTensor arguments of `func` are the inputs of the trace; all
+    other arguments and all plaintext values used in `func` are constants, so
+    the trace must be called with the same values of the other arguments.
+    """
+    result = Trace()
+    result._record(func, args)
+    return result
+
+
+class CompiledFunction:
+    """
+    Function that is traced on its first call for every combination of input
+    sizes, after which the cached trace is replayed.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.traces = {}
+
+    def __call__(self, *args):
+        key = _signature(args)
+        if key not in self.traces:
+            self.traces[key] = Trace()
+            return self.traces[key]._record(self.func, args)
+        return self.traces[key](*args)
+
+
+def compile(func):
+    """
+    Compiles `func` into a :class:`CompiledFunction` that traces `func` once
+    for each combination of input sizes and replays the optimized trace on
+    subsequent calls.
+    """
+    return CompiledFunction(func)
@@ -60,6 +60,13 @@ parser.add_argument(
     metavar="N",
     help="mini-batch size (default: 5)",
 )
+parser.add_argument(
+    "--micro-batch-size",
+    default=None,
+    type=int,
+    metavar="N",
+    help="micro-batch size for gradient accumulation (default: mini-batch size)",
+)
 parser.add_argument(
     "--print-freq",
     "-p",
@@ -95,6 +102,7 @@ def _run_experiment(args):
         batch_size=args.batch_size,
         print_freq=args.print_freq,
         num_samples=args.num_samples,
+        micro_batch_size=args.micro_batch_size,
     )
 
 
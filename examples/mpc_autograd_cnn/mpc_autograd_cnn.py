@@ -24,10 +24,13 @@ def run_mpc_autograd_cnn(
     batch_size=5,
     print_freq=5,
     num_samples=100,
+    micro_batch_size=None,
 ):
     """
     Args:
         context_manager: used for setting proxy settings during download.
+        micro_batch_size: if set, every mini-batch is processed in micro-batches
+            of this size whose gradients are accumulated, which bounds memory.
     """
     crypten.init()
 
@@ -67,7 +70,14 @@ def run_mpc_autograd_cnn(
 
     # encrypted training
     train_encrypted(
-        x_reduced, y_reduced, model, num_epochs, learning_rate, batch_size, print_freq
+        x_reduced,
+        y_reduced,
+        model,
+        num_epochs,
+        learning_rate,
+        batch_size,
+        print_freq,
+        micro_batch_size=micro_batch_size,
     )
 
 
@@ -79,9 +89,19 @@ def train_encrypted(
     learning_rate,
     batch_size,
     print_freq,
+    micro_batch_size=None,
 ):
     rank = comm.get().get_rank()
     loss = crypten.nn.MSELoss()
+    optimizer = crypten.optim.SGD(encrypted_model.parameters(), learning_rate)
+    if micro_batch_size is None:
+        micro_batch_size = batch_size
+    outputs = []
+
+    def closure(x_train, y_train):
+        output = encrypted_model(x_train)
+        outputs.append(output.tensor)
+        return loss(output, y_train)
 
     num_samples = x_encrypted.size(0)
     label_eye = torch.eye(2)
@@ -102,14 +122,17 @@ def train_encrypted(
             y_one_hot = label_eye[y_encrypted[start:end]]
             y_train = AutogradCrypTensor(crypten.cryptensor(y_one_hot))
 
-            # perform forward pass:
-            output = encrypted_model(x_train)
-            loss_value = loss(output, y_train)
-
-            # backprop
-            encrypted_model.zero_grad()
-            loss_value.backward()
-            encrypted_model.update_parameters(learning_rate)
+            # perform forward and backward passes (per micro-batch) and update:
+            outputs.clear()
+            losses = optimizer.step_micro_batches(
+                closure, [x_train, y_train], micro_batch_size
+            )
+            # weight the losses of the micro-batches by their sizes:
+            weights = torch.tensor([output.size(0) for output in outputs])
+            weights = weights.float() / (end - start)
+            loss_value = crypten.stack([value.tensor for value in losses])
+            loss_value = loss_value.mul(weights).sum()
+            output = crypten.cat(outputs)
 
             # log progress
             if j + batch_size - last_progress_logged >= print_freq:
@@ -9,6 +9,7 @@ from test.multiprocess_test_case import MultiProcessTestCase, get_random_test_te
 
 import crypten
 import torch
+from crypten.autograd_cryptensor import AutogradCrypTensor
 from crypten.common.tensor_types import is_float_tensor, is_int_tensor
 from crypten.mpc.primitives import ArithmeticSharedTensor, BinarySharedTensor
 
@@ -155,3 +156,48 @@ class MPCBenchmark(MultiProcessTestCase):
             for _size, _tensor in zip(self.sizes, self.float_tensors):
                 for _width in [4, 8]:
                     do_benchmark()
+
+    def test_activations(self):
+        """Benchmarks sigmoid / tanh in each activation mode, reporting the
+        maximum absolute error relative to PyTorch."""
+        tensor = torch.linspace(-10, 10, 1000)
+        encrypted_tensor = crypten.cryptensor(tensor)
+        try:
+            for mode in ["exact", "nr", "poly", "hard"]:
+                crypten.mpc.set_activation_mode(mode)
+                for func in ["sigmoid", "tanh"]:
+                    reference = getattr(tensor, func)()
+                    result = getattr(encrypted_tensor, func)().get_plain_text()
+                    max_error = (result - reference).abs().max().item()
+                    with self.benchmark(
+                        func=func, mode=mode, max_error=f"{max_error:.4f}"
+                    ) as bench:
+                        for _ in bench.iters:
+                            encrypted_out = getattr(encrypted_tensor, func)()
+
+                    self.assertTrue(encrypted_out is not None)
+        finally:
+            crypten.mpc.set_activation_mode("exact")
+
+    def test_autograd_dispatch(self):
+        """Benchmarks the Python overhead of calling functions on an
+        AutogradCrypTensor relative to calling them on the MPCTensor."""
+        tensor = crypten.cryptensor(self.float_tensors[0])
+        for requires_grad in [False, True]:
+            autograd_tensor = AutogradCrypTensor(tensor, requires_grad=requires_grad)
+            for func in ["size", "neg", "t"]:
+                for tensor_type, encrypted_tensor in [
+                    ("MPCTensor", tensor),
+                    ("AutogradCrypTensor", autograd_tensor),
+                ]:
+                    with self.benchmark(
+                        tensor_type=tensor_type,
+                        func=func,
+                        requires_grad=requires_grad,
+                        niters=self.benchmark_iters * 10,
+                    ) as bench:
+                        for _ in bench.iters:
+                            result = getattr(encrypted_tensor, func)()
+
+                    self.assertTrue(result is not None)
+                    autograd_tensor.parents = []  # do not accumulate the graph
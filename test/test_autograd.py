@@ -7,6 +7,7 @@
 
 import logging
 import random
+import sys
 import unittest
 from test.multiprocess_test_case import (
     MultiProcessTestCase,
@@ -15,6 +16,7 @@ from test.multiprocess_test_case import (
 )
 
 import crypten
+import crypten.communicator as comm
 import crypten.gradients as gradients
 import torch
 import torch.nn.functional as F
@@ -372,6 +374,37 @@ class TestAutograd(MultiProcessTestCase):
             self.assertIsNone(input1.grad, msg)
             self.assertIsNotNone(input2.grad, msg)
 
+    def test_attribute_dispatch(self):
+        """Tests dispatching of attributes of AutogradCrypTensors."""
+        tensor = get_random_test_tensor(size=(4, 3), is_float=True)
+        encrypted_tensor = AutogradCrypTensor(crypten.cryptensor(tensor))
+
+        # registered functions are recorded in the graph, others dispatched:
+        result = encrypted_tensor.neg()
+        self.assertIsInstance(result, AutogradCrypTensor)
+        self.assertIs(result.grad_fn, gradients.get_grad_fn("neg"))
+        self.assertEqual(encrypted_tensor.size(), tensor.size())
+        self.assertEqual(encrypted_tensor.dim(), tensor.dim())
+        self.assertTrue(crypten.is_encrypted_tensor(encrypted_tensor))
+        self._check(encrypted_tensor[1:3], tensor[1:3], "indexing failed")
+        self._check(1.0 - encrypted_tensor, 1.0 - tensor, "__rsub__ failed")
+
+        # in-place functions are not supported:
+        with self.assertRaises(NotImplementedError):
+            encrypted_tensor.add_(1.0)
+
+        # nodes have no attribute dictionary:
+        with self.assertRaises(AttributeError):
+            encrypted_tensor.foo = 1
+
+        # functions registered later are recorded as well:
+        gradients.register_function("mock_dispatch")(
+            type("MockDispatchName", (gradients.AutogradNeg,), {})
+        )
+        result = encrypted_tensor.mock_dispatch()
+        self.assertTrue(issubclass(result.grad_fn, gradients.AutogradNeg))
+        self._check(result, tensor.neg(), "dispatch of new function failed")
+
     def test_autograd_accumulation(self):
         """Tests accumulation in autograd."""
 
@@ -443,6 +476,50 @@ class TestAutograd(MultiProcessTestCase):
             encr_output.backward()
             self._check(encr_input.grad, input.grad, "%s backward failed" % func_name)
 
+    def test_backward_order(self):
+        """Tests backward on deep graphs and on graphs with independent nodes."""
+
+        # graphs deeper than the recursion limit:
+        input = get_random_test_tensor(size=(3, 2), is_float=True)
+        encr_input = AutogradCrypTensor(crypten.cryptensor(input))
+        encr_output = encr_input
+        for _ in range(2 * sys.getrecursionlimit() + 1):
+            encr_output = encr_output.neg()
+        encr_output.sum().backward()
+        self._check(encr_input.grad, -torch.ones(input.size()), "deep backward failed")
+
+        # independent gradient functions share communication rounds:
+        input = get_random_test_tensor(size=(4, 5), is_float=True)
+        input.requires_grad = True
+        weights = [
+            get_random_test_tensor(size=(5, 3), is_float=True) for _ in range(2)
+        ]
+        for weight in weights:
+            weight.requires_grad = True
+        encr_input = AutogradCrypTensor(crypten.cryptensor(input))
+        encr_weights = [
+            AutogradCrypTensor(crypten.cryptensor(weight)) for weight in weights
+        ]
+        rounds = []
+        for num_branches in [1, 2]:
+            encr_output = encr_input.matmul(encr_weights[0])
+            for encr_weight in encr_weights[1:num_branches]:
+                encr_output = encr_output.add(encr_input.matmul(encr_weight))
+            encr_output = encr_output.sum()
+            comm.get().set_verbosity(True)
+            crypten.reset_communication_stats()
+            encr_output.backward()
+            rounds.append(comm.get().comm_rounds)
+            comm.get().set_verbosity(False)
+        self.assertEqual(rounds[0], rounds[1])
+
+        # check gradients accumulated in leaves over both backward passes:
+        input.matmul(weights[0]).sum().backward()
+        input.matmul(weights[0]).add(input.matmul(weights[1])).sum().backward()
+        self._check(encr_input.grad, input.grad, "backward failed")
+        for encr_weight, weight in zip(encr_weights, weights):
+            self._check(encr_weight.grad, weight.grad, "backward failed")
+
     def test_autograd(self):
         """Tests autograd graph construction and backprop."""
 
@@ -9,6 +9,7 @@ import sys
 import unittest
 
 import crypten
+import crypten.common.rng as rng
 import torch
 from crypten.encoder import FixedPointEncoder, nearest_integer_division
 
@@ -66,6 +67,44 @@ class TestCommon(unittest.TestCase):
             decoded = fpe.decode(fpe.encode(tensor)).type(dtype)
             self._check(decoded, tensor, "Encoding/decoding a %s failed." % dtype)
 
+    def test_philox_generator(self):
+        """Tests random access and chunked generation of the PRZS generator."""
+        generator = rng.PhiloxGenerator(seed=1234)
+        stream = generator.random_words(103)
+        self.assertEqual(stream.dtype, torch.long)
+
+        # the stream is continued where it stopped (at a block boundary):
+        next_words = generator.random_words(5)
+        reference = rng.PhiloxGenerator(seed=1234).random_words(109)[104:]
+        self._check(next_words, reference, "Continuing the stream failed.")
+
+        # random access returns the same words as sequential generation:
+        for offset, numel in [(0, 10), (3, 17), (50, 53)]:
+            words = generator.random_words(numel, offset=offset)
+            reference = stream[offset : offset + numel]
+            self._check(words, reference, "Random access into the stream failed.")
+
+        # chunked (multi-threaded) generation matches the reference stream:
+        chunk_size = rng._CHUNK_SIZE
+        rng._CHUNK_SIZE = 16
+        try:
+            words = rng.PhiloxGenerator(seed=1234).random_words(103)
+        finally:
+            rng._CHUNK_SIZE = chunk_size
+        self._check(words, stream, "Chunked generation failed.")
+
+        # words cover the full 64-bit ring and generators differ per seed:
+        words = rng.generate_random_ring_element((1000,), generator=generator)
+        self.assertTrue((words < -(2 ** 62)).any() and (words >= 2 ** 62).any())
+        other = rng.PhiloxGenerator(seed=4321).random_words(103)
+        self.assertFalse((other == stream).all().item())
+
+        # k-bit tensors are within range:
+        bits = rng.generate_kbit_random_tensor(
+            (1000,), bitlength=8, generator=generator
+        )
+        self.assertTrue(((bits >= 0) & (bits < 256)).all().item())
+
     def test_nearest_integer_division(self):
         # test without scaling:
         scale = 1
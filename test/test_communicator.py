@@ -12,6 +12,7 @@ from test.multithread_test_case import MultiThreadTestCase
 import crypten
 import crypten.communicator as comm
 import torch
+from crypten.common.rng import generate_random_ring_element
 
 
 class TestCommunicator:
@@ -23,10 +24,22 @@ class TestCommunicator:
 
     def test_przs_generators(self):
         """Tests that przs generators are initialized independently"""
-        t0 = torch.randint(-2 ** 63, 2 ** 63 - 1, (1,), generator=comm.get().g0)
-        t1 = torch.randint(-2 ** 63, 2 ** 63 - 1, (1,), generator=comm.get().g1)
+        t0 = generate_random_ring_element((1,), generator=comm.get().g0)
+        t1 = generate_random_ring_element((1,), generator=comm.get().g1)
         self.assertNotEqual(t0.item(), t1.item())
 
+    def test_conversion_cache(self):
+        """Tests that every party caches its own conversions"""
+        cache = comm.get().conversion_cache
+        cache.reset_stats()
+        tensor = get_random_test_tensor(is_float=True)
+        encrypted_tensor = crypten.cryptensor(tensor)
+        for _ in range(2):
+            encrypted_relu = encrypted_tensor.relu()
+        plain_text = encrypted_relu.get_plain_text()
+        self.assertTrue(torch.allclose(plain_text, tensor.relu(), atol=1e-3))
+        self.assertEqual(cache.stats, {"hits": 1, "misses": 1, "evictions": 0})
+
     def test_send_recv(self):
         tensor = torch.LongTensor([self.rank])
 
@@ -206,6 +219,36 @@ class TestCommunicatorMultiProcess(TestCommunicator, MultiProcessTestCase):
         self.assertEqual(comm.get().comm_rounds, 0)
         self.assertEqual(comm.get().comm_bytes, 0)
 
+    def test_run_fused(self):
+        """Tests that run_fused executes the communication of functions jointly"""
+        sizes = [(5,), (3, 5), (2, 3, 4)]
+        tensors = [get_random_test_tensor(size=size, is_float=True) for size in sizes]
+        encrypted_tensors = [crypten.cryptensor(tensor) for tensor in tensors]
+
+        def function(x):
+            return x.mul(x.add(1)).relu()
+
+        comm.get().set_verbosity(True)
+        crypten.reset_communication_stats()
+        function(encrypted_tensors[0])
+        rounds = comm.get().comm_rounds
+
+        crypten.reset_communication_stats()
+        encrypted_outputs = comm.run_fused(
+            [lambda x=x: function(x) for x in encrypted_tensors]
+        )
+        self.assertEqual(comm.get().comm_rounds, rounds)
+        comm.get().set_verbosity(False)
+
+        for tensor, encrypted_output in zip(tensors, encrypted_outputs):
+            reference = function(tensor)
+            output = encrypted_output.get_plain_text()
+            self.assertTrue((output - reference).abs().le(0.01).all())
+
+        # errors are raised in the calling thread:
+        with self.assertRaises(ValueError):
+            comm.run_fused([lambda: encrypted_tensors[0].relu(), lambda: int("x")])
+
 
 # This code only runs when executing the file outside the test harness (e.g.
 # via the buck target test_mpc_benchmark)
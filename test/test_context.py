@@ -6,12 +6,14 @@
 # LICENSE file in the root directory of this source tree.
 
 
+import time
 import unittest
 
 import crypten
 import crypten.communicator as comm
 import crypten.mpc as mpc
 import torch
+from crypten.common.rng import generate_random_ring_element
 
 
 @mpc.run_multiprocess(world_size=2)
@@ -31,8 +33,8 @@ def test_worldsize_func():
 
 @mpc.run_multiprocess(world_size=2)
 def test_generator_func():
-    t0 = torch.randint(-2 ** 63, 2 ** 63 - 1, (1,), generator=comm.get().g0).item()
-    t1 = torch.randint(-2 ** 63, 2 ** 63 - 1, (1,), generator=comm.get().g1).item()
+    t0 = generate_random_ring_element((1,), generator=comm.get().g0).item()
+    t1 = generate_random_ring_element((1,), generator=comm.get().g1).item()
     return (t0, t1)
 
 
@@ -42,6 +44,30 @@ def test_with_args_kwargs_func(first, *args, a=None, **kwargs):
     return args, kwargs
 
 
+@mpc.run_multiprocess(world_size=2, persistent=True)
+def test_persistent_func(value):
+    return comm.get().get_rank() + value
+
+
+def _pool_func(value):
+    return comm.get().get_rank(), value
+
+
+def _pool_exception_func():
+    if comm.get().get_rank() == 0:
+        raise RuntimeError()
+    return comm.get().all_reduce(torch.tensor([1]))
+
+
+def _pool_sleep_func(seconds):
+    if comm.get().get_rank() == 0:
+        time.sleep(seconds)
+
+
+def _pool_generator_func():
+    return test_generator_func()
+
+
 class TestContext(unittest.TestCase):
     def test_rank(self):
         ranks = test_rank_func()
@@ -91,3 +117,38 @@ class TestContext(unittest.TestCase):
 
         self.assertEqual(ret_args, args[1:])
         self.assertEqual(ret_kwargs, kwargs)
+
+    def test_party_pool(self):
+        """Tests that a party pool runs work items on persistent parties"""
+        with mpc.PartyPool(world_size=2) as pool:
+            self.assertTrue(pool.health_check())
+            pids = [process.pid for process in pool.processes]
+            for value in range(3):
+                self.assertEqual(pool.run(_pool_func, value), [(0, value), (1, value)])
+            self.assertEqual(pids, [process.pid for process in pool.processes])
+
+            # generators are shared across work items:
+            generators = pool.run(_pool_generator_func)
+            self.assertEqual(generators[0][0], generators[1][1])
+            self.assertNotEqual(generators, pool.run(_pool_generator_func))
+
+            # failing parties cause a restart of the pool:
+            self.assertIsNone(pool.run(_pool_exception_func))
+            self.assertTrue(pool.health_check())
+            self.assertNotEqual(pids, [process.pid for process in pool.processes])
+            self.assertEqual(pool.run(_pool_func, 1), [(0, 1), (1, 1)])
+
+            # failed health checks restart the pool, so that no party remains
+            # blocked in the communication of the health check:
+            pids = [process.pid for process in pool.processes]
+            pool._submit(_pool_sleep_func, (60,), {})
+            self.assertFalse(pool.health_check(timeout=1.0))
+            self.assertNotEqual(pids, [process.pid for process in pool.processes])
+            start_time = time.monotonic()
+            self.assertEqual(pool.run(_pool_func, 2), [(0, 2), (1, 2)])
+            self.assertLess(time.monotonic() - start_time, 30)
+        self.assertFalse(pool.is_alive())
+
+    def test_persistent(self):
+        self.assertEqual(test_persistent_func(1), [1, 2])
+        self.assertEqual(test_persistent_func(value=2), [2, 3])
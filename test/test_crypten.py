@@ -9,13 +9,20 @@
 import itertools
 import logging
 import math
+import os
 import unittest
-from test.multiprocess_test_case import MultiProcessTestCase, get_random_test_tensor
+from test.multiprocess_test_case import (
+    MultiProcessTestCase,
+    get_random_linear,
+    get_random_test_tensor,
+)
 
 import crypten
+import numpy as np
 import torch
 import torch.distributed as dist
 import torch.nn.functional as F
+from crypten.autograd_cryptensor import AutogradCrypTensor
 from crypten.common.tensor_types import is_float_tensor
 from crypten.mpc.primitives import ArithmeticSharedTensor, BinarySharedTensor
 from torch import nn
@@ -179,6 +186,217 @@ class TestCrypten(MultiProcessTestCase):
                         filename, dummy_model=failure_dummy_model, src=src
                     )
 
+    def test_save_load_shares(self):
+        """Test that encrypted tensors and modules are saved as shares"""
+        import tempfile
+
+        temp_dir = tempfile.TemporaryDirectory()
+
+        # save and load encrypted tensors:
+        tensor = get_random_test_tensor(size=(3, 4), is_float=True)
+        for ptype in [crypten.arithmetic, crypten.binary]:
+            for requires_grad in [None, False, True]:
+                encrypted_tensor = crypten.cryptensor(tensor, ptype=ptype)
+                if requires_grad is not None:
+                    encrypted_tensor = AutogradCrypTensor(
+                        encrypted_tensor, requires_grad=requires_grad
+                    )
+                path = os.path.join(temp_dir.name, "%s_%s" % (ptype, requires_grad))
+                crypten.save(encrypted_tensor, path)
+                for filename in ["shares_%d.bin", "manifest_%d.json"]:
+                    filename = os.path.join(path, filename % self.rank)
+                    self.assertTrue(os.path.exists(filename), "file not saved")
+                encrypted_load = crypten.load(path, encrypted=True)
+                if requires_grad is None:
+                    self.assertEqual(encrypted_load.ptype, ptype)
+                    self.assertTrue(
+                        encrypted_load._tensor.share.eq(
+                            encrypted_tensor._tensor.share
+                        ).all()
+                    )
+                else:
+                    self.assertIsInstance(encrypted_load, AutogradCrypTensor)
+                    self.assertEqual(encrypted_load.requires_grad, requires_grad)
+                reference = encrypted_tensor.get_plain_text().float()
+                self._check(encrypted_load, reference, "crypten.load() failed")
+
+        # save and load encrypted modules:
+        linear = get_random_linear(10, 4)
+        input = get_random_test_tensor(size=(2, 10), is_float=True)
+        model = crypten.nn.from_pytorch(linear, input).encrypt()
+        path = os.path.join(temp_dir.name, "model")
+        crypten.save(model, path)
+        dummy_model = crypten.nn.from_pytorch(torch.nn.Linear(10, 4), input)
+        loaded_model = crypten.load(path, encrypted=True, dummy_model=dummy_model)
+        self.assertTrue(loaded_model.encrypted, "loaded model not encrypted")
+        output = loaded_model(crypten.cryptensor(input))
+        self._check(output, linear(input), "loaded module failed")
+        with self.assertRaises(ValueError):
+            failure_dummy_model = crypten.nn.from_pytorch(torch.nn.Linear(10, 5), input)
+            crypten.load(path, encrypted=True, dummy_model=failure_dummy_model)
+
+        # all parties must load the same checkpoint:
+        paths = [os.path.join(temp_dir.name, "tensor_%d" % idx) for idx in range(2)]
+        for path in paths:
+            crypten.save(crypten.cryptensor(tensor), path)
+        with self.assertRaises(ValueError):
+            crypten.load(paths[self.rank % 2], encrypted=True)
+        temp_dir.cleanup()
+
+    def test_encrypted_data_loader(self):
+        """Test that batches are encrypted correctly by EncryptedDataLoader"""
+        features = get_random_test_tensor(size=(10, 5), is_float=True)
+        labels = get_random_test_tensor(size=(10,), is_float=True)
+        dataset = torch.utils.data.TensorDataset(features, labels)
+
+        for num_prefetch in [0, 2]:
+            # a single party owns the data:
+            dataloader = torch.utils.data.DataLoader(dataset, batch_size=4)
+            loader = crypten.data.EncryptedDataLoader(
+                dataloader if self.rank == 0 else None, num_prefetch=num_prefetch
+            )
+            self.assertEqual(len(loader), 3, "incorrect length")
+            num_batches = 0
+            for idx, (encr_features, encr_labels) in enumerate(loader):
+                start, end = 4 * idx, min(4 * idx + 4, 10)
+                self._check(encr_features, features[start:end], "features failed")
+                self._check(encr_labels, labels[start:end], "labels failed")
+
+                # computations in the main thread are not affected:
+                product = encr_features * crypten.cryptensor(features[start:end])
+                reference = features[start:end] * features[start:end]
+                self._check(product, reference, "computation failed")
+                num_batches += 1
+            self.assertEqual(num_batches, 3, "incorrect number of batches")
+
+            # every party owns some of the feature columns:
+            columns = [features[:, :2], features[:, 2:]]
+            dataloader = torch.utils.data.DataLoader(columns[self.rank], batch_size=4)
+            loader = crypten.data.EncryptedDataLoader(
+                dataloader, src=[0, 1], num_prefetch=num_prefetch
+            )
+            self.assertEqual(len(loader), 3, "incorrect length")
+            for idx, encr_features in enumerate(loader):
+                start, end = 4 * idx, min(4 * idx + 4, 10)
+                self._check(encr_features, features[start:end], "columns failed")
+
+    def test_cryptensor_chunked(self):
+        """Test that tensors are encrypted correctly chunk by chunk"""
+        import tempfile
+
+        tensor = get_random_test_tensor(size=(5, 7), is_float=True)
+        for chunk_size in [1, 8, 100]:
+            # encrypt tensor whose size is broadcast by the source:
+            source = tensor if self.rank == 0 else None
+            encrypted_tensor = crypten.cryptensor_chunked(source, chunk_size=chunk_size)
+            self._check(encrypted_tensor, tensor, "chunked encryption failed")
+
+            # encrypt numpy memmap into memory-mapped share buffer:
+            with tempfile.TemporaryDirectory() as path:
+                filename = os.path.join(path, "data.bin")
+                if self.rank == 1:
+                    data = np.memmap(
+                        filename, dtype=np.float32, mode="w+", shape=(5, 7)
+                    )
+                    data[:] = tensor.numpy()
+                out = np.memmap(
+                    filename + ".shares", dtype=np.int64, mode="w+", shape=(35,)
+                )
+                encrypted_tensor = crypten.cryptensor_chunked(
+                    data if self.rank == 1 else None,
+                    size=(5, 7),
+                    src=1,
+                    chunk_size=chunk_size,
+                    out=out,
+                )
+                share = encrypted_tensor._tensor.share
+                self.assertEqual(share.data_ptr(), out.ctypes.data)
+                self._check(encrypted_tensor, tensor, "chunked encryption failed")
+
+    def test_sessions(self):
+        """Test that sessions run computations concurrently and independently"""
+        inputs = [get_random_test_tensor(size=(4, 5), is_float=True) for _ in range(3)]
+
+        def compute(tensor):
+            encrypted_tensor = crypten.cryptensor(tensor)
+            return encrypted_tensor.mul(encrypted_tensor).sub(1.0).relu()
+
+        sessions = [crypten.session.Session() for _ in range(2)]
+        for session in sessions:
+            communicator = session.run(crypten.communicator.get)
+            self.assertIs(communicator, session.communicator)
+            self.assertEqual(communicator.get_rank(), self.rank)
+            self.assertIsNot(communicator.g0, crypten.communicator.get().g0)
+
+        # parties may use the sessions in different orders:
+        order = [0, 1] if self.rank == 0 else [1, 0]
+        futures = {idx: sessions[idx].submit(compute, inputs[idx]) for idx in order}
+        result = compute(inputs[2])
+        for idx, tensor in enumerate(inputs):
+            reference = tensor.mul(tensor).sub(1.0).relu()
+            if idx < 2:
+                encrypted_result = sessions[idx].run(futures[idx].result)
+            else:
+                encrypted_result = result
+            self._check(encrypted_result, reference, "session %d failed" % idx)
+
+        for session in sessions:
+            session.close()
+            with self.assertRaises(AssertionError):
+                session.submit(compute, inputs[0])
+
+    def test_inference_server(self):
+        """Test that the inference server batches requests of all parties"""
+        import threading
+
+        model = nn.Linear(5, 3)
+        model.weight.data.copy_(get_random_test_tensor(size=(3, 5), is_float=True))
+        model.bias.data.copy_(get_random_test_tensor(size=(3,), is_float=True))
+        encrypted_model = crypten.nn.from_pytorch(model, torch.empty(1, 5))
+        encrypted_model.encrypt()
+
+        # every party has a client that submits requests of different sizes:
+        all_requests = [
+            [get_random_test_tensor(size=(size, 5), is_float=True) for size in sizes]
+            for sizes in [[1, 2, 1], [3, 1]]
+        ]
+        requests = all_requests[self.rank]
+        server = crypten.serving.InferenceServer(
+            encrypted_model,
+            (5,),
+            max_batch_size=4,
+            max_latency=0.05,
+            max_recent_metrics=2,
+        )
+        results = []
+
+        def client():
+            futures = [server.submit(request) for request in requests]
+            results.extend(future.result() for future in futures)
+            server.stop()
+
+        thread = threading.Thread(target=client)
+        thread.start()
+        summary = server.serve()
+        thread.join()
+
+        # every party obtains the outputs of its own requests:
+        self.assertEqual(len(results), len(requests))
+        for request, result in zip(requests, results):
+            with torch.no_grad():
+                reference = model(request)
+            self.assertTrue(torch.allclose(result, reference, atol=0.05))
+
+        # all parties processed the same batches:
+        self.assertEqual(summary, server.summary())
+        self.assertEqual(summary["num_requests"], 5)
+        self.assertEqual(summary["num_examples"], 8)
+        self.assertGreaterEqual(summary["num_batches"], 2)
+
+        # only the metrics of the most recent batches are kept:
+        self.assertEqual(len(server.metrics), 2)
+        self.assertTrue(all(m["batch_size"] <= 4 for m in server.metrics))
+
     def test_where(self):
         """Test that crypten.where properly conditions"""
         sizes = [(10,), (5, 10), (1, 5, 10)]
@@ -220,6 +438,40 @@ class TestCrypten(MultiProcessTestCase):
                 "where failed with private condition",
             )
 
+    def test_compare_many_relu_many(self):
+        """Tests batched comparisons and ReLUs of differently sized tensors"""
+        sizes = [(5,), (3, 5), (2, 3, 4)]
+        tensors = [get_random_test_tensor(size=size, is_float=True) for size in sizes]
+        encrypted_tensors = [crypten.cryptensor(tensor) for tensor in tensors]
+        others = [get_random_test_tensor(size=size, is_float=True) for size in sizes]
+        other_types = [lambda x: x, crypten.cryptensor, lambda x: 0]
+
+        for op in ["lt", "le", "gt", "ge"]:
+            pairs = [
+                (encrypted_tensor, other_type(other))
+                for encrypted_tensor, other, other_type in zip(
+                    encrypted_tensors, others, other_types
+                )
+            ]
+            encrypted_out = crypten.compare_many(pairs, op=op)
+            for i, other_type in enumerate(other_types):
+                other = others[i] if i < 2 else torch.zeros(sizes[i])
+                reference = getattr(tensors[i], op)(other).float()
+                self._check(encrypted_out[i], reference, "compare_many %s failed" % op)
+
+        # a batched ReLU must take as many rounds as a single ReLU:
+        crypten.comm.get().set_verbosity(True)
+        crypten.reset_communication_stats()
+        encrypted_tensors[0].relu()
+        rounds = crypten.comm.get().comm_rounds
+        self.assertGreater(rounds, 0, "communication rounds are not logged")
+        crypten.reset_communication_stats()
+        encrypted_out = crypten.relu_many(encrypted_tensors)
+        self.assertEqual(crypten.comm.get().comm_rounds, rounds)
+        crypten.comm.get().set_verbosity(False)
+        for i, tensor in enumerate(tensors):
+            self._check(encrypted_out[i], tensor.relu(), "relu_many failed")
+
 
 # Modules used for testing saveing / loading of modules
 class TestModule(nn.Module):
@@ -228,6 +228,10 @@ class TestGradients(MultiProcessTestCase):
 
                 self._check_forward_backward(func, tensor)
 
+        # the gradient of relu at 0 is 0, as in PyTorch:
+        tensor = torch.tensor([-1.0, 0.0, 0.0, 1.0])
+        self._check_forward_backward("relu", tensor)
+
     def test_dot_ger(self):
         """Test inner and outer products of encrypted tensors."""
         for length in range(1, 10):
@@ -279,9 +283,7 @@ class TestGradients(MultiProcessTestCase):
 
         kernel_sizes = [(1, 1), (2, 2), (5, 5), (2, 3)]
         paddings = [0, 1, (0, 1)]
-        # TODO: Fix conv2d backward with stride = 2
-        # strides = [1, 2, (1, 2)]
-        strides = [1]
+        strides = [1, 2, (1, 2)]
         for image_size, in_channels, batches in itertools.product(
             image_sizes, nchannels, nbatches
         ):
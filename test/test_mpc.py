@@ -13,10 +13,13 @@ import unittest
 from test.multiprocess_test_case import MultiProcessTestCase, get_random_test_tensor
 from test.multithread_test_case import MultiThreadTestCase
 
+import crypten
+import crypten.communicator as comm
 import torch
 import torch.nn.functional as F
 from crypten.common.tensor_types import is_float_tensor
 from crypten.mpc import MPCTensor, ptype
+from crypten.mpc.primitives import converters
 
 
 class TestMPC(MultiProcessTestCase):
@@ -111,6 +114,17 @@ class TestMPC(MultiProcessTestCase):
                     )
                     self._check(encrypted_tensor2, reference, "en/decryption failed")
 
+        # decryption for a single party:
+        reference = get_random_test_tensor(size=(5, 5), is_float=True)
+        for ptype in [crypten.arithmetic, crypten.binary]:
+            encrypted_tensor = MPCTensor(reference).to(ptype)
+            for dst in range(self.world_size):
+                plain_text = encrypted_tensor.get_plain_text(dst=dst)
+                if self.rank == dst:
+                    self.assertTrue(torch.allclose(plain_text, reference, atol=1e-4))
+                else:
+                    self.assertIsNone(plain_text)
+
     def test_arithmetic(self):
         """Tests arithmetic functions on encrypted tensor."""
         arithmetic_functions = ["add", "add_", "sub", "sub_", "mul", "mul_"]
@@ -729,6 +743,46 @@ class TestMPC(MultiProcessTestCase):
 
             self._check(encrypted_out, reference, "%s failed" % op)
 
+    def test_conversion_cache(self):
+        """Test caching of arithmetic-to-binary conversions"""
+        tensor = get_random_test_tensor(is_float=True)
+        tensor = tensor + (tensor == 0).float()
+        encrypted_tensor = MPCTensor(tensor)
+
+        crypten.reset_communication_stats()
+        self._check(encrypted_tensor.relu(), tensor.relu(), "relu failed")
+        self._check(encrypted_tensor.sign(), tensor.sign(), "sign failed")
+        self._check(encrypted_tensor.abs(), tensor.abs(), "abs failed")
+        self._check(encrypted_tensor, tensor, "comparisons modified input")
+        self.assertEqual(encrypted_tensor.ptype, ptype.arithmetic)
+        stats = converters.get_conversion_cache_stats()
+        self.assertEqual(stats["misses"], 1, "conversion was not cached")
+        self.assertEqual(stats["hits"], 2, "cached conversion was not reused")
+
+        # in-place modifications must invalidate the cached conversion
+        tensor2 = get_random_test_tensor(is_float=True)
+        for inplace_op in ["add_", "mul_"]:
+            for y_type in [lambda y: y, MPCTensor]:
+                tensor = getattr(tensor, inplace_op)(tensor2)
+                getattr(encrypted_tensor, inplace_op)(y_type(tensor2))
+                self._check(encrypted_tensor.sign(), tensor.sign(), "stale cache")
+
+        # binary-to-arithmetic conversions must not modify their input
+        encrypted_binary = encrypted_tensor.binary()
+        for _ in range(2):
+            self._check(encrypted_binary.arithmetic(), tensor, "B2A failed")
+
+        max_bytes = comm.get().conversion_cache.max_bytes
+        try:
+            converters.set_conversion_cache_size(0)
+            crypten.reset_communication_stats()
+            for _ in range(2):
+                self._check(encrypted_tensor.relu(), tensor.relu(), "relu failed")
+            stats = converters.get_conversion_cache_stats()
+            self.assertEqual(stats["hits"], 0, "disabled cache was used")
+        finally:
+            converters.set_conversion_cache_size(max_bytes)
+
     def test_approximations(self):
         """Test appoximate functions (exp, log, sqrt, reciprocal, pos_pow)"""
 
@@ -789,6 +843,36 @@ class TestMPC(MultiProcessTestCase):
                     encrypted_out = encrypted_tensor.pow(power)
             self._check(encrypted_out, reference, "pow failed with power %s" % power)
 
+    def test_powers_polynomial(self):
+        """Tests powers and polynomial functions"""
+        for size in [(), (5,), (5, 5)]:
+            tensor = get_random_test_tensor(size=size, is_float=True, max_value=2)
+            encrypted_tensor = MPCTensor(tensor)
+
+            for n in [1, 2, 3, 6]:
+                reference = torch.stack([tensor.pow(i + 1) for i in range(n)])
+                with self.benchmark(niters=10, func="powers", n=n) as bench:
+                    for _ in bench.iters:
+                        encrypted_out = encrypted_tensor.powers(n)
+                self._check(encrypted_out, reference, "powers failed with n=%d" % n)
+
+            coeffs = [0.5, -1.0, 0.25, 1 / 3]
+            reference = sum(c * tensor.pow(i + 1) for i, c in enumerate(coeffs))
+            for coeff_type in [lambda x: x, torch.tensor]:
+                encrypted_out = encrypted_tensor.polynomial(coeff_type(coeffs))
+                self._check(encrypted_out, reference, "polynomial failed")
+
+            # Evaluate several polynomials over the same powers
+            coeffs = get_random_test_tensor(size=(3, 4), is_float=True, max_value=2)
+            reference = torch.stack(
+                [
+                    sum(c * tensor.pow(i + 1) for i, c in enumerate(row))
+                    for row in coeffs
+                ]
+            )
+            encrypted_out = encrypted_tensor.polynomial(coeffs)
+            self._check(encrypted_out, reference, "batched polynomial failed")
+
     def test_norm(self):
         """Tests p-norm"""
         for p in [1, 1.5, 2, 3, float("inf"), "fro"]:
@@ -818,6 +902,83 @@ class TestMPC(MultiProcessTestCase):
                     encrypted_out = getattr(encrypted_tensor, func)()
             self._check(encrypted_out, reference, "%s failed" % func)
 
+    def test_activation_modes(self):
+        """Tests approximate activation modes for sigmoid and tanh"""
+        tensor = torch.tensor([0.01 * i for i in range(-1000, 1001, 1)])
+        encrypted_tensor = MPCTensor(tensor)
+
+        def hard_sigmoid(x):
+            return (x / 4 + 0.5).clamp(0, 1)
+
+        references = {
+            "nr": (torch.sigmoid, torch.tanh, None),
+            "poly": (torch.sigmoid, torch.tanh, 0.2),
+            "hard": (hard_sigmoid, lambda x: 2 * hard_sigmoid(2 * x) - 1, None),
+        }
+        try:
+            for mode, (sigmoid, tanh, tolerance) in references.items():
+                crypten.mpc.set_activation_mode(mode)
+                self.assertEqual(crypten.mpc.get_activation_mode(), mode)
+                for func, reference in [("sigmoid", sigmoid), ("tanh", tanh)]:
+                    with self.benchmark(niters=10, func=func, mode=mode) as bench:
+                        for _ in bench.iters:
+                            encrypted_out = getattr(encrypted_tensor, func)()
+                    self._check(
+                        encrypted_out,
+                        reference(tensor),
+                        "%s failed in %s mode" % (func, mode),
+                        tolerance=tolerance,
+                    )
+        finally:
+            crypten.mpc.set_activation_mode("exact")
+
+        with self.assertRaises(AssertionError):
+            crypten.mpc.set_activation_mode("unknown")
+
+    def test_reciprocal_input_range(self):
+        """Tests reciprocal with a known input range"""
+        for low, high in [(1, 2), (0.5, 10)]:
+            tensor = torch.linspace(low, high, 100)
+            for sign in [1, -1]:
+                encrypted_tensor = MPCTensor(sign * tensor)
+                encrypted_out = encrypted_tensor.reciprocal(
+                    all_pos=(sign == 1), input_range=(low, high)
+                )
+                self._check(
+                    encrypted_out,
+                    sign * tensor.reciprocal(),
+                    "reciprocal failed with input range (%s, %s)" % (low, high),
+                )
+
+        # wide ranges need more iterations than the default `nr_iters`:
+        for low, high in [(1, 1000), (1, 3000)]:
+            tensor = torch.logspace(math.log10(low), math.log10(high), 100)
+            encrypted_out = MPCTensor(tensor).reciprocal(
+                all_pos=True, input_range=(low, high)
+            )
+            self._check(
+                encrypted_out,
+                tensor.reciprocal(),
+                "reciprocal failed with input range (%s, %s)" % (low, high),
+                tolerance=0.02,
+            )
+
+        # ranges whose reciprocals are not representable are rejected:
+        with self.assertRaises(AssertionError):
+            MPCTensor(tensor).reciprocal(all_pos=True, input_range=(1, 2 ** 17))
+
+    def test_log_input_range(self):
+        """Tests log with a known input range"""
+        for low, high in [(0.1, 10), (1, 1000), (1, math.exp(9))]:
+            tensor = torch.logspace(math.log10(low), math.log10(high), 100)
+            encrypted_out = MPCTensor(tensor).log(input_range=(low, high))
+
+            # the logarithm crosses zero, so its absolute error is checked:
+            error = (encrypted_out.get_plain_text() - tensor.log()).abs().max()
+            self.assertLess(
+                error.item(), 0.05, "log failed with input range (%s, %s)" % (low, high)
+            )
+
     def test_cos_sin(self):
         """Tests trigonometric functions (cos, sin)"""
         tensor = torch.tensor([0.01 * i for i in range(-1000, 1001, 1)])
@@ -885,6 +1046,33 @@ class TestMPC(MultiProcessTestCase):
 
                 self._check(encrypted_out, reference, "softmax failed")
 
+                # Test max-free softmax (all values of tensor lie in [-2, 2]):
+                with self.benchmark(size=size, dim=dim, logit_range=2) as bench:
+                    for _ in bench.iters:
+                        encrypted_out = encrypted_tensor.softmax(dim, logit_range=2)
+                self._check(encrypted_out, reference, "max-free softmax failed")
+
+        # Test wide inputs, whose softmax denominators span a large range:
+        tensor = torch.full((1, 1000), 0.5)  # largest possible denominator
+        reference = tensor.softmax(1)
+        encrypted_out = MPCTensor(tensor).softmax(1)
+        self._check(encrypted_out, reference, "wide softmax failed", tolerance=0.05)
+        for logit_range in [4, 5]:
+            tensor = get_random_test_tensor(max_value=logit_range, size=(3, 10))
+            tensor = tensor.float()
+            tensor[1] = -logit_range
+            tensor[1, 0] = logit_range
+            tensor[2] = logit_range
+            tensor[2, 0] = -logit_range
+            reference = tensor.softmax(1)
+            encrypted_out = MPCTensor(tensor).softmax(1, logit_range=logit_range)
+            self._check(
+                encrypted_out,
+                reference,
+                "max-free softmax failed with logit range %d" % logit_range,
+                tolerance=0.05,
+            )
+
     def test_get_set(self):
         """Tests element setting and getting by index"""
         for tensor_type in [lambda x: x, MPCTensor]:
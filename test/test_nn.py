@@ -5,6 +5,7 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
+import io
 import logging
 import unittest
 from test.multiprocess_test_case import (
@@ -16,9 +17,12 @@ from test.multiprocess_test_case import (
 
 import crypten
 import crypten.communicator as comm
+import onnx
 import torch
 from crypten.autograd_cryptensor import AutogradCrypTensor
 from crypten.common.tensor_types import is_float_tensor
+from crypten.nn.checkpointing import AutogradCheckpoint
+from crypten.nn.onnx_helper import reorder_activation_nodes
 
 
 class TestNN(MultiProcessTestCase):
@@ -228,6 +232,8 @@ class TestNN(MultiProcessTestCase):
             "Linear": (400, 120),
             "MaxPool2d": (2,),
             "ReLU": (),
+            "Sigmoid": (),
+            "Tanh": (),
         }
         input_sizes = {
             "AdaptiveAvgPool2d": (1, 3, 32, 32),
@@ -242,6 +248,8 @@ class TestNN(MultiProcessTestCase):
             "Linear": (1, 400),
             "MaxPool2d": (1, 2, 32, 32),
             "ReLU": (1, 3, 32, 32),
+            "Sigmoid": (1, 4),
+            "Tanh": (1, 4),
         }
 
         # loop over all modules:
@@ -405,6 +413,248 @@ class TestNN(MultiProcessTestCase):
             reference = linear2(linear1(input) + input)
             self._check(encr_output, reference, "nn.Graph forward failed")
 
+            # test parallel branches with ReLUs, which are evaluated jointly:
+            graph = crypten.nn.Graph("input", "output")
+            graph.add_module("relu1", crypten.nn.ReLU(), ["input"])
+            graph.add_module(
+                "linear", crypten.nn.from_pytorch(linear1, input), ["input"]
+            )
+            graph.add_module("relu2", crypten.nn.ReLU(), ["linear"])
+            graph.add_module("relu3", crypten.nn.ReLU(), ["input"])
+            graph.add_module("sum", crypten.nn.Add(), ["relu1", "relu2"])
+            graph.add_module("output", crypten.nn.Sub(), ["sum", "relu3"])
+            graph.encrypt()
+            encr_output = graph(encr_input)
+            reference = linear1(input).relu()
+            self._check(encr_output, reference, "nn.Graph forward failed")
+
+            # execution plan must be updated when modules are added:
+            graph = crypten.nn.Graph("input", "output")
+            graph.add_module("relu", crypten.nn.ReLU(), ["input"])
+            with self.assertRaises(ValueError):
+                graph(encr_input)
+            graph.add_module("output", crypten.nn.Add(), ["relu", "input"])
+            graph.encrypt()
+            encr_output = graph(encr_input)
+            reference = input.relu() + input
+            self._check(encr_output, reference, "nn.Graph forward failed")
+
+    def test_fold_batchnorm(self):
+        """
+        Tests folding of batch normalizations into the preceding layers.
+        """
+        for layer, input_size in [
+            (torch.nn.Linear(10, 6), (4, 10)),
+            (torch.nn.Conv2d(2, 6, 3), (4, 2, 8, 8)),
+        ]:
+            if isinstance(layer, torch.nn.Linear):
+                batchnorm = torch.nn.BatchNorm1d(6)
+            else:
+                batchnorm = torch.nn.BatchNorm2d(6)
+            batchnorm.running_mean.uniform_(-1.0, 1.0)
+            batchnorm.running_var.uniform_(0.5, 2.0)
+            batchnorm.weight.data.uniform_(-1.0, 1.0)
+            batchnorm.bias.data.uniform_(-1.0, 1.0)
+            model = torch.nn.Sequential(layer, batchnorm, torch.nn.ReLU())
+            for param in model.parameters():
+                param.data.copy_(comm.get().broadcast(param.data, src=0))
+            for buffer in [batchnorm.running_mean, batchnorm.running_var]:
+                buffer.copy_(comm.get().broadcast(buffer, src=0))
+            input = get_random_test_tensor(size=input_size, is_float=True)
+
+            # batch normalizations are only folded for models in eval mode:
+            for training in [True, False]:
+                model.train(mode=training)
+                if isinstance(layer, torch.nn.Linear):
+                    encr_model = crypten.nn.from_pytorch(model, input)
+                else:
+                    # PyTorch itself folds Conv + BatchNorm unless told not to:
+                    f = io.BytesIO()
+                    torch.onnx.export(
+                        model,
+                        input,
+                        f,
+                        input_names=["input"],
+                        output_names=["output"],
+                        training=torch.onnx.TrainingMode.PRESERVE,
+                        do_constant_folding=False,
+                    )
+                    encr_model = crypten.nn.from_onnx(f, fold_batchnorm=not training)
+                num_batchnorms = sum(
+                    1
+                    for module in encr_model.modules()
+                    if isinstance(module, crypten.nn._BatchNorm)
+                )
+                self.assertEqual(num_batchnorms, int(training), "incorrect folding")
+                if not training:
+                    encr_model.eval()
+                    encr_model.encrypt()
+                    encr_output = encr_model(crypten.cryptensor(input))
+                    reference = model(input)
+                    self._check(encr_output, reference, "folded batchnorm failed")
+
+    def test_fold_shapes(self):
+        """
+        Tests that computations on shapes are evaluated at import time.
+        """
+
+        class ExampleNet(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.conv = torch.nn.Conv2d(1, 2, kernel_size=3)
+                self.fc = torch.nn.Linear(2 * 6 * 6, 3)
+
+            def forward(self, x):
+                out = self.conv(x)
+                out = out.view(out.size(0), -1)
+                return self.fc(out)
+
+        model = ExampleNet()
+        for param in model.parameters():
+            param.data.copy_(comm.get().broadcast(param.data, src=0))
+
+        # export with dynamic batch size so shapes are computed in the graph:
+        f = io.BytesIO()
+        torch.onnx.export(
+            model,
+            torch.empty(1, 1, 8, 8),
+            f,
+            input_names=["input"],
+            output_names=["output"],
+            dynamic_axes={"input": {0: "batch"}},
+        )
+        encr_model = crypten.nn.from_onnx(f)
+        module_types = [type(module) for module in encr_model.modules()]
+        self.assertEqual(
+            module_types, [crypten.nn.Conv2d, crypten.nn.Flatten, crypten.nn.Linear]
+        )
+
+        # the folded model supports any batch size:
+        encr_model.encrypt()
+        for batch_size in [1, 4]:
+            input = get_random_test_tensor(size=(batch_size, 1, 8, 8), is_float=True)
+            encr_output = encr_model(crypten.cryptensor(input))
+            self._check(encr_output, model(input), "shape folding failed")
+
+        # models converted from PyTorch support any batch size:
+        encr_model = crypten.nn.from_pytorch(model, torch.empty(1, 1, 8, 8))
+        encr_model.encrypt()
+        input = get_random_test_tensor(size=(4, 1, 8, 8), is_float=True)
+        encr_output = encr_model(crypten.cryptensor(input))
+        self._check(encr_output, model(input), "shape folding failed")
+
+        # static batch sizes of the dummy input are not folded into reshapes:
+        helper = onnx.helper
+        nodes = [
+            helper.make_node("Shape", ["input"], ["shape"]),
+            helper.make_node(
+                "Constant", [], ["index"], value=helper.make_tensor("", 7, [], [0])
+            ),
+            helper.make_node("Gather", ["shape", "index"], ["batch"], axis=0),
+            helper.make_node("Unsqueeze", ["batch"], ["batch_1d"], axes=[0]),
+            helper.make_node(
+                "Constant", [], ["rest"], value=helper.make_tensor("", 7, [1], [-1])
+            ),
+            helper.make_node("Concat", ["batch_1d", "rest"], ["target"], axis=0),
+            helper.make_node("Reshape", ["input", "target"], ["output"]),
+        ]
+        graph = helper.make_graph(
+            nodes,
+            "static_reshape",
+            [helper.make_tensor_value_info("input", onnx.TensorProto.FLOAT, [1, 2, 3])],
+            [helper.make_tensor_value_info("output", onnx.TensorProto.FLOAT, [1, 6])],
+        )
+        onnx_model = helper.make_model(
+            graph, opset_imports=[helper.make_opsetid("", 10)]
+        )
+        encr_model = crypten.nn.from_onnx(onnx_model.SerializeToString())
+        module_types = [type(module) for module in encr_model.modules()]
+        self.assertIn(crypten.nn.Shape, module_types)
+        encr_model.encrypt()
+        input = get_random_test_tensor(size=(4, 2, 3), is_float=True)
+        encr_output = encr_model(crypten.cryptensor(input))
+        self._check(encr_output, input.view(4, -1), "static batch size was folded")
+
+        # static shapes in reshape modules:
+        reshape = crypten.nn.Reshape((0, 3, -1))
+        input = get_random_test_tensor(size=(2, 6, 2), is_float=True)
+        encr_output = reshape(crypten.cryptensor(input))
+        self._check(encr_output, input.view(2, 3, -1), "static reshape failed")
+
+    def test_reorder_activations(self):
+        """
+        Tests that activations and 1x1 convolutions are moved after pooling.
+        """
+        model = torch.nn.Sequential(
+            torch.nn.Conv2d(1, 4, kernel_size=3),
+            torch.nn.ReLU(),
+            torch.nn.MaxPool2d(2),
+            torch.nn.Conv2d(4, 2, kernel_size=1),
+            torch.nn.AvgPool2d(2),
+        )
+        for param in model.parameters():
+            param.data.copy_(comm.get().broadcast(param.data, src=0))
+        input = get_random_test_tensor(size=(1, 1, 10, 10), is_float=True)
+
+        # check that the ReLU and 1x1 convolution were moved:
+        encr_model = crypten.nn.from_pytorch(model, input)
+        module_types = [type(module) for module in encr_model.modules()]
+        reference_types = [
+            crypten.nn.Conv2d,
+            crypten.nn.MaxPool2d,
+            crypten.nn.ReLU,
+            crypten.nn.AvgPool2d,
+            crypten.nn.Conv2d,
+        ]
+        self.assertEqual(module_types, reference_types)
+        encr_model.encrypt()
+        encr_output = encr_model(crypten.cryptensor(input))
+        self._check(encr_output, model(input), "reordering failed")
+
+        # check number of comparisons saved:
+        f = io.BytesIO()
+        torch.onnx.export(
+            model, input, f, input_names=["input"], output_names=["output"]
+        )
+        f.seek(0)
+        onnx_model = onnx.load(f)
+        _, num_comparisons_saved = reorder_activation_nodes(
+            onnx_model, list(onnx_model.graph.node), ["output"]
+        )
+        self.assertEqual(num_comparisons_saved, 4 * 8 * 8 - 4 * 4 * 4)
+
+    def test_bulk_encryption(self):
+        """
+        Tests that all parameters of a model are encrypted and decrypted at once.
+        """
+        linears = [get_random_linear(10, 10) for _ in range(3)]
+        input = get_random_test_tensor(size=(1, 10), is_float=True)
+        model = crypten.nn.Sequential(
+            [crypten.nn.from_pytorch(linear, input) for linear in linears]
+        )
+        model.encrypt()
+
+        # all encrypted parameters are views into a single tensor:
+        shares = [param._tensor._tensor.share for param in model.parameters()]
+        storages = {share.storage().data_ptr() for share in shares}
+        self.assertEqual(len(storages), 1, "parameters not encrypted together")
+        references = [param for linear in linears for param in linear.parameters()]
+        for param, reference in zip(model.parameters(), references):
+            self.assertTrue(param.requires_grad, "requires_grad not preserved")
+            self._check(param, reference, "bulk encryption failed")
+
+        # decryption takes a single round of communication:
+        comm.get().set_verbosity(True)
+        crypten.reset_communication_stats()
+        model.decrypt()
+        self.assertEqual(comm.get().comm_rounds, 1)
+        comm.get().set_verbosity(False)
+        self.assertFalse(model.encrypted, "model not decrypted")
+        for param, reference in zip(model.parameters(), references):
+            self.assertTrue(torch.is_tensor(param), "parameter not decrypted")
+            self.assertTrue(param.requires_grad, "requires_grad not preserved")
+            self._check(crypten.cryptensor(param), reference, "decryption failed")
+
     def test_losses(self):
         """
         Tests all Losses implemented in crypten.nn.
@@ -447,6 +697,45 @@ class TestNN(MultiProcessTestCase):
         )
         self._check(encrypted_loss, loss, "cross-entropy loss failed")
 
+        # test max-free cross-entropy loss (scaled inputs lie in [-2, 2]):
+        input, encrypted_input = input / 3, encrypted_input / 3
+        loss = torch.nn.CrossEntropyLoss()(input, target)
+        encrypted_loss = crypten.nn.CrossEntropyLoss(logit_range=2)(
+            encrypted_input, encrypted_target
+        )
+        self._check(encrypted_loss, loss, "max-free cross-entropy loss failed")
+
+        # test max-free cross-entropy loss and its gradient on saturated rows:
+        num_targets = 10
+        target = torch.tensor([0, 1, 0])
+        encrypted_target = crypten.cryptensor(onehot(target, num_targets=num_targets))
+        for logit_range in [4, 5]:
+            input = get_random_test_tensor(max_value=logit_range, size=(3, 10))
+            input = input.float()
+            input[1] = -logit_range
+            input[1, 0] = logit_range
+            input[2] = logit_range
+            input[2, 0] = -logit_range
+            input.requires_grad = True
+            loss = torch.nn.CrossEntropyLoss()(input, target)
+            loss.backward()
+            encrypted_input = AutogradCrypTensor(crypten.cryptensor(input.detach()))
+            encrypted_loss = crypten.nn.CrossEntropyLoss(logit_range=logit_range)(
+                encrypted_input, AutogradCrypTensor(encrypted_target)
+            )
+            msg = "max-free cross-entropy loss failed with logit range %d"
+            self._check(
+                encrypted_loss, loss.detach(), msg % logit_range, tolerance=0.05
+            )
+            encrypted_loss.backward()
+            self._check(
+                encrypted_input.grad,
+                input.grad,
+                "max-free cross-entropy backward failed with logit range %d"
+                % logit_range,
+                tolerance=0.05,
+            )
+
     def test_training(self):
         """
         Tests training of simple model in crypten.nn.
@@ -503,6 +792,64 @@ class TestNN(MultiProcessTestCase):
                 model.update_parameters(learning_rate)
                 self._check_reference_parameters("", reference, model)
 
+    def test_checkpoint(self):
+        """
+        Tests that checkpointed modules compute the same gradients.
+        """
+
+        # create graph with parallel branches:
+        input_size = (3, 10)
+        input = get_random_test_tensor(size=input_size, is_float=True)
+        graph = crypten.nn.Graph("input", "output")
+        graph.add_module("relu", crypten.nn.ReLU(), ["input"])
+        for idx in range(2):
+            linear = get_random_linear(input_size[1], input_size[1])
+            graph.add_module(
+                "linear%d" % idx, crypten.nn.from_pytorch(linear, input), ["relu"]
+            )
+            graph.add_module("relu%d" % idx, crypten.nn.ReLU(), ["linear%d" % idx])
+        graph.add_module("output", crypten.nn.Add(), ["relu0", "relu1"])
+        graph.encrypt()
+
+        def forward_backward(model, requires_grad):
+            model.zero_grad()
+            encr_input = AutogradCrypTensor(
+                crypten.cryptensor(input), requires_grad=requires_grad
+            )
+            encr_output = model(encr_input)
+            comm.get().set_verbosity(True)
+            crypten.reset_communication_stats()
+            encr_output.sum().backward()
+            rounds = comm.get().comm_rounds
+            comm.get().set_verbosity(False)
+            grads = [encr_input.grad] + [param.grad for param in model.parameters()]
+            return encr_output, grads, rounds
+
+        for requires_grad in [True, False]:
+            reference_output, reference_grads, reference_rounds = forward_backward(
+                graph, requires_grad
+            )
+            rounds = {}
+            for max_rounds in [None, 0, 1]:
+                model = crypten.nn.checkpoint(graph, max_rounds=max_rounds)
+                encr_output, grads, rounds[max_rounds] = forward_backward(
+                    model, requires_grad
+                )
+                self.assertIs(encr_output.grad_fn, AutogradCheckpoint)
+                self._check(
+                    encr_output, reference_output.get_plain_text(), "forward failed"
+                )
+                for grad, reference in zip(grads, reference_grads):
+                    if reference is None:  # input does not require gradient
+                        self.assertIsNone(grad, "input gradient computed")
+                    else:
+                        self._check(grad, reference.get_plain_text(), "backward failed")
+
+            # communicating functions are only recomputed when selected:
+            self.assertEqual(rounds[0], reference_rounds)
+            self.assertGreater(rounds[1], rounds[0])
+            self.assertGreater(rounds[None], rounds[1])
+
     def test_from_pytorch_training(self):
         """Tests the from_pytorch code path for training CrypTen models"""
         import torch.nn as nn
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+
+import logging
+import unittest
+from test.multiprocess_test_case import MultiProcessTestCase, get_random_test_tensor
+
+import crypten
+import torch
+from crypten.autograd_cryptensor import AutogradCrypTensor
+from crypten.common.tensor_types import is_float_tensor
+
+
+class TestOptim(MultiProcessTestCase):
+    """
+    This class tests the crypten.optim package.
+    """
+
+    benchmarks_enabled = False
+
+    def setUp(self):
+        super().setUp()
+        if self.rank >= 0:
+            crypten.init()
+
+    def _check(self, encrypted_tensor, reference, msg, tolerance=None):
+        if tolerance is None:
+            tolerance = getattr(self, "default_tolerance", 0.05)
+        tensor = encrypted_tensor.get_plain_text()
+
+        # Check sizes match
+        self.assertTrue(tensor.size() == reference.size(), msg)
+
+        self.assertTrue(is_float_tensor(reference), "reference must be a float")
+        diff = (tensor - reference).abs_()
+        norm_diff = diff.div(tensor.abs() + reference.abs()).abs_()
+        test_passed = norm_diff.le(tolerance) + diff.le(tolerance * 0.1)
+        test_passed = test_passed.gt(0).all().item() == 1
+        if not test_passed:
+            logging.info(msg)
+            logging.info("Result = %s;\nreference = %s" % (tensor, reference))
+        self.assertTrue(test_passed, msg=msg)
+
+    def test_optimizers(self):
+        """Tests that optimizers perform the same steps as in PyTorch"""
+        optimizers = [
+            ("SGD", {"lr": 0.1}),
+            ("SGD", {"lr": 0.1, "momentum": 0.9, "weight_decay": 0.1}),
+            ("Adam", {"lr": 0.1, "weight_decay": 0.1}),
+        ]
+        sizes = [(3, 4), (4,), (2, 2, 2)]
+        for name, kwargs in optimizers:
+            params = [
+                get_random_test_tensor(size=size, is_float=True) for size in sizes
+            ]
+            encrypted_params = [
+                AutogradCrypTensor(crypten.cryptensor(param)) for param in params
+            ]
+            params = [param.requires_grad_() for param in params]
+            optimizer = getattr(torch.optim, name)(params, **kwargs)
+            encrypted_optimizer = getattr(crypten.optim, name)(
+                encrypted_params, **kwargs
+            )
+
+            # parameters are views into the flat buffer of the optimizer:
+            flat_share = encrypted_optimizer.flat._tensor.share
+            for encrypted_param in encrypted_params:
+                share = encrypted_param.tensor._tensor.share
+                self.assertEqual(
+                    share.storage().data_ptr(), flat_share.data_ptr()
+                )
+
+            for step in range(3):
+                for idx, (param, encrypted_param) in enumerate(
+                    zip(params, encrypted_params)
+                ):
+                    if step == 1 and idx == 0:  # parameters may lack gradients
+                        param.grad = torch.zeros(param.size())
+                        encrypted_param.grad = None
+                        continue
+                    grad = get_random_test_tensor(size=param.size(), is_float=True)
+                    param.grad = grad
+                    encrypted_param.grad = crypten.cryptensor(grad)
+                optimizer.step()
+                encrypted_optimizer.step()
+                for param, encrypted_param in zip(params, encrypted_params):
+                    self._check(
+                        encrypted_param.tensor, param.detach(), "%s failed" % name
+                    )
+
+            encrypted_optimizer.zero_grad()
+            for encrypted_param in encrypted_params:
+                self.assertIsNone(encrypted_param.grad)
+
+    def test_micro_batches(self):
+        """Tests gradient accumulation over micro-batches"""
+        batch_size, micro_batch_size = 8, 3
+        input = get_random_test_tensor(size=(batch_size, 4), is_float=True)
+        target = get_random_test_tensor(size=(batch_size, 2), is_float=True)
+        weight = get_random_test_tensor(size=(2, 4), is_float=True)
+        bias = get_random_test_tensor(size=(2,), is_float=True)
+        encrypted_input = crypten.cryptensor(input)
+        encrypted_target = crypten.cryptensor(target)
+        for name, kwargs in [("SGD", {"lr": 0.1, "momentum": 0.9}), ("Adam", {})]:
+            model = torch.nn.Linear(4, 2)
+            model.weight.data.copy_(weight)
+            model.bias.data.copy_(bias)
+            encrypted_model = crypten.nn.from_pytorch(model, input)
+            encrypted_model.encrypt()
+            optimizer = getattr(torch.optim, name)(model.parameters(), **kwargs)
+            encrypted_optimizer = getattr(crypten.optim, name)(
+                encrypted_model.parameters(), **kwargs
+            )
+            loss = crypten.nn.MSELoss()
+
+            def closure(x, y):
+                return loss(encrypted_model(x), AutogradCrypTensor(y))
+
+            for _ in range(2):
+                # last micro-batch is smaller, so reference uses the full batch:
+                optimizer.zero_grad()
+                output = model(input)
+                torch.nn.functional.mse_loss(output, target).backward()
+                optimizer.step()
+
+                losses = encrypted_optimizer.step_micro_batches(
+                    closure, [encrypted_input, encrypted_target], micro_batch_size
+                )
+                self.assertEqual(len(losses), 3)
+                for param, encrypted_param in zip(
+                    model.parameters(), encrypted_model.parameters()
+                ):
+                    self._check(
+                        encrypted_param.tensor,
+                        param.detach(),
+                        "%s failed" % name,
+                        tolerance=0.05,
+                    )
+                self.assertIsNone(encrypted_optimizer.grad_accumulator)
+                for encrypted_param in encrypted_model.parameters():
+                    self.assertIsNone(encrypted_param.grad)
+
+    def test_micro_batches_small_lr(self):
+        """Tests that small steps are not lost when accumulating micro-batches"""
+        for lr, batch_size, micro_batch_size in [(0.01, 200, 50), (1e-4, 256, 64)]:
+            param = AutogradCrypTensor(crypten.cryptensor(torch.zeros(4, 1)))
+            optimizer = crypten.optim.SGD([param], lr=lr)
+
+            # the mean gradient of every micro-batch is 1:
+            def closure(x):
+                return x.matmul(param).mean()
+
+            encrypted_input = AutogradCrypTensor(
+                crypten.cryptensor(torch.ones(batch_size, 4)), requires_grad=False
+            )
+            optimizer.step_micro_batches(closure, encrypted_input, micro_batch_size)
+
+            # the step must be exact up to the precision of the encoding:
+            error = (param.tensor.get_plain_text() + lr).abs().max().item()
+            self.assertLessEqual(error, 2 / optimizer.scale, "step with lr %s" % lr)
+
+
+# This code only runs when executing the file outside the test harness (e.g.
+# via the buck target test_mpc_benchmark)
+if __name__ == "__main__":
+    unittest.main()
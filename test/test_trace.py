@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# Copyright (c) Facebook, Inc. and its affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+
+import logging
+import unittest
+from test.multiprocess_test_case import MultiProcessTestCase, get_random_test_tensor
+
+import crypten
+import crypten.communicator as comm
+import torch
+from crypten.common.tensor_types import is_float_tensor
+
+
+class TestTrace(MultiProcessTestCase):
+    """
+        This class tests tracing and compilation of MPCTensor programs.
+    """
+
+    benchmarks_enabled = False
+
+    def setUp(self):
+        super().setUp()
+        if self.rank >= 0:
+            crypten.init()
+
+    def _check(self, encrypted_tensor, reference, msg, tolerance=None):
+        if tolerance is None:
+            tolerance = getattr(self, "default_tolerance", 0.05)
+        tensor = encrypted_tensor.get_plain_text()
+
+        # Check sizes match
+        self.assertTrue(tensor.size() == reference.size(), msg)
+
+        self.assertTrue(is_float_tensor(reference), "reference must be a float")
+        diff = (tensor - reference).abs_()
+        norm_diff = diff.div(tensor.abs() + reference.abs()).abs_()
+        test_passed = norm_diff.le(tolerance) + diff.le(tolerance * 0.1)
+        test_passed = test_passed.gt(0).all().item() == 1
+        if not test_passed:
+            logging.info(msg)
+            logging.info("Result = %s;\nreference = %s" % (tensor, reference))
+        self.assertTrue(test_passed, msg=msg)
+
+    def test_trace(self):
+        """Tests that traces replay the traced function"""
+
+        def func(x, y, scale):
+            z = x.relu() * 0.5 * scale + x.relu()  # redundant comparison
+            unused = x.sign()  # noqa: F841
+            return z.matmul(y), (z > 0), z.size()
+
+        def reference_func(x, y, scale):
+            z = x.relu() * 0.5 * scale + x.relu()
+            return z.matmul(y), (z > 0).float(), z.size()
+
+        x = get_random_test_tensor(size=(4, 5), is_float=True)
+        y = get_random_test_tensor(size=(5, 3), is_float=True)
+        trace = crypten.trace(func, crypten.cryptensor(x), crypten.cryptensor(y), 3)
+
+        # scalar multiplications are folded, comparisons are merged:
+        live_ops = [
+            node.op for node, live in zip(trace.nodes, trace.live) if live and node.op
+        ]
+        self.assertEqual(live_ops.count("relu"), 1)
+        self.assertEqual(live_ops.count("sign"), 0)
+        self.assertEqual(len([op for op in live_ops if "mul" in op]), 2)
+
+        for _ in range(2):
+            x = get_random_test_tensor(size=(4, 5), is_float=True)
+            y = get_random_test_tensor(size=(5, 3), is_float=True)
+            encrypted_out = trace(crypten.cryptensor(x), crypten.cryptensor(y), 3)
+            reference = reference_func(x, y, 3)
+            self._check(encrypted_out[0], reference[0], "trace failed")
+            self._check(encrypted_out[1], reference[1], "trace failed")
+            self.assertEqual(encrypted_out[2], reference[2])
+
+    def test_arguments(self):
+        """Tests that traces reject arguments that differ from the traced ones"""
+
+        def func(x, scale):
+            return x.relu() * scale
+
+        x = crypten.cryptensor(get_random_test_tensor(size=(4, 5), is_float=True))
+        trace = crypten.trace(func, x, 3)
+        self._check(trace(x, 3), x.get_plain_text().relu() * 3, "trace failed")
+
+        # public arguments are constants of the trace:
+        with self.assertRaises(ValueError):
+            trace(x, 2)
+
+        # encrypted inputs must have the traced sizes:
+        y = crypten.cryptensor(get_random_test_tensor(size=(5, 4), is_float=True))
+        with self.assertRaises(ValueError):
+            trace(y, 3)
+        with self.assertRaises(ValueError):
+            trace(x)
+        with self.assertRaises(ValueError):
+            trace(3, x)
+
+        # public tensors cannot be traced:
+        with self.assertRaises(ValueError):
+            crypten.trace(func, x, torch.tensor(3.0))
+
+    def test_inplace(self):
+        """Tests traces of functions with in-place operations"""
+
+        def func(x):
+            y = x.relu()
+            x.add_(1)
+            y[0] = x[0]
+            return y + x
+
+        def reference_func(x):
+            y = x.relu()
+            x = x + 1
+            y[0] = x[0]
+            return y + x
+
+        compiled = crypten.compile(func)
+        for _ in range(2):
+            x = get_random_test_tensor(size=(3, 3), is_float=True)
+            encrypted_x = crypten.cryptensor(x)
+            self._check(compiled(encrypted_x), reference_func(x), "compile failed")
+            self._check(encrypted_x, x + 1, "in-place update failed")
+
+    def test_compile(self):
+        """Tests that compiled functions are traced once per input size"""
+
+        def func(x, y):
+            return x.relu(), y.relu()
+
+        compiled = crypten.compile(func)
+        for size in [(5,), (2, 3), (5,)]:
+            x = get_random_test_tensor(size=size, is_float=True)
+            y = get_random_test_tensor(size=(7,), is_float=True)
+            encrypted_x, encrypted_y = crypten.cryptensor(x), crypten.cryptensor(y)
+
+            comm.get().set_verbosity(True)
+            crypten.reset_communication_stats()
+            encrypted_x.relu()
+            rounds = comm.get().comm_rounds
+
+            crypten.reset_communication_stats()
+            encrypted_out = compiled(encrypted_x, encrypted_y)
+            if size == (5,) and len(compiled.traces) == 2:
+                # the independent ReLUs share their rounds during replay:
+                self.assertEqual(comm.get().comm_rounds, rounds)
+            comm.get().set_verbosity(False)
+
+            self._check(encrypted_out[0], x.relu(), "compile failed")
+            self._check(encrypted_out[1], y.relu(), "compile failed")
+        self.assertEqual(len(compiled.traces), 2)
+
+
+# This code only runs when executing the file outside the test harness (e.g.
+# via the buck target test_mpc_benchmark)
+if __name__ == "__main__":
+    unittest.main()